@@ -0,0 +1,85 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+In-memory index of a company's accounts for the provisioning helpers of `setup`.
+
+The account tree is read once (one query) and indexed by account number and by
+normalized name, so each lookup is a dictionary access instead of a
+`account_name LIKE '%...%'` scan. Names in the Tunisian chart end with their
+number ("Salaires - 6400"); a fragment carrying a number resolves through the
+number first. Anything else falls back to a substring match over the loaded
+accounts, in tree order, which keeps the semantics of the former LIKE filters.
+"""
+
+import re
+import unicodedata
+
+import frappe
+
+TRAILING_NUMBER = re.compile(r"\s-\s*([0-9A-Z-]+)$")
+
+
+class AccountResolver:
+	def __init__(self, company, accounts=None):
+		"""Loads the accounts of `company`, unless `accounts` (in tree order) are given."""
+		self.company = company
+		self.accounts = accounts
+		if self.accounts is None:
+			self.accounts = frappe.get_all(
+				"Account",
+				filters={"company": company},
+				fields=["name", "account_name", "account_number", "parent_account", "is_group"],
+				order_by="lft",
+			)
+		self.by_number = {}
+		self.by_name = {}
+		for account in self.accounts:
+			account.key = normalize(account.account_name)
+			if account.account_number:
+				self.by_number.setdefault(str(account.account_number), []).append(account)
+			self.by_name.setdefault(account.key, []).append(account)
+
+	def find(self, fragment, is_group=None, startswith=False):
+		"""
+		Returns the first account whose name contains `fragment` (or starts with it),
+		like `account_name LIKE '%fragment%'`, optionally restricted to groups or ledgers.
+		"""
+		key = normalize(fragment)
+
+		exact = self._first(self.by_name.get(key), is_group)
+		if exact:
+			return exact
+
+		number = TRAILING_NUMBER.search(fragment.strip())
+		if number:
+			base = normalize(fragment.strip()[: number.start()])
+			candidates = [a for a in self.by_number.get(number.group(1), []) if a.key.startswith(base)]
+			match = self._first(candidates, is_group)
+			if match:
+				return match
+
+		candidates = (a for a in self.accounts if (a.key.startswith(key) if startswith else key in a.key))
+		return self._first(candidates, is_group)
+
+	def get_by_number(self, account_number, is_group=None):
+		return self._first(self.by_number.get(str(account_number)), is_group)
+
+	def get_children(self, parent_account, is_group=None):
+		return [
+			account.name
+			for account in self.accounts
+			if account.parent_account == parent_account and (is_group is None or account.is_group == is_group)
+		]
+
+	@staticmethod
+	def _first(accounts, is_group):
+		return next(
+			(account.name for account in accounts or () if is_group is None or account.is_group == is_group),
+			None,
+		)
+
+
+def normalize(name):
+	name = unicodedata.normalize("NFC", name or "").replace("\u2019", "'")
+	return " ".join(name.casefold().split())
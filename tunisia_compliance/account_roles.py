@@ -0,0 +1,121 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Per-company index of the tax accounts used by VAT Declarations, by role.
+
+Roles are resolved once per company and cached, so declaration queries can filter
+with `account_head IN (...)` instead of matching account names with LIKE. In order
+of precedence, a role comes from:
+
+1. the Tax Account Roles table and the stamp duty account of Tunisia Compliance Settings,
+2. the account number in the Tunisian chart of accounts,
+3. the VAT Collected / VAT Deductible tables of Tunisia Compliance Settings,
+4. the account name, for accounts the chart does not provide (FODEC, suspended VAT).
+"""
+
+import frappe
+
+COLLECTED = "collected"
+DEDUCTIBLE_GS = "deductible_gs"
+DEDUCTIBLE_FA = "deductible_fa"
+SUSPENDED = "suspended"
+FODEC = "fodec"
+WITHHOLDING = "withholding"
+STAMP_DUTY = "stamp_duty"
+
+ROLES = (COLLECTED, DEDUCTIBLE_GS, DEDUCTIBLE_FA, SUSPENDED, FODEC, WITHHOLDING, STAMP_DUTY)
+
+# Labels of the `role` select in Tax Account Role
+ROLE_LABELS = {
+	"VAT Collected": COLLECTED,
+	"VAT Deductible (Goods/Services)": DEDUCTIBLE_GS,
+	"VAT Deductible (Fixed Assets)": DEDUCTIBLE_FA,
+	"VAT Suspended": SUSPENDED,
+	"FODEC": FODEC,
+	"Withholding Tax": WITHHOLDING,
+	"Stamp Duty": STAMP_DUTY,
+}
+
+# Account numbers of regional/data/tn_plan_comptable_general_avec_code.csv
+CHART_ACCOUNT_NUMBERS = {
+	"436711": COLLECTED,  # TVA collectée sur les débits
+	"436712": COLLECTED,  # TVA collectée sur les encaissements
+	"43662": DEDUCTIBLE_FA,  # TVA sur immobilisations
+	"43663": DEDUCTIBLE_GS,  # TVA transférée par d'autres entreprises
+	"43666": DEDUCTIBLE_GS,  # TVA sur autres biens et services
+	"4341": WITHHOLDING,  # Retenue à la source
+	"706": STAMP_DUTY,  # Produits des activités annexes, credited with the stamp duty by the tax templates
+}
+
+# Only consulted for accounts that none of the sources above classify
+NAME_FRAGMENTS = (
+	("suspendue", SUSPENDED),
+	("fodec", FODEC),
+	("retenue à la source", WITHHOLDING),
+	("tva sur immobilisations", DEDUCTIBLE_FA),
+)
+
+CACHE_KEY = "tunisia_compliance_tax_account_roles"
+
+
+def get_role_accounts(company, *roles):
+	"""Returns the accounts of `company` having any of `roles`, as a tuple usable in `IN %(...)s`."""
+	index = frappe.cache.hget(CACHE_KEY, company, generator=lambda: build_role_index(company))
+	return tuple(sorted({account for role in roles for account in index.get(role, [])}))
+
+
+def get_account_role(company, account):
+	index = frappe.cache.hget(CACHE_KEY, company, generator=lambda: build_role_index(company))
+	return next((role for role in ROLES if account in index.get(role, [])), None)
+
+
+def build_role_index(company):
+	accounts = frappe.get_all(
+		"Account",
+		filters={"company": company, "is_group": 0},
+		fields=["name", "account_name", "account_number", "account_type"],
+	)
+	settings = frappe.get_cached_doc("Tunisia Compliance Settings")
+	company_accounts = {account.name for account in accounts}
+
+	roles = {}
+	for row in settings.get("tax_account_roles") or []:
+		if row.account in company_accounts and row.role in ROLE_LABELS:
+			roles[row.account] = ROLE_LABELS[row.role]
+	if settings.stamp_duty_per_invoice in company_accounts:
+		roles.setdefault(settings.stamp_duty_per_invoice, STAMP_DUTY)
+
+	for account in accounts:
+		if account.name not in roles and account.account_number in CHART_ACCOUNT_NUMBERS:
+			roles[account.name] = CHART_ACCOUNT_NUMBERS[account.account_number]
+
+	for table, role in (("vat_collected_accounts", COLLECTED), ("vat_deductible_accounts", DEDUCTIBLE_GS)):
+		for row in settings.get(table) or []:
+			if row.account in company_accounts and row.account not in roles:
+				roles[row.account] = role
+
+	for account in accounts:
+		name = (account.account_name or "").lower()
+		fragment_role = next((role for fragment, role in NAME_FRAGMENTS if fragment in name), None)
+		if not fragment_role:
+			continue
+		# suspended VAT must never be reported as collected, even when listed in the settings
+		if account.name not in roles or (fragment_role == SUSPENDED and roles[account.name] == COLLECTED):
+			roles[account.name] = fragment_role
+
+	index = {role: [] for role in ROLES}
+	for account, role in roles.items():
+		index[role].append(account)
+	return index
+
+
+def clear_role_index(company=None):
+	if company:
+		frappe.cache.hdel(CACHE_KEY, company)
+	else:
+		frappe.cache.delete_value(CACHE_KEY)
+
+
+def on_account_change(doc, method=None, *args):
+	clear_role_index(doc.company)
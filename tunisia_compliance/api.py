@@ -4,8 +4,8 @@
 import frappe
 import os
 from frappe import _
-from erpnext.accounts.doctype.chart_of_accounts_importer.chart_of_accounts_importer import import_coa
-from frappe.utils.file_manager import save_file
+
+from tunisia_compliance.coa_loader import get_default_chart_path, load_chart
 
 @frappe.whitelist()
 def check_and_get_companies():
@@ -39,36 +39,17 @@ def run_chart_import(company):
         return
 
     # 1. Get the path to the master CSV file within your app
-    app_path = frappe.get_app_path("tunisia_compliance")
-    # Ensure this path matches where you stored your CSV file
-    csv_path = os.path.join(app_path, "public", "downloads", "tunisian_chart_template.csv")
+    csv_path = get_default_chart_path()
 
     if not os.path.exists(csv_path):
         frappe.log_error(f"Chart template not found at {csv_path}", "Tunisia Compliance App Error")
         frappe.throw(_("Tunisian Chart of Accounts template file not found in the app. Please contact the app developer."))
 
-    # 2. Create a Frappe File document from your CSV to pass to the importer
-    try:
-        with open(csv_path, "rb") as f:
-            file_content = f.read()
-
-        saved_file = save_file(
-            fname="tunisian_chart_template.csv",
-            content=file_content,
-            doctype="Company",
-            docname=company,
-            is_private=1, # Important to keep it private
-        )
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "Tunisia Compliance: File Creation Failed")
-        frappe.throw(_("Failed to create temporary file document from template. Check Error Log for details."))
-
-    # 3. Call the core ERPNext importer function
+    # 2. Load the chart in bulk (falls back to the core Chart of Accounts Importer on error)
     try:
         frappe.msgprint(_("Starting import process... This may take a moment."), indicator="orange", title=_("Importing"))
 
-        # This is the core function from the ERPNext DocType we are calling
-        import_coa(company=company, file_name=saved_file.name)
+        load_chart(company, csv_path)
 
         frappe.msgprint(_("Tunisian Chart of Accounts imported successfully for {0}!").format(frappe.bold(company)), indicator='green', title=_('Success'))
 
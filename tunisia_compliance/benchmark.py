@@ -0,0 +1,415 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Synthetic-data benchmark of the declaration pipeline.
+
+For each requested volume, a month of submitted Sales/Purchase Invoices (with the
+Tunisian tax templates created by `setup.create_tax_templates`), their GL Entries,
+Salary Slips and withholding lines is generated with bulk inserts, then
+`get_declaration_data` (for every data source), `calculate_totals` and
+`get_accounting_journal` are timed. Generated records are named with the
+`TNBENCH-` prefix and can be removed with `cleanup`.
+
+The data is generated in consecutive months from `BENCHMARK_START`, long before any
+real posting, so the measured declarations only count generated documents and the
+VAT ledger is only rebuilt for those months. A Fiscal Year is created for them when
+the site has none; `cleanup` deletes it with the generated records.
+
+    bench --site mysite run-tunisia-compliance-benchmark --sizes 1000,10000,100000
+"""
+
+import json
+import time
+
+import frappe
+from erpnext.accounts.utils import get_fiscal_year
+from frappe.utils import add_days, add_months, cint, getdate, now
+
+from tunisia_compliance.account_roles import WITHHOLDING, get_role_accounts
+from tunisia_compliance.profiling import StageProfiler
+from tunisia_compliance.setup import create_tax_templates
+from tunisia_compliance.utils import MONTHS
+from tunisia_compliance.vat_aggregation import PAYROLL_TAX_COMPONENTS
+from tunisia_compliance.vat_ledger import rebuild_vat_ledger
+
+PREFIX = "TNBENCH-"
+BENCHMARK_START = "2000-01-01"
+DEFAULT_SIZES = (1000, 10000, 100000)
+DATA_SOURCES = ("Invoice Taxes", "VAT Ledger", "General Ledger")
+JOURNAL_CALLS = 1000
+CHUNK_SIZE = 10000
+
+# columns shared by every generated row of a doctype, in insertion order
+BATCH_DEFAULTS = {
+	"Sales Invoice": {"docstatus": 1},
+	"Sales Taxes and Charges": {"docstatus": 1, "parenttype": "Sales Invoice", "parentfield": "taxes"},
+	"Purchase Invoice": {"docstatus": 1},
+	"Purchase Taxes and Charges": {"docstatus": 1, "parenttype": "Purchase Invoice", "parentfield": "taxes"},
+	"GL Entry": {"docstatus": 1},
+	"Salary Slip": {"docstatus": 1},
+	"Salary Detail": {"docstatus": 1, "parenttype": "Salary Slip", "parentfield": "deductions"},
+}
+
+
+def run(company=None, sizes=DEFAULT_SIZES, output=None, keep_data=False, commit=True):
+	"""
+	Generates data for every size, times the pipeline and returns (and optionally writes) the report.
+	With `commit` False nothing is committed, so the caller can roll everything back.
+	"""
+	company = company or frappe.db.get_value("Company", {"country": "Tunisia"})
+	if not company:
+		frappe.throw("A Tunisian company is required to run the benchmark.")
+
+	context = _get_context(company)
+
+	report = {"company": company, "started_at": now(), "results": []}
+	try:
+		for index, size in enumerate(sizes):
+			start_date = add_months(getdate(BENCHMARK_START), index)
+			end_date = add_days(add_months(start_date, 1), -1)
+			_ensure_fiscal_year(start_date)
+			generated = generate(context, start_date, cint(size), commit=commit)
+			rebuild_vat_ledger(company=company, from_date=start_date, to_date=end_date, commit=commit)
+			report["results"].append(measure(company, start_date, cint(size), generated))
+	finally:
+		if not keep_data:
+			cleanup(company, commit=commit)
+
+	report["finished_at"] = now()
+	if output:
+		with open(output, "w") as f:
+			json.dump(report, f, indent=1, default=str)
+	return report
+
+
+def measure(company, start_date, size, generated):
+	result = {"size": size, "period": str(start_date)[:7], "generated": generated, "get_declaration_data": {}}
+
+	for data_source in DATA_SOURCES:
+		doc = _new_declaration(company, start_date, data_source)
+		profiler = StageProfiler()
+		with profiler.stage("get_declaration_data"):
+			doc.run_fetch_stages()
+		with profiler.stage("calculate_totals"):
+			doc.calculate_totals()
+
+		fetch, totals = profiler.stages
+		result["get_declaration_data"][data_source] = {
+			"duration_ms": fetch["duration_ms"],
+			"queries": fetch["queries"],
+			"calculate_totals_ms": totals["duration_ms"],
+			"invoices": doc.number_of_invoices_issued,
+			"vat_collected": doc.total_vat_collected,
+		}
+
+	result["get_accounting_journal"] = _measure_accounting_journal(company, min(size, JOURNAL_CALLS))
+	return result
+
+
+def generate(context, start_date, size, commit=True):
+	"""Bulk-inserts `size` sales and purchase invoices (and related records) dated within the month."""
+	end_date = add_days(add_months(start_date, 1), -1)
+	days = (end_date - start_date).days + 1
+	tag = f"{PREFIX}{str(start_date)[:7]}-"
+	batch = frappe._dict({doctype: [] for doctype in BATCH_DEFAULTS})
+	counts = {}
+
+	for i in range(size):
+		posting_date = add_days(start_date, i % days)
+		net = 100.0 + (i % 50) * 10
+		_add_sales_invoice(batch, context, f"{tag}SI-{i:07d}", posting_date, net, i)
+		_add_purchase_invoice(batch, context, f"{tag}PI-{i:07d}", posting_date, net, i)
+		if i % 10 == 0:
+			_add_salary_slip(batch, context, f"{tag}SS-{i:07d}", start_date, end_date)
+
+		if len(batch["GL Entry"]) >= CHUNK_SIZE:
+			_flush(batch, counts)
+
+	_flush(batch, counts)
+	if commit:
+		frappe.db.commit()
+	return counts
+
+
+def cleanup(company, commit=True):
+	"""Deletes every record generated by the benchmark for `company` and rebuilds the VAT ledger of their months."""
+	from_date, to_date = frappe.db.sql(
+		"SELECT MIN(posting_date), MAX(posting_date) FROM `tabSales Invoice` WHERE name LIKE %s AND company = %s",
+		(f"{PREFIX}%", company),
+	)[0]
+
+	for doctype in ("Sales Taxes and Charges", "Purchase Taxes and Charges", "Salary Detail"):
+		frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE parent LIKE %s", f"{PREFIX}%")
+	for doctype in ("Sales Invoice", "Purchase Invoice", "Salary Slip"):
+		frappe.db.sql(
+			f"DELETE FROM `tab{doctype}` WHERE name LIKE %s AND company = %s", (f"{PREFIX}%", company)
+		)
+	frappe.db.sql(
+		"DELETE FROM `tabGL Entry` WHERE voucher_no LIKE %s AND company = %s", (f"{PREFIX}%", company)
+	)
+	if from_date:
+		rebuild_vat_ledger(company=company, from_date=from_date, to_date=to_date, commit=False)
+	frappe.db.delete("Fiscal Year", {"name": ("like", f"{PREFIX}%")})
+	frappe.cache.delete_value("fiscal_years")
+	if commit:
+		frappe.db.commit()
+
+
+def _ensure_fiscal_year(date):
+	"""Creates a calendar Fiscal Year covering `date` when the site has none."""
+	if frappe.db.exists("Fiscal Year", {"year_start_date": ("<=", date), "year_end_date": (">=", date)}):
+		return
+
+	frappe.get_doc(
+		{
+			"doctype": "Fiscal Year",
+			"year": f"{PREFIX}{date.year}",
+			"year_start_date": f"{date.year}-01-01",
+			"year_end_date": f"{date.year}-12-31",
+		}
+	).insert(ignore_permissions=True)
+	frappe.cache.delete_value("fiscal_years")
+
+
+def _get_context(company):
+	create_tax_templates(company)
+	company_doc = frappe.get_cached_doc("Company", company)
+
+	context = frappe._dict(
+		company=company,
+		sales_rates=_get_template_taxes(company, "Sales Taxes and Charges"),
+		purchase_rates=_get_template_taxes(company, "Purchase Taxes and Charges"),
+		stamp_account=next(
+			iter(_get_template_taxes(company, "Sales Taxes and Charges", "Actual")), frappe._dict()
+		).account_head,
+		withholding_account=next(iter(get_role_accounts(company, WITHHOLDING)), None),
+		receivable=company_doc.default_receivable_account,
+		payable=company_doc.default_payable_account,
+		income=company_doc.default_income_account,
+		expense=company_doc.default_expense_account,
+		cost_center=company_doc.cost_center,
+		customer=f"{PREFIX}Customer",
+		supplier=f"{PREFIX}Supplier",
+		fiscal_years={},
+	)
+	if not (context.sales_rates and context.purchase_rates and context.stamp_account):
+		frappe.throw(f"The Tunisian tax templates could not be found for {company}.")
+	return context
+
+
+def _get_template_taxes(company, doctype, charge_type="On Net Total"):
+	"""Returns the distinct (account_head, rate) lines of the company's tax templates."""
+	return frappe.db.sql(
+		f"""
+		SELECT DISTINCT tax.account_head, tax.rate
+		FROM `tab{doctype}` tax
+		INNER JOIN `tab{doctype} Template` tpl ON tpl.name = tax.parent
+		WHERE tpl.company = %s AND tax.parenttype = %s AND tax.charge_type = %s
+		ORDER BY tax.rate
+		""",
+		(company, f"{doctype} Template", charge_type),
+		as_dict=1,
+	)
+
+
+def _add_sales_invoice(batch, context, name, posting_date, net, i):
+	tax = context.sales_rates[i % len(context.sales_rates)]
+	vat = net * tax.rate / 100
+	total = net + vat + 1
+
+	batch["Sales Invoice"].append(
+		{
+			"name": name,
+			"company": context.company,
+			"posting_date": posting_date,
+			"customer": context.customer,
+			"base_net_total": net,
+			"base_grand_total": total,
+		}
+	)
+	batch["Sales Taxes and Charges"] += [
+		_tax_row(name, 1, tax.account_head, tax.rate, vat, "On Net Total"),
+		_tax_row(name, 2, context.stamp_account, 0, 1, "Actual"),
+	]
+	batch["GL Entry"] += [
+		_gl(
+			context,
+			name,
+			"Sales Invoice",
+			posting_date,
+			context.receivable,
+			debit=total,
+			party=context.customer,
+		),
+		_gl(context, name, "Sales Invoice", posting_date, context.income, credit=net),
+		_gl(context, name, "Sales Invoice", posting_date, tax.account_head, credit=vat),
+		_gl(context, name, "Sales Invoice", posting_date, context.stamp_account, credit=1),
+	]
+
+
+def _add_purchase_invoice(batch, context, name, posting_date, net, i):
+	tax = context.purchase_rates[i % len(context.purchase_rates)]
+	vat = net * tax.rate / 100
+	withholding = net * 0.015 if context.withholding_account and i % 10 == 0 else 0
+	total = net + vat - withholding
+
+	batch["Purchase Invoice"].append(
+		{
+			"name": name,
+			"company": context.company,
+			"posting_date": posting_date,
+			"supplier": context.supplier,
+			"base_net_total": net,
+			"base_grand_total": total,
+		}
+	)
+	batch["Purchase Taxes and Charges"].append(
+		_tax_row(name, 1, tax.account_head, tax.rate, vat, "On Net Total")
+	)
+	batch["GL Entry"] += [
+		_gl(
+			context,
+			name,
+			"Purchase Invoice",
+			posting_date,
+			context.payable,
+			credit=total,
+			party=context.supplier,
+		),
+		_gl(context, name, "Purchase Invoice", posting_date, context.expense, debit=net),
+		_gl(context, name, "Purchase Invoice", posting_date, tax.account_head, debit=vat),
+	]
+	if withholding:
+		batch["Purchase Taxes and Charges"].append(
+			_tax_row(name, 2, context.withholding_account, 1.5, withholding, "On Net Total")
+		)
+		batch["GL Entry"].append(
+			_gl(
+				context,
+				name,
+				"Purchase Invoice",
+				posting_date,
+				context.withholding_account,
+				credit=withholding,
+			)
+		)
+
+
+def _add_salary_slip(batch, context, name, start_date, end_date):
+	batch["Salary Slip"].append(
+		{
+			"name": name,
+			"company": context.company,
+			"employee_name": "Benchmark",
+			"start_date": start_date,
+			"end_date": end_date,
+			"posting_date": end_date,
+		}
+	)
+	batch["Salary Detail"] += [
+		{
+			"name": f"{name}-{idx}",
+			"parent": name,
+			"idx": idx,
+			"salary_component": component,
+			"amount": 10.0 * idx,
+		}
+		for idx, component in enumerate(PAYROLL_TAX_COMPONENTS, start=1)
+	]
+
+
+def _tax_row(parent, idx, account_head, rate, amount, charge_type):
+	return {
+		"name": f"{parent}-{idx}",
+		"parent": parent,
+		"idx": idx,
+		"account_head": account_head,
+		"rate": rate,
+		"charge_type": charge_type,
+		"tax_amount": amount,
+		"base_tax_amount": amount,
+	}
+
+
+def _gl(context, voucher_no, voucher_type, posting_date, account, debit=0, credit=0, party=None):
+	if posting_date not in context.fiscal_years:
+		context.fiscal_years[posting_date] = get_fiscal_year(posting_date, company=context.company)[0]
+
+	party_type = None
+	if party:
+		party_type = "Customer" if voucher_type == "Sales Invoice" else "Supplier"
+
+	return {
+		"name": frappe.generate_hash(length=12),
+		"company": context.company,
+		"posting_date": posting_date,
+		"fiscal_year": context.fiscal_years[posting_date],
+		"voucher_type": voucher_type,
+		"voucher_no": voucher_no,
+		"account": account,
+		"party_type": party_type,
+		"party": party,
+		"debit": debit,
+		"credit": credit,
+		"debit_in_account_currency": debit,
+		"credit_in_account_currency": credit,
+		"cost_center": context.cost_center,
+		"is_cancelled": 0,
+	}
+
+
+def _flush(batch, counts):
+	timestamp, user = now(), frappe.session.user
+	for doctype, defaults in BATCH_DEFAULTS.items():
+		rows = batch[doctype]
+		if not rows:
+			continue
+
+		frappe.db.bulk_insert(
+			doctype,
+			fields=["creation", "modified", "owner", "modified_by", *defaults, *rows[0]],
+			values=[(timestamp, timestamp, user, user, *defaults.values(), *row.values()) for row in rows],
+			chunk_size=CHUNK_SIZE,
+		)
+		counts[doctype] = counts.get(doctype, 0) + len(rows)
+		rows.clear()
+
+
+def _new_declaration(company, start_date, data_source):
+	doc = frappe.new_doc("VAT Declaration")
+	doc.update(
+		{
+			"company": company,
+			"fiscal_year": get_fiscal_year(start_date, company=company)[0],
+			"month": MONTHS[start_date.month - 1],
+			"data_source": data_source,
+			"fetch_fodec": 1,
+		}
+	)
+	return doc
+
+
+def _measure_accounting_journal(company, calls):
+	from tunisia_compliance.tunisia_compliance.doctype.accounting_journal.accounting_journal import (
+		get_accounting_journal,
+	)
+
+	docs = [
+		{
+			"doctype": "Sales Invoice",
+			"company": company,
+			"name": f"{PREFIX}SI-{i:07d}",
+			"is_return": i % 20 == 0,
+		}
+		for i in range(calls)
+	]
+	start = time.perf_counter()
+	for doc in docs:
+		get_accounting_journal(doc)
+	duration = (time.perf_counter() - start) * 1000
+	return {
+		"calls": calls,
+		"duration_ms": round(duration, 2),
+		"per_call_ms": round(duration / calls, 4) if calls else 0,
+	}
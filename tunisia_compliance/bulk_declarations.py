@@ -0,0 +1,174 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Creates or refreshes VAT Declarations for many companies and months at once.
+
+Work is split into one job per company. Within a company, months are processed in
+ascending order and the VAT credit of each month is carried into the next one, as
+`vat_credit.get_credit_chain` does, whether or not the declarations are submitted.
+A failed month stops the chain of its company: the following months would carry a
+wrong credit, so they are reported as skipped.
+"""
+
+import frappe
+from erpnext.accounts.utils import get_fiscal_year
+from frappe import _
+from frappe.utils import add_months, cint, getdate
+from frappe.utils.background_jobs import is_job_enqueued
+
+from tunisia_compliance.utils import MONTHS, get_periods
+
+
+@frappe.whitelist()
+def generate_declarations(companies=None, from_month=None, to_month=None, submit=0, enqueue=1):
+	"""
+	Generates declarations for `companies` (all Tunisian companies by default) and
+	every month between `from_month` and `to_month` ("YYYY-MM", inclusive).
+
+	Returns the batch id and, when run inline, the summary.
+	"""
+	frappe.only_for("System Manager")
+
+	companies = frappe.parse_json(companies) if companies else None
+	if isinstance(companies, str):
+		companies = [companies]
+	companies = companies or frappe.get_all("Company", filters={"country": "Tunisia"}, pluck="name")
+	periods = get_periods(from_month, to_month)
+	if not companies or not periods:
+		frappe.throw(_("Please select at least one company and one month."))
+
+	batch_id = frappe.generate_hash(length=8)
+	_set_summary(batch_id, {"batch_id": batch_id, "companies": companies, "results": []})
+
+	for company in companies:
+		kwargs = {"company": company, "periods": periods, "submit": cint(submit), "batch_id": batch_id}
+		if not cint(enqueue):
+			generate_company_declarations(**kwargs)
+			continue
+
+		job_id = get_job_id(company)
+		if is_job_enqueued(job_id):
+			# one chain per company at a time, the running batch owns its months
+			_add_results(batch_id, _skip_periods(company, periods, "Already running in another batch"))
+			continue
+		frappe.enqueue(
+			"tunisia_compliance.bulk_declarations.generate_company_declarations",
+			queue="long",
+			timeout=7200,
+			job_id=job_id,
+			deduplicate=True,
+			**kwargs,
+		)
+
+	return {"batch_id": batch_id, "summary": None if cint(enqueue) else get_generation_summary(batch_id)}
+
+
+@frappe.whitelist()
+def get_generation_summary(batch_id):
+	summary = frappe.cache.get_value(_get_summary_key(batch_id)) or {}
+	results = summary.get("results", [])
+	summary["totals"] = {
+		status: len([r for r in results if r["status"] == status])
+		for status in ("created", "updated", "skipped", "failed")
+	}
+	return summary
+
+
+def get_job_id(company):
+	return f"vat_declaration_bulk::{company}"
+
+
+def generate_company_declarations(company, periods, submit=0, batch_id=None):
+	"""
+	Processes the months of one company in order, committing after each declaration
+	and carrying its credit into the next month. Stops at the first failure.
+	"""
+	from tunisia_compliance.vat_credit import _get_credit, get_declarations_by_period
+
+	periods = sorted(getdate(period) for period in periods)
+	opening_period = add_months(periods[0], -1)
+	# a submitted month may only carry the credit of a submitted declaration
+	opening = get_declarations_by_period(
+		company, opening_period, opening_period, submitted_only=bool(cint(submit))
+	).get(opening_period)
+	credit = _get_credit(opening.vat_due) if opening else 0.0
+
+	results = []
+	for index, start_date in enumerate(periods):
+		result = {"company": company, "period": str(start_date)[:7], "declaration": None}
+		try:
+			result.update(_generate_declaration(company, start_date, submit, credit))
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(frappe.get_traceback(), f"Bulk VAT Declaration failed for {company}")
+			result["status"] = "failed"
+			results.append(result)
+			results.extend(_skip_periods(company, periods[index + 1 :], f"{result['period']} failed"))
+			break
+		results.append(result)
+		credit = _get_credit(result["vat_due"])
+
+	if batch_id:
+		_add_results(batch_id, results)
+	return results
+
+
+def _generate_declaration(company, start_date, submit, previous_month_credit):
+	fiscal_year = get_fiscal_year(start_date, company=company)[0]
+	month = MONTHS[start_date.month - 1]
+	filters = {"company": company, "fiscal_year": fiscal_year, "month": month, "docstatus": ["!=", 2]}
+
+	existing = frappe.get_all(
+		"VAT Declaration", filters=filters, fields=["name", "docstatus", "vat_due"], limit=1
+	)
+	if existing and existing[0].docstatus == 1:
+		return {"status": "skipped", "declaration": existing[0].name, "vat_due": existing[0].vat_due}
+
+	if existing:
+		doc = frappe.get_doc("VAT Declaration", existing[0].name)
+		status = "updated"
+	else:
+		doc = frappe.new_doc("VAT Declaration")
+		doc.update({"company": company, "fiscal_year": fiscal_year, "month": month})
+		status = "created"
+
+	doc.run_fetch_stages()
+	# `_fetch_previous_month_credit` only reads submitted declarations
+	doc.previous_month_credit = previous_month_credit
+	doc.calculate_totals()
+	doc.save()
+	if submit:
+		doc.submit()
+
+	return {"status": status, "declaration": doc.name, "vat_due": doc.vat_due}
+
+
+def _skip_periods(company, periods, reason):
+	return [
+		{
+			"company": company,
+			"period": str(period)[:7],
+			"declaration": None,
+			"status": "skipped",
+			"reason": reason,
+		}
+		for period in periods
+	]
+
+
+def _get_summary_key(batch_id):
+	return f"vat_declaration_bulk_summary::{batch_id}"
+
+
+def _set_summary(batch_id, summary):
+	frappe.cache.set_value(_get_summary_key(batch_id), summary, expires_in_sec=86400)
+
+
+def _add_results(batch_id, results):
+	# company jobs finish concurrently, so serialise the read-modify-write of the summary
+	with frappe.cache.lock(f"{_get_summary_key(batch_id)}::lock", timeout=30):
+		summary = frappe.cache.get_value(_get_summary_key(batch_id)) or {"batch_id": batch_id, "results": []}
+		summary["results"].extend(results)
+		_set_summary(batch_id, summary)
@@ -0,0 +1,356 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Bulk loader for the Tunisian Chart of Accounts.
+
+ERPNext's `import_coa` inserts the ~600 accounts of the chart one document at a
+time and maintains the nested set on every insert. This loader parses the chart
+template, builds the tree in memory, numbers `lft`/`rgt` in a single depth-first
+traversal and writes all accounts with one bulk insert, shifted into a range
+reserved after the current end of the Account nested set. The end is kept in a
+Series counter row, locked until the load commits, so concurrent loads never share
+a range and other Account writes are not blocked. Any error rolls the load back
+and falls back to `import_coa`.
+
+A template is compiled (parsed, validated and numbered) once per content: the
+compiled form is keyed by `TEMPLATE_VERSION` and the SHA-256 of the CSV, cached
+in Redis and in the site's private folder, so editing the CSV or changing the
+compiled format never serves a stale tree.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+
+import frappe
+from erpnext.accounts.doctype.account.account import get_account_autoname
+from erpnext.accounts.doctype.chart_of_accounts_importer.chart_of_accounts_importer import (
+	import_coa,
+	set_default_accounts,
+	unset_existing_data,
+)
+from frappe.utils import cint, now
+
+from tunisia_compliance.account_roles import clear_role_index
+
+CHART_FIELDS = (
+	"account_name",
+	"parent_account",
+	"account_number",
+	"parent_account_number",
+	"is_group",
+	"account_type",
+	"root_type",
+	"account_currency",
+)
+
+REPORT_TYPES = {
+	"Asset": "Balance Sheet",
+	"Liability": "Balance Sheet",
+	"Equity": "Balance Sheet",
+	"Income": "Profit and Loss",
+	"Expense": "Profit and Loss",
+}
+
+ACCOUNT_COLUMNS = (
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"docstatus",
+	"idx",
+	"company",
+	"account_name",
+	"account_number",
+	"parent_account",
+	"old_parent",
+	"is_group",
+	"account_type",
+	"root_type",
+	"report_type",
+	"account_currency",
+	"freeze_account",
+	"lft",
+	"rgt",
+)
+
+# Columns of a compiled template row; `parent` is the index of the parent row
+TEMPLATE_COLUMNS = (
+	"account_name",
+	"account_number",
+	"parent",
+	"is_group",
+	"account_type",
+	"root_type",
+	"account_currency",
+	"lft",
+	"rgt",
+)
+
+# Bump when the compiled format changes
+TEMPLATE_VERSION = 1
+
+CACHE_KEY = "tunisia_compliance_chart_templates"
+SAVEPOINT = "tunisia_compliance_coa_load"
+# Series row holding the last lft/rgt number reserved by a bulk load
+NESTED_SET_SERIES = "tunisia_compliance_account_nested_set"
+
+
+def get_default_chart_path():
+	return frappe.get_app_path(
+		"tunisia_compliance", "regional", "data", "tn_plan_comptable_general_avec_code.csv"
+	)
+
+
+def load_chart(company, path=None):
+	"""Creates the chart of `company` from the CSV template. Returns the method used ("bulk" or "import_coa")."""
+	path = path or get_default_chart_path()
+	if not os.path.exists(path):
+		raise FileNotFoundError(f"Chart template CSV not found at {path}")
+
+	frappe.db.savepoint(SAVEPOINT)
+	try:
+		bulk_load_chart(company, get_chart_template(path))
+		return "bulk"
+	except Exception:
+		frappe.db.rollback(save_point=SAVEPOINT)
+		frappe.log_error(frappe.get_traceback(), f"Bulk chart load failed for {company}, using import_coa")
+
+	import_chart_file(company, path)
+	return "import_coa"
+
+
+def get_chart_template(path=None):
+	"""Returns the compiled template of the CSV at `path`, compiling it on first use of its content."""
+	with open(path or get_default_chart_path(), "rb") as f:
+		content = f.read()
+	key = f"{TEMPLATE_VERSION}::{hashlib.sha256(content).hexdigest()}"
+	return frappe.cache.hget(CACHE_KEY, key, generator=lambda: _load_template(key, content))
+
+
+def _load_template(key, content):
+	version, digest = key.split("::")
+	path = frappe.get_site_path("private", "tunisia_compliance", f"chart-template-{version}-{digest}.json")
+	if os.path.exists(path):
+		with open(path, encoding="utf-8") as f:
+			template = frappe._dict(json.load(f))
+		if template.version == TEMPLATE_VERSION and template.hash == digest:
+			return template
+
+	template = compile_template(content)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+		json.dump(template, f, ensure_ascii=False, separators=(",", ":"))
+	os.replace(f"{path}.tmp", path)
+	return template
+
+
+def compile_template(content):
+	"""
+	Parses and validates a chart template and numbers its nested set from 0. Rows
+	follow `TEMPLATE_COLUMNS`, parents before their children.
+	"""
+	roots = build_tree(parse_chart(content))
+	width = number_nested_set(roots, 0)
+
+	nodes = list(walk(roots))
+	index = {node.account_name: i for i, node in enumerate(nodes)}
+	accounts = [
+		[
+			node.account_name,
+			node.account_number,
+			index[node.parent.account_name] if node.parent else None,
+			node.is_group,
+			node.account_type,
+			node.root_type,
+			node.account_currency,
+			node.lft,
+			node.rgt,
+		]
+		for node in nodes
+	]
+	return frappe._dict(
+		version=TEMPLATE_VERSION,
+		hash=hashlib.sha256(content).hexdigest(),
+		columns=TEMPLATE_COLUMNS,
+		width=width,
+		accounts=accounts,
+	)
+
+
+def clear_chart_templates():
+	frappe.cache.delete_value(CACHE_KEY)
+
+
+def parse_chart(content):
+	"""Reads a chart template (snake_case or "Account Name" style headers) into a list of dicts."""
+	reader = csv.reader(io.StringIO(content.decode("utf-8-sig"), newline=""))
+	header = [frappe.scrub(column) for column in next(reader)]
+	accounts = []
+	for row in reader:
+		record = dict(zip(header, row, strict=False))
+		if not (record.get("account_name") or "").strip():
+			continue
+		accounts.append({field: (record.get(field) or "").strip() for field in CHART_FIELDS})
+	return accounts
+
+
+def bulk_load_chart(company, template):
+	"""Replaces the accounts of `company` with those of a compiled `template`."""
+	unset_existing_data(company)
+
+	currency = frappe.get_cached_value("Company", company, "default_currency")
+	offset = reserve_nested_set_range(template.width)
+	accounts = [frappe._dict(zip(TEMPLATE_COLUMNS, row, strict=True)) for row in template.accounts]
+	names = [
+		get_account_autoname(account.account_number, account.account_name, company) for account in accounts
+	]
+
+	timestamp, user = now(), frappe.session.user
+	rows = []
+	for name, account in zip(names, accounts, strict=True):
+		parent_account = names[account.parent] if account.parent is not None else None
+		rows.append(
+			(
+				name,
+				timestamp,
+				timestamp,
+				user,
+				user,
+				0,
+				0,
+				company,
+				account.account_name,
+				account.account_number or None,
+				parent_account,
+				parent_account,
+				account.is_group,
+				account.account_type or None,
+				account.root_type,
+				REPORT_TYPES[account.root_type],
+				account.account_currency or currency,
+				"No",
+				account.lft + offset,
+				account.rgt + offset,
+			)
+		)
+	frappe.db.bulk_insert("Account", fields=ACCOUNT_COLUMNS, values=rows)
+
+	set_default_accounts(company)
+	clear_role_index(company)
+	frappe.clear_cache(doctype="Account")
+	return len(rows)
+
+
+def reserve_nested_set_range(width):
+	"""Reserves `width` lft/rgt numbers after the end of the Account nested set and returns the first."""
+	values = {"name": NESTED_SET_SERIES}
+	frappe.db.sql("INSERT IGNORE INTO `tabSeries` (name, current) VALUES (%(name)s, 0)", values)
+	# a primary key lock on the counter row, held until commit, serializes the loads
+	reserved = frappe.db.sql("SELECT current FROM `tabSeries` WHERE name = %(name)s FOR UPDATE", values)[0][0]
+	# a plain read, without locking every Account row: loads committed since this
+	# transaction's snapshot are covered by the counter
+	end = frappe.db.sql("SELECT MAX(rgt) FROM `tabAccount`")[0][0]
+
+	offset = max(cint(reserved), cint(end)) + 1
+	frappe.db.sql(
+		"UPDATE `tabSeries` SET current = %(end)s WHERE name = %(name)s",
+		{**values, "end": offset + width - 1},
+	)
+	return offset
+
+
+def build_tree(accounts):
+	"""Links each account to its parent by name and returns the roots, in template order."""
+	nodes = {}
+	for account in accounts:
+		if account["account_name"] in nodes:
+			raise ValueError(f"Duplicate account {account['account_name']} in chart template")
+		nodes[account["account_name"]] = frappe._dict(
+			account, is_group=cint(account["is_group"]), children=[]
+		)
+
+	roots = []
+	for node in nodes.values():
+		if not node.parent_account:
+			node.parent = None
+			roots.append(node)
+			continue
+		node.parent = nodes.get(node.parent_account)
+		if not node.parent:
+			raise ValueError(
+				f"Parent {node.parent_account} of {node.account_name} is not in the chart template"
+			)
+		if not node.parent.is_group:
+			raise ValueError(f"Parent {node.parent_account} of {node.account_name} is not a group")
+		node.parent.children.append(node)
+
+	for node in walk(roots):
+		node.root_type = node.root_type or (node.parent and node.parent.root_type)
+		if node.root_type not in REPORT_TYPES:
+			raise ValueError(f"Account {node.account_name} has no valid root type")
+
+	if sum(1 for _node in walk(roots)) != len(nodes):
+		raise ValueError("The chart template contains a cycle")
+	return roots
+
+
+def walk(roots):
+	"""Yields the nodes depth-first, parents before their children."""
+	stack = list(reversed(roots))
+	while stack:
+		node = stack.pop()
+		yield node
+		stack.extend(reversed(node.children))
+
+
+def number_nested_set(roots, start):
+	"""Assigns lft/rgt to the whole forest in one iterative depth-first traversal."""
+	counter = start
+	stack = [(node, False) for node in reversed(roots)]
+	while stack:
+		node, visited = stack.pop()
+		if visited:
+			node.rgt = counter
+			counter += 1
+			continue
+		node.lft = counter
+		counter += 1
+		stack.append((node, True))
+		stack.extend((child, False) for child in reversed(node.children))
+	return counter
+
+
+def import_chart_file(company, path):
+	"""
+	Imports the template with ERPNext's Chart of Accounts Importer. The template is
+	saved as a File once per content and that File is reused for every company.
+	"""
+	with open(path, "rb") as f:
+		content = f.read()
+
+	# same hash as File.content_hash
+	content_hash = hashlib.md5(content, usedforsecurity=False).hexdigest()
+	file_url = frappe.db.get_value(
+		"File",
+		{"content_hash": content_hash, "is_folder": 0, "file_name": ["like", "%.csv"]},
+		"file_url",
+	)
+	if not file_url:
+		file_url = (
+			frappe.get_doc(
+				{
+					"doctype": "File",
+					"file_name": os.path.basename(path),
+					"content": content,
+					"is_private": 1,
+				}
+			)
+			.insert(ignore_permissions=True)
+			.file_url
+		)
+	import_coa(file_name=file_url, company=company)
@@ -0,0 +1,238 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-vat-ledger")
+@click.option("--company", help="Only rebuild this company (defaults to every Tunisian company)")
+@click.option(
+	"--from-date", help="A date in the first month to rebuild (YYYY-MM-DD); whole months are rebuilt"
+)
+@click.option("--to-date", help="A date in the last month to rebuild (YYYY-MM-DD); whole months are rebuilt")
+@pass_context
+def rebuild_vat_ledger(context, company=None, from_date=None, to_date=None):
+	"Recompute the monthly VAT Ledger Entry totals from submitted invoices"
+	from tunisia_compliance.vat_ledger import rebuild_vat_ledger
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		companies = rebuild_vat_ledger(company=company, from_date=from_date, to_date=to_date)
+		click.echo(f"VAT ledger rebuilt for {len(companies)} compan{'y' if len(companies) == 1 else 'ies'}.")
+	finally:
+		frappe.destroy()
+
+
+@click.command("generate-vat-declarations")
+@click.option(
+	"--company",
+	"companies",
+	multiple=True,
+	help="Company to generate (repeatable, defaults to every Tunisian company)",
+)
+@click.option("--from-month", required=True, help="First month to generate (YYYY-MM)")
+@click.option("--to-month", help="Last month to generate (YYYY-MM, defaults to --from-month)")
+@click.option(
+	"--submit",
+	is_flag=True,
+	default=False,
+	help="Submit each declaration (drafts also carry their credit to the next month)",
+)
+@click.option(
+	"--enqueue", is_flag=True, default=False, help="Run one background job per company instead of inline"
+)
+@pass_context
+def generate_vat_declarations(context, companies, from_month, to_month=None, submit=False, enqueue=False):
+	"Create or refresh VAT Declarations for several companies and months"
+	from tunisia_compliance.bulk_declarations import generate_declarations
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	frappe.set_user("Administrator")
+	try:
+		result = generate_declarations(
+			companies=list(companies) or None,
+			from_month=from_month,
+			to_month=to_month,
+			submit=submit,
+			enqueue=enqueue,
+		)
+		if enqueue:
+			click.echo(f"Enqueued batch {result['batch_id']}.")
+			return
+
+		for row in result["summary"]["results"]:
+			click.echo(
+				f"{row['company']}\t{row['period']}\t{row['status']}\t{row['declaration'] or row.get('reason') or ''}"
+			)
+		click.echo(", ".join(f"{count} {status}" for status, count in result["summary"]["totals"].items()))
+	finally:
+		frappe.destroy()
+
+
+@click.command("check-tunisia-compliance-indexes")
+@click.option("--create", is_flag=True, default=False, help="Create the missing indexes")
+@click.option(
+	"--explain",
+	is_flag=True,
+	default=False,
+	help="Print the EXPLAIN plan of the declaration and journal queries",
+)
+@click.option(
+	"--company", help="Company used to run the hot queries (defaults to the first Tunisian company)"
+)
+@pass_context
+def check_indexes(context, create=False, explain=False, company=None):
+	"Report the composite indexes used by declarations and accounting journals"
+	from tunisia_compliance.db_indexes import create_indexes, explain_hot_queries, get_missing_indexes
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		if create:
+			for doctype, index_name in create_indexes():
+				click.echo(f"Created {index_name} on {doctype}")
+			frappe.db.commit()
+
+		missing = get_missing_indexes()
+		for index in missing:
+			click.secho(f"Missing: {index.doctype} ({', '.join(index.columns)})", fg="yellow")
+		if not missing:
+			click.secho("All indexes are present.", fg="green")
+
+		if explain:
+			for query in explain_hot_queries(company=company):
+				click.echo(f"\n{query.query[:200]}\n  took {query.duration * 1000:.1f} ms")
+				for step in query.plan:
+					click.echo(
+						f"  {step.get('table')}: type={step.get('type')} key={step.get('key')} rows={step.get('rows')}"
+					)
+	finally:
+		frappe.destroy()
+
+
+@click.command("run-tunisia-compliance-benchmark")
+@click.option("--company", help="Tunisian company to generate data for (defaults to the first one)")
+@click.option("--sizes", default="1000,10000,100000", help="Comma-separated document volumes to benchmark")
+@click.option("--output", help="Write the JSON report to this file")
+@click.option("--keep-data", is_flag=True, default=False, help="Do not delete the generated documents")
+@pass_context
+def run_benchmark(context, company=None, sizes=None, output=None, keep_data=False):
+	"Time the declaration pipeline on generated invoices, salary slips and GL entries"
+	from tunisia_compliance.benchmark import run
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	frappe.set_user("Administrator")
+	try:
+		report = run(
+			company=company,
+			sizes=[int(size) for size in sizes.split(",") if size.strip()],
+			output=output,
+			keep_data=keep_data,
+		)
+		if not output:
+			click.echo(frappe.as_json(report))
+	finally:
+		frappe.destroy()
+
+
+@click.command("backfill-accounting-journals")
+@click.option("--from-date", required=True, help="First posting date to backfill (YYYY-MM-DD)")
+@click.option("--to-date", required=True, help="Last posting date to backfill (YYYY-MM-DD)")
+@click.option("--company", help="Only backfill this company")
+@click.option("--workers", default=1, type=int, help="Split the range into this many background jobs")
+@click.option("--chunk-size", default=1000, type=int, help="Vouchers per transaction")
+@click.option("--reset", is_flag=True, default=False, help="Ignore the saved checkpoint and start over")
+@pass_context
+def backfill_accounting_journals(
+	context, from_date, to_date, company=None, workers=1, chunk_size=1000, reset=False
+):
+	"Assign journals to GL Entries posted without one, resuming from the last checkpoint"
+	from tunisia_compliance.journal_backfill import backfill_journals, enqueue_backfill
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	frappe.set_user("Administrator")
+	try:
+		if workers > 1:
+			job_ids = enqueue_backfill(from_date, to_date, company, workers, chunk_size, reset)
+			frappe.db.commit()
+			click.echo("\n".join(f"Enqueued {job_id}" for job_id in job_ids))
+			return
+
+		checkpoint = backfill_journals(from_date, to_date, company, chunk_size, reset)
+		click.echo(f"{checkpoint['assigned']} of {checkpoint['vouchers']} vouchers assigned a journal.")
+	finally:
+		frappe.destroy()
+
+
+@click.command("verify-journal-numbering")
+@click.option("--journal", help="Only check this Accounting Journal")
+@click.option("--fiscal-year", help="Only check this Fiscal Year")
+@click.option("--number-pending", is_flag=True, default=False, help="Number the pending entries first")
+@pass_context
+def verify_journal_numbering(context, journal=None, fiscal_year=None, number_pending=False):
+	"Report gaps and duplicates in the entry numbering of accounting journals"
+	from tunisia_compliance.journal_numbering import find_numbering_issues, number_pending_entries
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		if number_pending:
+			click.echo(f"Numbered {number_pending_entries()} pending vouchers.")
+
+		issues = find_numbering_issues(journal, fiscal_year)
+		for issue in issues:
+			click.secho(f"{issue.accounting_journal} ({issue.fiscal_year})", fg="yellow")
+			for start, end in issue.gaps:
+				click.echo(f"  missing {start}" + (f" to {end}" if end != start else ""))
+			for number in issue.duplicates:
+				click.echo(f"  {number} is used by several vouchers")
+			if issue.highest_number > issue.last_number:
+				click.echo(f"  counter at {issue.last_number} but {issue.highest_number} is assigned")
+		if not issues:
+			click.secho("No gaps found.", fg="green")
+	finally:
+		frappe.destroy()
+
+
+@click.command("rebuild-journal-balances")
+@click.option("--company", help="Only rebuild this company (defaults to every company)")
+@click.option("--from-date", help="First posting date to rebuild (YYYY-MM-DD)")
+@click.option("--to-date", help="Last posting date to rebuild (YYYY-MM-DD)")
+@pass_context
+def rebuild_journal_balances(context, company=None, from_date=None, to_date=None):
+	"Recompute the monthly Accounting Journal Balance totals from GL Entries, e.g. after ledger reposts"
+	from tunisia_compliance.journal_balances import rebuild_journal_balances
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		companies = rebuild_journal_balances(company=company, from_date=from_date, to_date=to_date)
+		click.echo(
+			f"Journal balances rebuilt for {len(companies)} compan{'y' if len(companies) == 1 else 'ies'}."
+		)
+	finally:
+		frappe.destroy()
+
+
+commands = [
+	rebuild_vat_ledger,
+	generate_vat_declarations,
+	check_indexes,
+	run_benchmark,
+	backfill_accounting_journals,
+	verify_journal_numbering,
+	rebuild_journal_balances,
+]
@@ -0,0 +1,121 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Composite indexes needed by the declaration and accounting journal queries, with
+helpers to create them, report the missing ones and EXPLAIN the hot queries.
+"""
+
+import frappe
+from frappe.utils import get_first_day, get_last_day, getdate, nowdate
+
+from tunisia_compliance.utils import capture_queries
+
+# (doctype, columns, index name)
+INDEXES = (
+	("Sales Invoice", ("company", "docstatus", "posting_date"), "tn_company_docstatus_posting_date"),
+	("Purchase Invoice", ("company", "docstatus", "posting_date"), "tn_company_docstatus_posting_date"),
+	("Sales Taxes and Charges", ("parent", "account_head"), "tn_parent_account_head"),
+	("Purchase Taxes and Charges", ("parent", "account_head"), "tn_parent_account_head"),
+	("Salary Detail", ("parenttype", "salary_component", "parent"), "tn_parenttype_component_parent"),
+	("Salary Slip", ("company", "start_date", "end_date"), "tn_company_start_end_date"),
+	("GL Entry", ("voucher_type", "voucher_no", "is_cancelled"), "tn_voucher_is_cancelled"),
+	("GL Entry", ("accounting_journal", "posting_date"), "tn_accounting_journal_posting_date"),
+	("GL Entry", ("posting_date", "voucher_type", "voucher_no"), "tn_posting_date_voucher"),
+	("GL Entry", ("accounting_journal", "fiscal_year", "journal_entry_number"), "tn_journal_entry_number"),
+	("VAT Declaration", ("company", "fiscal_year", "month"), "tn_company_fiscal_year_month"),
+)
+
+
+def create_indexes():
+	"""Creates the missing indexes. Safe to run repeatedly."""
+	created = []
+	for doctype, columns, index_name in INDEXES:
+		if not _can_index(doctype, columns) or _find_covering_index(doctype, columns):
+			continue
+		frappe.db.add_index(doctype, list(columns), index_name)
+		created.append((doctype, index_name))
+	return created
+
+
+def get_missing_indexes():
+	"""Returns the expected indexes that no existing index covers (as a leading prefix)."""
+	missing = []
+	for doctype, columns, index_name in INDEXES:
+		if not _can_index(doctype, columns):
+			continue
+		if not _find_covering_index(doctype, columns):
+			missing.append(frappe._dict(doctype=doctype, columns=columns, index_name=index_name))
+	return missing
+
+
+def explain_hot_queries(company=None, date=None):
+	"""
+	Runs a declaration fetch and a journal lookup for `company` and returns the
+	EXPLAIN plan of every SELECT they issued.
+	"""
+	company = company or frappe.db.get_value("Company", {"country": "Tunisia"})
+	if not company:
+		return []
+
+	start_date = get_first_day(getdate(date or nowdate()))
+	with capture_queries() as queries:
+		_run_declaration_queries(company, start_date)
+		_run_journal_queries(company)
+
+	plans = []
+	for query in queries:
+		if not query.query.lstrip().lower().startswith(("select", "with")):
+			continue
+		plans.append(
+			frappe._dict(
+				query=" ".join(query.query.split()),
+				duration=query.duration,
+				plan=frappe.db.sql(f"EXPLAIN {query.query}", query.values, as_dict=1),
+			)
+		)
+	return plans
+
+
+def _run_declaration_queries(company, start_date):
+	from erpnext.accounts.utils import get_fiscal_year
+
+	from tunisia_compliance.utils import MONTHS
+
+	doc = frappe.new_doc("VAT Declaration")
+	doc.update(
+		{
+			"company": company,
+			"fiscal_year": get_fiscal_year(start_date, company=company)[0],
+			"month": MONTHS[start_date.month - 1],
+		}
+	)
+	doc.run_fetch_stages()
+
+
+def _run_journal_queries(company):
+	from tunisia_compliance.tunisia_compliance.doctype.accounting_journal.accounting_journal import (
+		get_entries,
+	)
+
+	voucher = frappe.db.get_value(
+		"Sales Invoice", {"company": company, "docstatus": 1}, "name", order_by="posting_date desc"
+	)
+	if voucher:
+		get_entries("Sales Invoice", frappe.as_json([voucher]))
+
+
+def _can_index(doctype, columns):
+	return frappe.db.table_exists(doctype) and all(frappe.db.has_column(doctype, col) for col in columns)
+
+
+def _find_covering_index(doctype, columns):
+	existing = {}
+	for row in frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}`", as_dict=1):
+		existing.setdefault(row.Key_name, []).append((row.Seq_in_index, row.Column_name))
+
+	for key_name, key_columns in existing.items():
+		ordered = tuple(column for _seq, column in sorted(key_columns))
+		if ordered[: len(columns)] == tuple(columns):
+			return key_name
+	return None
@@ -268,7 +268,8 @@ fixtures = [
             # Add more DocTypes here if your app customizes others (e.g., Company, Sales Invoice).
             ["dt", "in", [
                 "Company",
-                "Employee"
+                "Employee",
+                "GL Entry"
                 # Add any other DocTypes you have customized here
             ]]
         ]
@@ -293,3 +294,38 @@ fixtures = [
     # for Doctypes relevant to your app.
     # "Naming Series"
 ]
+
+# Keeps the monthly VAT Ledger Entry totals in sync with invoices
+# (amending cancels the original and submits the amendment, so both are covered)
+doc_events = {
+    "Sales Invoice": {
+        "on_submit": "tunisia_compliance.vat_ledger.on_invoice_submit",
+        "on_cancel": "tunisia_compliance.vat_ledger.on_invoice_cancel",
+    },
+    "Purchase Invoice": {
+        "on_submit": "tunisia_compliance.vat_ledger.on_invoice_submit",
+        "on_cancel": "tunisia_compliance.vat_ledger.on_invoice_cancel",
+    },
+    # Invalidates the cached tax account role index of the company
+    "Account": {
+        "on_update": "tunisia_compliance.account_roles.on_account_change",
+        "on_trash": "tunisia_compliance.account_roles.on_account_change",
+        "after_rename": "tunisia_compliance.account_roles.on_account_change",
+    },
+    # Sets the journal resolved from the Accounting Journal rules on new GL Entries
+    "GL Entry": {
+        "before_insert": "tunisia_compliance.journal_rules.stamp_gl_entry",
+        "after_insert": "tunisia_compliance.journal_balances.on_gl_entry_insert",
+    },
+}
+
+scheduler_events = {
+    # Numbers GL Entries whose sequencer job did not run (e.g. bulk writes, worker restarts)
+    "hourly_long": [
+        "tunisia_compliance.journal_numbering.number_pending_entries",
+    ],
+    # Folds the rows appended by invoices into one VAT Ledger Entry per bucket
+    "daily_long": [
+        "tunisia_compliance.vat_ledger.compact_vat_ledger",
+    ],
+}
@@ -0,0 +1,226 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Set-based reassignment of vouchers to another Accounting Journal.
+
+Vouchers are processed in chunks, one transaction per chunk. For each chunk the
+active GL Entries are read once, cancelled with a single UPDATE, and their
+reversals (debit and credit swapped, `is_cancelled` set, as
+`make_reverse_gl_entries` does) and replacements (same values, new journal) are
+written with multi-row inserts. Vouchers whose entries are already on the target
+journal are skipped, so an interrupted job can simply be run again.
+"""
+
+import hashlib
+
+import frappe
+from erpnext.accounts.doctype.accounting_period.accounting_period import ClosedAccountingPeriod
+from erpnext.accounts.general_ledger import check_freezing_date
+from frappe import _
+from frappe.utils import getdate, now
+
+from tunisia_compliance.journal_balances import add_entry_balances, upsert_balances
+from tunisia_compliance.journal_numbering import enqueue_numbering, forget_voucher_numbers
+
+CHUNK_SIZE = 500
+
+# columns set explicitly on every inserted row instead of being copied
+OWN_COLUMNS = ("name", "creation", "modified", "modified_by", "owner", "is_cancelled", "accounting_journal")
+
+SWAPPED_COLUMNS = (
+	("debit", "credit"),
+	("debit_in_account_currency", "credit_in_account_currency"),
+	("debit_in_transaction_currency", "credit_in_transaction_currency"),
+)
+
+
+def adjust_vouchers(doctype, docnames, accounting_journal, progress_callback=None, commit=False):
+	"""
+	Moves the GL Entries of `docnames` to `accounting_journal`. With `commit`, each
+	chunk is committed on its own so a failure only rolls back the current chunk.
+	Returns the number of vouchers adjusted.
+	"""
+	columns = get_copy_columns()
+	adjusted = 0
+	total = len(docnames)
+
+	for start in range(0, total, CHUNK_SIZE):
+		chunk = docnames[start : start + CHUNK_SIZE]
+		try:
+			adjusted += _adjust_chunk(doctype, chunk, accounting_journal, columns)
+			if commit:
+				frappe.db.commit()
+		except Exception:
+			if commit:
+				frappe.db.rollback()
+			raise
+
+		if progress_callback:
+			progress_callback(min(start + CHUNK_SIZE, total), total)
+
+	if adjusted:
+		enqueue_numbering()
+	return adjusted
+
+
+def _adjust_chunk(doctype, vouchers, accounting_journal, columns):
+	entries = frappe.db.sql(
+		f"""
+		SELECT name, {", ".join(f"`{column}`" for column in columns)}, accounting_journal
+		FROM `tabGL Entry`
+		WHERE voucher_type = %s AND voucher_no IN %s AND is_cancelled = 0
+		ORDER BY voucher_no, creation
+		FOR UPDATE
+		""",
+		(doctype, tuple(vouchers)),
+		as_dict=1,
+	)
+
+	by_voucher = {}
+	for entry in entries:
+		by_voucher.setdefault(entry.voucher_no, []).append(entry)
+	entries = [
+		entry
+		for voucher_entries in by_voucher.values()
+		if any(entry.accounting_journal != accounting_journal for entry in voucher_entries)
+		for entry in voucher_entries
+	]
+	if not entries:
+		return 0
+
+	validate_entries(entries)
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.sql(
+		"""
+		UPDATE `tabGL Entry` SET is_cancelled = 1, modified = %s, modified_by = %s
+		WHERE name IN %s
+		""",
+		(timestamp, user, tuple(entry.name for entry in entries)),
+	)
+
+	# inserted rows get a temporary hash name, renamed later like any other GL Entry
+	to_rename = int(frappe.get_meta("GL Entry").autoname != "hash")
+	rows = []
+	for entry in entries:
+		if "to_rename" in entry:
+			entry.to_rename = to_rename
+		reversal = _reverse(entry)
+		if reversal.debit or reversal.credit:
+			rows.append(_row(reversal, columns, 1, entry.accounting_journal, timestamp, user))
+		# the replacement is numbered again in its new journal
+		if "journal_entry_number" in entry:
+			entry.journal_entry_number = 0
+		rows.append(_row(entry, columns, 0, accounting_journal, timestamp, user))
+
+	frappe.db.bulk_insert(
+		"GL Entry",
+		fields=[*columns, *OWN_COLUMNS],
+		values=rows,
+		chunk_size=CHUNK_SIZE * 4,
+	)
+	forget_voucher_numbers(doctype, {entry.voucher_no for entry in entries})
+
+	# the amounts leave the journal of the cancelled entries and move to the target journal
+	deltas = add_entry_balances({}, entries, sign=-1)
+	upsert_balances(add_entry_balances(deltas, entries, accounting_journal))
+	return len({entry.voucher_no for entry in entries})
+
+
+def validate_entries(entries):
+	"""Applies the accounts freezing date and closed accounting period checks of the GL posting."""
+	check_freezing_date(min(getdate(entry.posting_date) for entry in entries), adv_adj=False)
+
+	company, voucher_type = entries[0].company, entries[0].voucher_type
+	closed_periods = frappe.db.sql(
+		"""
+		SELECT ap.name, ap.start_date, ap.end_date
+		FROM `tabAccounting Period` ap
+		INNER JOIN `tabClosed Document` cd ON cd.parent = ap.name
+		WHERE ap.company = %s AND cd.closed = 1 AND cd.document_type = %s
+		""",
+		(company, voucher_type),
+		as_dict=1,
+	)
+	for period in closed_periods:
+		if any(period.start_date <= getdate(entry.posting_date) <= period.end_date for entry in entries):
+			message = _(
+				"You cannot create or cancel any accounting entries with in the closed Accounting Period {0}"
+			)
+			frappe.throw(message.format(frappe.bold(period.name)), ClosedAccountingPeriod)
+
+
+def get_copy_columns():
+	meta = frappe.get_meta("GL Entry")
+	return [
+		column
+		for column in meta.get_valid_columns()
+		if column not in OWN_COLUMNS
+		and not column.startswith("_")
+		and frappe.db.has_column("GL Entry", column)
+	]
+
+
+def _reverse(entry):
+	reversal = frappe._dict(entry)
+	for debit, credit in SWAPPED_COLUMNS:
+		if debit in entry:
+			reversal[debit], reversal[credit] = entry.get(credit), entry.get(debit)
+	reversal.remarks = "On cancellation of " + entry.voucher_no
+	return reversal
+
+
+def _row(entry, columns, is_cancelled, accounting_journal, timestamp, user):
+	return (
+		*(entry.get(column) for column in columns),
+		frappe.generate_hash(length=10),
+		timestamp,
+		timestamp,
+		user,
+		user,
+		is_cancelled,
+		accounting_journal,
+	)
+
+
+def get_job_id(doctype, docnames, accounting_journal):
+	digest = hashlib.sha1(frappe.as_json(sorted(docnames)).encode()).hexdigest()[:12]
+	return f"accounting_journal_adjustment::{doctype}::{accounting_journal}::{digest}"
+
+
+def get_adjustment_progress(job_id):
+	return frappe.cache.get_value(f"accounting_journal_adjustment_progress::{job_id}")
+
+
+def set_adjustment_progress(job_id, status, percent, message=None):
+	progress = {"job_id": job_id, "status": status, "percent": percent, "message": message}
+	frappe.cache.set_value(f"accounting_journal_adjustment_progress::{job_id}", progress, expires_in_sec=3600)
+	frappe.publish_realtime("accounting_journal_adjustment_progress", progress, user=frappe.session.user)
+
+
+def run_adjustment(progress_key, doctype, docnames, accounting_journal):
+	"""
+	Background job enqueued by `accounting_journal.accounting_journal_adjustment`.
+	`progress_key` is the job id, which `frappe.enqueue` does not pass to the method.
+	"""
+
+	def report(done, total):
+		set_adjustment_progress(progress_key, "running", int(done * 100 / total))
+
+	try:
+		adjusted = adjust_vouchers(
+			doctype, docnames, accounting_journal, progress_callback=report, commit=True
+		)
+	except Exception:
+		frappe.log_error(frappe.get_traceback(), f"Accounting journal adjustment failed for {doctype}")
+		set_adjustment_progress(
+			progress_key,
+			"failed",
+			100,
+			_("The adjustment stopped. Run it again to resume from where it failed."),
+		)
+		raise
+
+	message = _("{0} vouchers moved to {1}").format(adjusted, accounting_journal)
+	set_adjustment_progress(progress_key, "completed", 100, message)
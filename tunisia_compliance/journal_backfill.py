@@ -0,0 +1,183 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Backfill of `accounting_journal` on GL Entries posted without one.
+
+Vouchers are walked in (posting_date, voucher_type, voucher_no) order with keyset
+pagination, so each chunk is an index range scan whatever the size of the ledger.
+The journal of every voucher of a chunk is resolved with the Accounting Journal
+rules from its document, then written with one UPDATE per (voucher type, journal)
+and committed, so locks are only held for one chunk. The position reached is
+checkpointed after every chunk and the next run for the same range resumes from
+it. A date range can be split into several ranges processed by separate workers.
+"""
+
+import json
+
+import frappe
+from frappe.utils import add_days, cint, date_diff, getdate, now
+
+from tunisia_compliance.journal_balances import add_entry_balances, upsert_balances
+from tunisia_compliance.journal_numbering import enqueue_numbering
+from tunisia_compliance.journal_rules import resolve_journals
+
+CHUNK_SIZE = 1000
+
+
+def backfill_journals(from_date, to_date, company=None, chunk_size=CHUNK_SIZE, reset=False):
+	"""
+	Assigns journals to the GL Entries of the date range that have none, resuming from
+	the last checkpoint of the range unless `reset`. Returns the checkpoint reached.
+	"""
+	key = get_checkpoint_key(from_date, to_date, company)
+	checkpoint = None if reset else get_checkpoint(key)
+	checkpoint = checkpoint or {"position": None, "vouchers": 0, "assigned": 0, "completed": 0}
+	if checkpoint["completed"]:
+		return checkpoint
+
+	while True:
+		vouchers = get_next_vouchers(from_date, to_date, company, checkpoint["position"], cint(chunk_size))
+		if not vouchers:
+			break
+
+		checkpoint["assigned"] += assign_journals(vouchers)
+		checkpoint["vouchers"] += len(vouchers)
+		last = vouchers[-1]
+		checkpoint["position"] = [str(last.posting_date), last.voucher_type, last.voucher_no]
+		set_checkpoint(key, checkpoint)
+		frappe.db.commit()
+
+	checkpoint["completed"] = 1
+	set_checkpoint(key, checkpoint)
+	if checkpoint["assigned"]:
+		enqueue_numbering()
+	frappe.db.commit()
+	return checkpoint
+
+
+def get_next_vouchers(from_date, to_date, company, position, limit):
+	conditions = ["posting_date BETWEEN %(from_date)s AND %(to_date)s", "IFNULL(accounting_journal, '') = ''"]
+	if company:
+		conditions.append("company = %(company)s")
+	if position:
+		conditions.append(
+			"""(posting_date > %(posting_date)s
+			OR (posting_date = %(posting_date)s AND voucher_type > %(voucher_type)s)
+			OR (posting_date = %(posting_date)s AND voucher_type = %(voucher_type)s AND voucher_no > %(voucher_no)s))"""
+		)
+	posting_date, voucher_type, voucher_no = position or (None, None, None)
+
+	return frappe.db.sql(
+		f"""
+		SELECT DISTINCT posting_date, voucher_type, voucher_no
+		FROM `tabGL Entry`
+		WHERE {" AND ".join(conditions)}
+		ORDER BY posting_date, voucher_type, voucher_no
+		LIMIT %(limit)s
+		""",
+		{
+			"from_date": from_date,
+			"to_date": to_date,
+			"company": company,
+			"posting_date": posting_date,
+			"voucher_type": voucher_type,
+			"voucher_no": voucher_no,
+			"limit": limit,
+		},
+		as_dict=1,
+	)
+
+
+def assign_journals(vouchers):
+	"""Resolves and writes the journal of `vouchers`. Returns the number of vouchers assigned."""
+	names_by_type = {}
+	for voucher in vouchers:
+		names_by_type.setdefault(voucher.voucher_type, set()).add(voucher.voucher_no)
+
+	assigned = 0
+	for voucher_type, names in names_by_type.items():
+		if not frappe.db.table_exists(voucher_type):
+			continue
+
+		docs = frappe.get_all(voucher_type, filters={"name": ("in", list(names))}, fields=["*"])
+		for doc in docs:
+			doc.doctype = voucher_type
+
+		by_journal = {}
+		for name, journal in resolve_journals(docs).items():
+			if journal:
+				by_journal.setdefault(journal, []).append(name)
+
+		deltas = {}
+		for journal, voucher_nos in by_journal.items():
+			entries = frappe.db.sql(
+				"""
+				SELECT company, account, posting_date, debit, credit
+				FROM `tabGL Entry`
+				WHERE voucher_type = %s AND voucher_no IN %s AND IFNULL(accounting_journal, '') = ''
+					AND is_cancelled = 0
+				""",
+				(voucher_type, tuple(voucher_nos)),
+				as_dict=1,
+			)
+			add_entry_balances(deltas, entries, journal)
+			frappe.db.sql(
+				"""
+				UPDATE `tabGL Entry` SET accounting_journal = %s
+				WHERE voucher_type = %s AND voucher_no IN %s AND IFNULL(accounting_journal, '') = ''
+				""",
+				(journal, voucher_type, tuple(voucher_nos)),
+			)
+			assigned += len(voucher_nos)
+		upsert_balances(deltas)
+	return assigned
+
+
+def split_date_range(from_date, to_date, workers):
+	"""Splits the range into up to `workers` contiguous ranges of about the same number of days."""
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	days = date_diff(to_date, from_date) + 1
+	workers = max(1, min(cint(workers), days))
+
+	ranges, start = [], from_date
+	for index in range(workers):
+		end = add_days(from_date, days * (index + 1) // workers - 1)
+		ranges.append((start, end))
+		start = add_days(end, 1)
+	return ranges
+
+
+def enqueue_backfill(from_date, to_date, company=None, workers=1, chunk_size=CHUNK_SIZE, reset=False):
+	"""Enqueues one backfill job per date range. Returns the job ids."""
+	job_ids = []
+	for start, end in split_date_range(from_date, to_date, workers):
+		job_id = f"accounting_journal_backfill::{get_checkpoint_key(start, end, company)}"
+		frappe.enqueue(
+			"tunisia_compliance.journal_backfill.backfill_journals",
+			queue="long",
+			timeout=4 * 3600,
+			job_id=job_id,
+			deduplicate=True,
+			from_date=start,
+			to_date=end,
+			company=company,
+			chunk_size=chunk_size,
+			reset=reset,
+		)
+		job_ids.append(job_id)
+	return job_ids
+
+
+def get_checkpoint_key(from_date, to_date, company=None):
+	return f"tn_journal_backfill::{company or ''}::{getdate(from_date)}::{getdate(to_date)}"
+
+
+def get_checkpoint(key):
+	value = frappe.db.get_global(key)
+	return json.loads(value) if value else None
+
+
+def set_checkpoint(key, checkpoint):
+	checkpoint["updated_at"] = now()
+	frappe.db.set_global(key, json.dumps(checkpoint))
@@ -0,0 +1,230 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Monthly debit/credit balances per Accounting Journal and account.
+
+Each `Accounting Journal Balance` holds the totals of the active GL Entries of
+one (company, journal, account, month) bucket, so per-journal trial balances do
+not have to sum `tabGL Entry`. The amounts of the GL Entries inserted in a
+transaction are collected per bucket and written in one statement just before it
+commits, so posting a voucher touches each of its buckets once and holds their
+locks only while committing. A cancellation inserts reversal rows flagged
+`is_cancelled` with debit and credit swapped, which remove the original amounts
+from the bucket. The bulk journal adjustment and the backfill, which write GL
+Entries directly, update the buckets themselves.
+
+Stock and accounting ledger reposts delete the GL Entries of a voucher without
+hooks and post them again (`from_repost`). Adding the new entries would count the
+voucher twice, so the journal months of reposted entries are instead recomputed
+from the GL Entries when the transaction commits. A voucher whose entries a repost
+deletes without posting them again in a journal is not seen at all: run
+`bench rebuild-journal-balances` over the reposted period to reconcile it.
+"""
+
+import frappe
+from frappe.utils import flt, get_first_day, getdate, now
+
+BALANCE_COLUMNS = (
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"company",
+	"accounting_journal",
+	"account",
+	"period",
+	"debit",
+	"credit",
+)
+
+
+def on_gl_entry_insert(doc, method=None):
+	"""`after_insert` of GL Entry: adds the entry to the deltas written when the transaction commits."""
+	if not doc.accounting_journal:
+		return
+
+	period = get_first_day(getdate(doc.posting_date))
+	if doc.flags.from_repost:
+		# the deleted entries are still in the balances, so the whole journal month is recomputed
+		_get_pending().reposted.add((doc.company, doc.accounting_journal, period))
+		return
+
+	if doc.is_cancelled:
+		# reversal of a cancelled entry: its swapped amounts are the original's
+		debit, credit = -flt(doc.credit), -flt(doc.debit)
+	else:
+		debit, credit = flt(doc.debit), flt(doc.credit)
+
+	delta = _get_pending().deltas.setdefault(
+		(doc.company, doc.accounting_journal, doc.account, period), [0.0, 0.0]
+	)
+	delta[0] += debit
+	delta[1] += credit
+
+
+def flush_pending_balances():
+	"""Writes the deltas and reposted months collected in the current transaction. Runs before each commit."""
+	pending = frappe.flags.pop("journal_balance_pending", None)
+	if not pending:
+		return
+
+	deltas = pending.deltas
+	if pending.reposted:
+		# the recomputed months already include every entry of this transaction
+		deltas = {
+			key: amounts for key, amounts in deltas.items() if key[:2] + key[3:] not in pending.reposted
+		}
+		recompute_journal_months(pending.reposted)
+	upsert_balances(deltas)
+
+
+def _get_pending():
+	if frappe.flags.journal_balance_pending is None:
+		frappe.flags.journal_balance_pending = frappe._dict(deltas={}, reposted=set())
+		frappe.db.before_commit.add(flush_pending_balances)
+		frappe.db.after_rollback.add(_discard_pending_balances)
+	return frappe.flags.journal_balance_pending
+
+
+def _discard_pending_balances():
+	frappe.flags.pop("journal_balance_pending", None)
+
+
+def recompute_journal_months(journal_months):
+	"""Replaces the buckets of each (company, journal, month) with the totals of its GL Entries."""
+	for company, accounting_journal, period in sorted(journal_months):
+		# a locking read: entries committed by others are counted, and new ones wait for this commit
+		rows = frappe.db.sql(
+			"""
+			SELECT account, SUM(debit) AS debit, SUM(credit) AS credit
+			FROM `tabGL Entry`
+			WHERE accounting_journal = %(accounting_journal)s
+				AND posting_date BETWEEN %(period)s AND LAST_DAY(%(period)s)
+				AND company = %(company)s AND is_cancelled = 0
+			GROUP BY account
+			LOCK IN SHARE MODE
+			""",
+			{"company": company, "accounting_journal": accounting_journal, "period": period},
+			as_dict=1,
+		)
+		frappe.db.delete(
+			"Accounting Journal Balance",
+			{"company": company, "accounting_journal": accounting_journal, "period": period},
+		)
+		_insert_balances(
+			company, [frappe._dict(row, accounting_journal=accounting_journal, period=period) for row in rows]
+		)
+
+
+def add_entry_balances(deltas, entries, accounting_journal=None, sign=1):
+	"""Adds `sign` times the amounts of `entries` to `deltas`, on their own journal unless one is given."""
+	for entry in entries:
+		journal = accounting_journal or entry.accounting_journal
+		if not journal:
+			continue
+		key = (entry.company, journal, entry.account, get_first_day(getdate(entry.posting_date)))
+		delta = deltas.setdefault(key, [0.0, 0.0])
+		delta[0] += sign * flt(entry.debit)
+		delta[1] += sign * flt(entry.credit)
+	return deltas
+
+
+def upsert_balances(deltas):
+	"""Adds {(company, journal, account, period): [debit, credit]} to their buckets in one statement."""
+	deltas = {key: amounts for key, amounts in deltas.items() if amounts[0] or amounts[1]}
+	if not deltas:
+		return
+
+	timestamp, user = now(), frappe.session.user
+	# in key order, so concurrent transactions lock shared buckets in the same order
+	values = [
+		(frappe.generate_hash(length=10), timestamp, timestamp, user, user, *key, *amounts)
+		for key, amounts in sorted(deltas.items())
+	]
+	placeholders = ", ".join(["(" + ", ".join(["%s"] * len(BALANCE_COLUMNS)) + ")"] * len(values))
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabAccounting Journal Balance` ({", ".join(f"`{col}`" for col in BALANCE_COLUMNS)})
+		VALUES {placeholders}
+		ON DUPLICATE KEY UPDATE
+			debit = debit + VALUES(debit),
+			credit = credit + VALUES(credit),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+		""",
+		[value for row in values for value in row],
+	)
+
+
+def rebuild_journal_balances(company=None, from_date=None, to_date=None, commit=True):
+	"""
+	Recomputes the balances from GL Entries, for every company by default. Buckets
+	in the range (whole months) are replaced.
+	"""
+	companies = [company] if company else frappe.get_all("Company", pluck="name")
+	from_date = get_first_day(getdate(from_date)) if from_date else None
+
+	for company_name in companies:
+		_delete_balances(company_name, from_date, to_date)
+		_insert_balances(company_name, _aggregate_gl_entries(company_name, from_date, to_date))
+		if commit:
+			frappe.db.commit()
+
+	return companies
+
+
+def _insert_balances(company, rows):
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Accounting Journal Balance",
+		fields=BALANCE_COLUMNS,
+		values=[
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				company,
+				row.accounting_journal,
+				row.account,
+				row.period,
+				flt(row.debit),
+				flt(row.credit),
+			)
+			for row in rows
+		],
+	)
+
+
+def _delete_balances(company, from_date, to_date):
+	filters = {"company": company}
+	if from_date and to_date:
+		filters["period"] = ["between", [from_date, to_date]]
+	elif from_date:
+		filters["period"] = [">=", from_date]
+	elif to_date:
+		filters["period"] = ["<=", to_date]
+	frappe.db.delete("Accounting Journal Balance", filters)
+
+
+def _aggregate_gl_entries(company, from_date, to_date):
+	conditions = ["company = %(company)s", "is_cancelled = 0", "IFNULL(accounting_journal, '') != ''"]
+	if from_date:
+		conditions.append("posting_date >= %(from_date)s")
+	if to_date:
+		conditions.append("posting_date <= LAST_DAY(%(to_date)s)")
+
+	return frappe.db.sql(
+		f"""
+		SELECT accounting_journal, account, DATE_FORMAT(posting_date, '%%Y-%%m-01') AS period,
+			SUM(debit) AS debit, SUM(credit) AS credit
+		FROM `tabGL Entry`
+		WHERE {" AND ".join(conditions)}
+		GROUP BY accounting_journal, account, period
+		""",
+		{"company": company, "from_date": from_date, "to_date": to_date},
+		as_dict=1,
+	)
@@ -0,0 +1,225 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Journal book ("livre journal") export of an Accounting Journal for a fiscal year.
+
+GL Entries are streamed in (posting_date, voucher_no, name) order through an
+unbuffered cursor and written line by line to a private file, with a subtotal
+at the end of every month and a grand total, so memory does not depend on the
+number of entries. Two layouts are available: CSV, and a fixed-width text layout
+(one record per line, amounts without separators) for the tax administration.
+
+The content hash of the File is computed while the lines are written and its row
+is inserted directly: inserting a File document would read the whole export back
+into memory to hash it and look for duplicates.
+"""
+
+import csv
+import hashlib
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import flt, getdate, now_datetime
+
+from tunisia_compliance.utils import stream_query
+
+CSV = "CSV"
+FIXED_WIDTH = "Fixed Width (DGI)"
+FORMATS = (CSV, FIXED_WIDTH)
+
+COLUMNS = (
+	"posting_date",
+	"journal_code",
+	"voucher_type",
+	"voucher_no",
+	"account",
+	"party",
+	"remarks",
+	"debit",
+	"credit",
+)
+
+# (column, width, alignment) of each fixed-width record
+FIXED_LAYOUT = (
+	("posting_date", 8, "<"),
+	("journal_code", 10, "<"),
+	("voucher_type", 20, "<"),
+	("voucher_no", 30, "<"),
+	("account", 40, "<"),
+	("party", 40, "<"),
+	("remarks", 60, "<"),
+	("debit", 18, ">"),
+	("credit", 18, ">"),
+)
+
+
+@frappe.whitelist()
+def export_journal_book(accounting_journal, fiscal_year, file_format=CSV):
+	"""Enqueues the export; the File is announced with the `journal_book_export` realtime event."""
+	frappe.has_permission("Accounting Journal", "read", accounting_journal, throw=True)
+	if file_format not in FORMATS:
+		frappe.throw(_("Unsupported format {0}").format(file_format))
+
+	frappe.enqueue(
+		"tunisia_compliance.journal_export.build_journal_book",
+		queue="long",
+		timeout=4 * 3600,
+		job_id=f"journal_book_export::{accounting_journal}::{fiscal_year}::{file_format}",
+		deduplicate=True,
+		accounting_journal=accounting_journal,
+		fiscal_year=fiscal_year,
+		file_format=file_format,
+		notify_user=frappe.session.user,
+	)
+	return {"status": "queued"}
+
+
+def build_journal_book(accounting_journal, fiscal_year, file_format=CSV, notify_user=None):
+	"""Writes the journal book to a private File and returns it."""
+	journal_code = frappe.db.get_value("Accounting Journal", accounting_journal, "journal_code")
+	year_start, year_end = frappe.db.get_value(
+		"Fiscal Year", fiscal_year, ["year_start_date", "year_end_date"]
+	)
+
+	extension = "csv" if file_format == CSV else "txt"
+	timestamp = now_datetime().strftime("%Y%m%d%H%M%S")
+	file_name = (
+		f"livre-journal-{frappe.scrub(journal_code)}-{frappe.scrub(fiscal_year)}-{timestamp}.{extension}"
+	)
+	path = frappe.get_site_path("private", "files", file_name)
+
+	with open(path, "w", encoding="utf-8", newline="") as f:
+		hashed = HashedFile(f)
+		writer = CSVWriter(hashed) if file_format == CSV else FixedWidthWriter(hashed)
+		writer.header()
+		lines = write_entries(writer, accounting_journal, journal_code, year_start, year_end)
+
+	file_doc = frappe.get_doc(
+		{
+			"doctype": "File",
+			"name": frappe.generate_hash(length=10),
+			"file_name": file_name,
+			"file_url": f"/private/files/{file_name}",
+			"file_type": extension.upper(),
+			"file_size": os.path.getsize(path),
+			"content_hash": hashed.content_hash(),
+			"is_private": 1,
+			"folder": "Home/Attachments",
+			"attached_to_doctype": "Accounting Journal",
+			"attached_to_name": accounting_journal,
+		}
+	)
+	file_doc.db_insert()
+	frappe.db.commit()
+
+	if notify_user:
+		frappe.publish_realtime(
+			"journal_book_export",
+			{"accounting_journal": accounting_journal, "file_url": file_doc.file_url, "lines": lines},
+			user=notify_user,
+		)
+	return file_doc
+
+
+def write_entries(writer, accounting_journal, journal_code, from_date, to_date):
+	"""Streams the entries into `writer` with monthly subtotals. Returns the number of entries written."""
+	rows = stream_query(
+		"""
+		SELECT posting_date, voucher_type, voucher_no, account, party, remarks, debit, credit
+		FROM `tabGL Entry`
+		WHERE accounting_journal = %(journal)s AND is_cancelled = 0
+			AND posting_date BETWEEN %(from_date)s AND %(to_date)s
+		ORDER BY posting_date, voucher_no, name
+		""",
+		{"journal": accounting_journal, "from_date": from_date, "to_date": to_date},
+	)
+
+	month, month_totals, totals, count = None, [0.0, 0.0], [0.0, 0.0], 0
+	for row in rows:
+		row_month = getdate(row.posting_date).strftime("%Y-%m")
+		if month and row_month != month:
+			writer.total(_("Total {0}").format(month), *month_totals)
+			month_totals = [0.0, 0.0]
+		month = row_month
+
+		row.journal_code = journal_code
+		writer.entry(row)
+		for index, amount in enumerate((flt(row.debit), flt(row.credit))):
+			month_totals[index] += amount
+			totals[index] += amount
+		count += 1
+
+	if month:
+		writer.total(_("Total {0}").format(month), *month_totals)
+	writer.total(_("Total"), *totals)
+	return count
+
+
+class HashedFile:
+	"""Writes text to `f` and keeps the MD5 of its UTF-8 bytes, as `File.content_hash` does."""
+
+	def __init__(self, f):
+		self.f = f
+		self.md5 = hashlib.md5(usedforsecurity=False)
+
+	def write(self, text):
+		self.md5.update(text.encode("utf-8"))
+		return self.f.write(text)
+
+	def content_hash(self):
+		return self.md5.hexdigest()
+
+
+class CSVWriter:
+	def __init__(self, f):
+		self.writer = csv.writer(f)
+
+	def header(self):
+		self.writer.writerow(COLUMNS)
+
+	def entry(self, row):
+		self.writer.writerow(
+			[
+				row.posting_date,
+				row.journal_code,
+				row.voucher_type,
+				row.voucher_no,
+				row.account,
+				row.party or "",
+				" ".join((row.remarks or "").split()),
+				flt(row.debit, 3),
+				flt(row.credit, 3),
+			]
+		)
+
+	def total(self, label, debit, credit):
+		self.writer.writerow(["", "", label, "", "", "", "", flt(debit, 3), flt(credit, 3)])
+
+
+class FixedWidthWriter:
+	def __init__(self, f):
+		self.f = f
+
+	def header(self):
+		pass
+
+	def entry(self, row):
+		values = dict(row, posting_date=getdate(row.posting_date).strftime("%Y%m%d"))
+		self.write(values)
+
+	def total(self, label, debit, credit):
+		self.write({"voucher_type": label, "debit": debit, "credit": credit})
+
+	def write(self, values):
+		fields = []
+		for column, width, align in FIXED_LAYOUT:
+			value = values.get(column)
+			if column in ("debit", "credit"):
+				# amounts in millimes, zero-padded
+				text = f"{round(flt(value) * 1000):0{width}d}"
+			else:
+				text = " ".join(str(value or "").split())
+			fields.append(f"{text[:width]:{align}{width}}")
+		self.f.write("".join(fields) + "\n")
@@ -0,0 +1,272 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Gap-free numbering of entries within each Accounting Journal and fiscal year.
+
+Numbers are not taken while a voucher is submitted: that would make every
+submission of a journal wait on the same counter row until it commits. Instead
+GL Entries are posted without a number and a sequencer job, enqueued after the
+posting commits (and run hourly as a safety net), numbers the pending vouchers of
+a journal and fiscal year in blocks. Each block locks the Accounting Journal
+Sequence row, then the entries of the vouchers it numbers, allocates consecutive
+numbers to the vouchers in posting order and writes them in the same transaction,
+so a number is only ever consumed by a committed voucher. The counter advances by
+the vouchers the block actually numbered. All the GL Entries of a voucher share
+its number; reversals keep the number of the entries they cancel.
+
+Pending entries have `journal_entry_number` 0, the default of the Int column, so
+they are found through the (accounting_journal, fiscal_year, journal_entry_number)
+index.
+
+The number of each voucher is also recorded in an Accounting Journal Voucher
+Number row. Stock and accounting ledger reposts delete the GL Entries of a voucher
+without hooks and post them again; the new entries take their journal and number
+from that row, so reposting never leaves a gap. A voucher whose entries are deleted
+by a repost and not posted again still leaves a gap, reported by
+`find_numbering_issues`.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import now
+from frappe.utils.caching import request_cache
+
+from tunisia_compliance.utils import stream_query
+
+BLOCK_SIZE = 500
+JOB_ID = "accounting_journal_numbering"
+
+
+def enqueue_numbering():
+	"""Enqueues the sequencer once per request, after the current transaction commits."""
+	if frappe.flags.journal_numbering_enqueued:
+		return
+	frappe.flags.journal_numbering_enqueued = True
+	frappe.enqueue(
+		"tunisia_compliance.journal_numbering.number_pending_entries",
+		queue="long",
+		job_id=JOB_ID,
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+
+
+def number_pending_entries():
+	"""Numbers every pending voucher of every journal. Returns the number of vouchers numbered."""
+	# one index lookup per journal and fiscal year, both small tables
+	pending = frappe.db.sql(
+		"""
+		SELECT aj.name AS accounting_journal, fy.name AS fiscal_year
+		FROM `tabAccounting Journal` aj
+		CROSS JOIN `tabFiscal Year` fy
+		WHERE EXISTS (
+			SELECT 1 FROM `tabGL Entry` gle
+			WHERE gle.accounting_journal = aj.name AND gle.fiscal_year = fy.name
+				AND gle.journal_entry_number = 0
+		)
+		""",
+		as_dict=1,
+	)
+
+	numbered = 0
+	for row in pending:
+		while True:
+			try:
+				count = number_block(row.accounting_journal, row.fiscal_year)
+				frappe.db.commit()
+			except Exception:
+				frappe.db.rollback()
+				raise
+			numbered += count
+			if count < BLOCK_SIZE:
+				break
+	return numbered
+
+
+def number_block(accounting_journal, fiscal_year, block_size=BLOCK_SIZE):
+	"""Numbers up to `block_size` pending vouchers. The caller commits."""
+	# the sequence is locked first, so two sequencers never number the same voucher
+	sequence = _lock_sequence(accounting_journal, fiscal_year)
+
+	vouchers = frappe.db.sql(
+		"""
+		SELECT voucher_type, voucher_no, MIN(posting_date) AS posting_date, MIN(creation) AS creation
+		FROM `tabGL Entry`
+		WHERE accounting_journal = %s AND fiscal_year = %s AND journal_entry_number = 0
+		GROUP BY voucher_type, voucher_no
+		ORDER BY posting_date, creation, voucher_type, voucher_no
+		LIMIT %s
+		FOR UPDATE
+		""",
+		(accounting_journal, fiscal_year, block_size),
+		as_dict=1,
+	)
+	if not vouchers:
+		return 0
+
+	numbers_by_type = {}
+	for number, voucher in enumerate(vouchers, start=sequence.last_number + 1):
+		numbers_by_type.setdefault(voucher.voucher_type, []).append((voucher.voucher_no, number))
+
+	for voucher_type, numbers in numbers_by_type.items():
+		frappe.db.sql(
+			f"""
+			UPDATE `tabGL Entry`
+			SET journal_entry_number = CASE voucher_no {" ".join(["WHEN %s THEN %s"] * len(numbers))} END
+			WHERE accounting_journal = %s AND fiscal_year = %s AND voucher_type = %s
+				AND voucher_no IN %s AND journal_entry_number = 0
+			""",
+			(
+				*(value for pair in numbers for value in pair),
+				accounting_journal,
+				fiscal_year,
+				voucher_type,
+				tuple(voucher_no for voucher_no, _number in numbers),
+			),
+		)
+
+	# advance by what the updates wrote, not by what was selected
+	numbered = frappe.db.sql(
+		"""
+		SELECT COUNT(DISTINCT voucher_type, voucher_no)
+		FROM `tabGL Entry`
+		WHERE accounting_journal = %s AND fiscal_year = %s
+			AND journal_entry_number BETWEEN %s AND %s
+		""",
+		(accounting_journal, fiscal_year, sequence.last_number + 1, sequence.last_number + len(vouchers)),
+	)[0][0]
+	if numbered != len(vouchers):
+		# committing would leave a gap in the sequence, the caller rolls the block back
+		frappe.throw(
+			_("Numbered {0} of {1} vouchers of {2} ({3}), the block was not saved").format(
+				numbered, len(vouchers), accounting_journal, fiscal_year
+			)
+		)
+
+	frappe.db.sql(
+		"UPDATE `tabAccounting Journal Sequence` SET last_number = %s, modified = NOW() WHERE name = %s",
+		(sequence.last_number + numbered, sequence.name),
+	)
+	_record_voucher_numbers(accounting_journal, fiscal_year, numbers_by_type)
+	return numbered
+
+
+def _record_voucher_numbers(accounting_journal, fiscal_year, numbers_by_type):
+	timestamp, user = now(), frappe.session.user
+	values = [
+		(
+			frappe.generate_hash(length=10),
+			timestamp,
+			timestamp,
+			user,
+			user,
+			voucher_type,
+			voucher_no,
+			accounting_journal,
+			fiscal_year,
+			number,
+		)
+		for voucher_type, numbers in numbers_by_type.items()
+		for voucher_no, number in numbers
+	]
+	placeholders = ", ".join(["(" + ", ".join(["%s"] * len(values[0])) + ")"] * len(values))
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tabAccounting Journal Voucher Number`
+			(name, creation, modified, owner, modified_by, voucher_type, voucher_no,
+			accounting_journal, fiscal_year, journal_entry_number)
+		VALUES {placeholders}
+		ON DUPLICATE KEY UPDATE
+			accounting_journal = VALUES(accounting_journal),
+			fiscal_year = VALUES(fiscal_year),
+			journal_entry_number = VALUES(journal_entry_number),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+		""",
+		[value for row in values for value in row],
+	)
+
+
+@request_cache
+def get_voucher_number(voucher_type, voucher_no):
+	"""Returns the journal, fiscal year and number last given to a voucher, if it was numbered."""
+	return frappe.db.get_value(
+		"Accounting Journal Voucher Number",
+		{"voucher_type": voucher_type, "voucher_no": voucher_no},
+		["accounting_journal", "fiscal_year", "journal_entry_number"],
+		as_dict=True,
+	)
+
+
+def forget_voucher_numbers(voucher_type, voucher_nos):
+	"""Drops the recorded numbers of vouchers that are numbered again in another journal."""
+	frappe.db.delete(
+		"Accounting Journal Voucher Number",
+		{"voucher_type": voucher_type, "voucher_no": ("in", list(voucher_nos))},
+	)
+
+
+def _lock_sequence(accounting_journal, fiscal_year):
+	name = f"{accounting_journal}-{fiscal_year}"
+	frappe.db.sql(
+		"""
+		INSERT IGNORE INTO `tabAccounting Journal Sequence`
+			(name, accounting_journal, fiscal_year, last_number, creation, modified, owner, modified_by)
+		VALUES (%s, %s, %s, 0, NOW(), NOW(), 'Administrator', 'Administrator')
+		""",
+		(name, accounting_journal, fiscal_year),
+	)
+	return frappe.db.sql(
+		"SELECT name, last_number FROM `tabAccounting Journal Sequence` WHERE name = %s FOR UPDATE",
+		name,
+		as_dict=1,
+	)[0]
+
+
+def find_numbering_issues(accounting_journal=None, fiscal_year=None):
+	"""
+	Returns, per journal and fiscal year, the missing number ranges, the numbers used by
+	more than one voucher, and the difference between the counter and the highest number.
+	"""
+	filters = {"accounting_journal": accounting_journal, "fiscal_year": fiscal_year}
+	sequences = frappe.get_all(
+		"Accounting Journal Sequence",
+		filters={key: value for key, value in filters.items() if value},
+		fields=["accounting_journal", "fiscal_year", "last_number"],
+	)
+
+	issues = []
+	for sequence in sequences:
+		gaps, duplicates, expected = [], [], 1
+		rows = stream_query(
+			"""
+			SELECT journal_entry_number AS number, COUNT(DISTINCT voucher_type, voucher_no) AS vouchers
+			FROM `tabGL Entry`
+			WHERE accounting_journal = %s AND fiscal_year = %s AND journal_entry_number > 0
+			GROUP BY journal_entry_number
+			ORDER BY journal_entry_number
+			""",
+			(sequence.accounting_journal, sequence.fiscal_year),
+		)
+		for row in rows:
+			if row.number > expected:
+				gaps.append((expected, row.number - 1))
+			if row.vouchers > 1:
+				duplicates.append(row.number)
+			expected = row.number + 1
+
+		if expected <= sequence.last_number:
+			gaps.append((expected, sequence.last_number))
+		if gaps or duplicates or expected - 1 > sequence.last_number:
+			issues.append(
+				frappe._dict(
+					accounting_journal=sequence.accounting_journal,
+					fiscal_year=sequence.fiscal_year,
+					last_number=sequence.last_number,
+					highest_number=expected - 1,
+					gaps=gaps,
+					duplicates=duplicates,
+				)
+			)
+	return issues
@@ -0,0 +1,195 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Cached, pre-compiled Accounting Journal rules.
+
+The rules of a (company, document type) are loaded once into a rule set stored in
+the site cache: the conditional rules ordered by priority, then the unconditional
+ones used as fallback. Conditions are compiled with the same restrictions as
+`frappe.safe_eval` and the code objects are kept per process, keyed by the
+condition string, so resolving a journal costs a cache lookup and a few bytecode
+evaluations. Rule sets are dropped whenever an Accounting Journal changes.
+
+`frappe.safe_eval` compiles its expression on every call, so the compilation reuses
+the steps it is built from in Frappe v15. Should those move, conditions fall back
+to `frappe.safe_eval` itself: slower, never less restricted.
+"""
+
+import ast
+import unicodedata
+
+import frappe
+from frappe.utils.caching import request_cache
+from RestrictedPython import compile_restricted
+
+from tunisia_compliance.journal_numbering import enqueue_numbering, get_voucher_number
+
+try:
+	from frappe.utils.safe_exec import (
+		WHITELISTED_SAFE_EVAL_GLOBALS,
+		FrappeTransformer,
+		_validate_safe_eval_syntax,
+	)
+except ImportError:
+	WHITELISTED_SAFE_EVAL_GLOBALS = None
+
+CACHE_KEY = "tunisia_compliance_journal_rules"
+
+# condition string -> code object; code objects cannot be stored in redis
+_compiled_conditions = {}
+
+
+def get_rule_set(company, document_type):
+	"""Returns the enabled rules of `company` for `document_type`, conditional ones first."""
+	return frappe.cache.hget(
+		CACHE_KEY,
+		f"{company}::{document_type}",
+		generator=lambda: build_rule_set(company, document_type),
+	)
+
+
+def build_rule_set(company, document_type):
+	rules = frappe.db.sql(
+		"""
+		SELECT aj.name AS journal, aj.account, rule.condition
+		FROM `tabAccounting Journal` aj
+		INNER JOIN `tabAccounting Journal Rule` rule
+			ON rule.parent = aj.name AND rule.parenttype = 'Accounting Journal'
+		WHERE aj.company = %s AND aj.disabled = 0 AND rule.document_type = %s
+		ORDER BY rule.priority DESC, aj.name, rule.idx
+		""",
+		(company, document_type),
+		as_dict=1,
+	)
+	for rule in rules:
+		rule.condition = (rule.condition or "").strip()
+
+	return [rule for rule in rules if rule.condition] + [rule for rule in rules if not rule.condition]
+
+
+def resolve_journal(doc):
+	"""Returns the first journal whose rule matches `doc` (a dict), or None."""
+	rules = get_rule_set(doc.get("company"), doc.get("doctype"))
+	rules = filter_rules(rules, get_journal_account(doc), doc.get("doctype"))
+	return next((rule.journal for rule in rules if matches(rule, doc)), None)
+
+
+def resolve_journals(docs):
+	"""
+	Returns a {name: journal} map for many documents. Documents are grouped by
+	company, document type and journal account so each rule set is fetched and
+	filtered once per group.
+	"""
+	groups = {}
+	for doc in docs:
+		key = (doc.get("company"), doc.get("doctype"), get_journal_account(doc))
+		groups.setdefault(key, []).append(doc)
+
+	journals = {}
+	for (company, document_type, account), group in groups.items():
+		rules = filter_rules(get_rule_set(company, document_type), account, document_type)
+		for doc in group:
+			journals[doc.get("name")] = next((rule.journal for rule in rules if matches(rule, doc)), None)
+	return journals
+
+
+def get_journal_account(doc):
+	if doc.get("doctype") != "Payment Entry":
+		return None
+	return doc.get("paid_to") if doc.get("payment_type") == "Receive" else doc.get("paid_from")
+
+
+def stamp_gl_entry(doc, method=None):
+	"""
+	`before_insert` of GL Entry: sets the journal of the voucher unless one was chosen,
+	and schedules the numbering of the entry within its journal.
+	"""
+	if doc.flags.from_repost and not doc.accounting_journal:
+		# a repost deleted the voucher's entries without hooks: keep their journal and number
+		numbered = get_voucher_number(doc.voucher_type, doc.voucher_no)
+		if numbered and numbered.fiscal_year == doc.fiscal_year:
+			doc.accounting_journal = numbered.accounting_journal
+			doc.journal_entry_number = numbered.journal_entry_number
+	if not doc.accounting_journal and doc.voucher_type and doc.voucher_no:
+		doc.accounting_journal = get_voucher_journal(doc.company, doc.voucher_type, doc.voucher_no)
+	if doc.accounting_journal and not doc.get("journal_entry_number"):
+		enqueue_numbering()
+
+
+@request_cache
+def get_voucher_journal(company, voucher_type, voucher_no):
+	# every GL Entry of a voucher is inserted in the same request, so the voucher is resolved once
+	if not get_rule_set(company, voucher_type) or not frappe.db.exists(voucher_type, voucher_no):
+		return None
+	return resolve_journal(frappe.get_doc(voucher_type, voucher_no).as_dict())
+
+
+def filter_rules(rules, account, document_type):
+	# payment entries only use the journals linked to their bank or cash account
+	if document_type != "Payment Entry":
+		return rules
+	return [rule for rule in rules if (rule.account or "") == (account or "")]
+
+
+def matches(rule, doc):
+	if not rule.condition:
+		return True
+	return evaluate(rule.condition, {"doc": doc})
+
+
+def evaluate(condition, eval_locals):
+	if WHITELISTED_SAFE_EVAL_GLOBALS is None:
+		return frappe.safe_eval(condition, None, eval_locals)
+	eval_globals = {"__builtins__": {}, **WHITELISTED_SAFE_EVAL_GLOBALS}
+	return eval(compile_condition(condition), eval_globals, eval_locals)
+
+
+def compile_condition(condition):
+	"""Returns the restricted code object of `condition`. Raises SyntaxError if it is invalid or not allowed."""
+	if WHITELISTED_SAFE_EVAL_GLOBALS is None:
+		# syntax only, `frappe.safe_eval` applies the restrictions when evaluating
+		return compile(unicodedata.normalize("NFKC", condition), "<safe_eval>", "eval")
+
+	code = _compiled_conditions.get(condition)
+	if code is None:
+		source = unicodedata.normalize("NFKC", condition)
+		_validate_safe_eval_syntax(source)
+		code = compile_restricted(source, filename="<safe_eval>", policy=FrappeTransformer, mode="eval")
+		_compiled_conditions[condition] = code
+	return code
+
+
+@request_cache
+def get_condition_fields(document_type):
+	"""Names a condition may read from `doc`: the fields of the doctype and its standard fields."""
+	meta = frappe.get_meta(document_type)
+	return frozenset(
+		[*meta.get_valid_columns(), *(df.fieldname for df in meta.get_table_fields()), "doctype", "get"]
+	)
+
+
+def get_unknown_fields(condition, document_type):
+	"""Returns the names `condition` reads from `doc` (doc.x, doc.get("x"), doc["x"]) unknown to the doctype."""
+	names = set()
+	for node in ast.walk(ast.parse(condition.strip(), mode="eval")):
+		if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "doc":
+			names.add(node.attr)
+		elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "doc":
+			if isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+				names.add(node.slice.value)
+		elif (
+			isinstance(node, ast.Call)
+			and isinstance(node.func, ast.Attribute)
+			and node.func.attr == "get"
+			and isinstance(node.func.value, ast.Name)
+			and node.func.value.id == "doc"
+			and node.args
+			and isinstance(node.args[0], ast.Constant)
+		):
+			names.add(node.args[0].value)
+	return sorted(names - get_condition_fields(document_type))
+
+
+def clear_rule_sets():
+	frappe.cache.delete_value(CACHE_KEY)
@@ -0,0 +1,5 @@
+from tunisia_compliance.db_indexes import create_indexes
+
+
+def execute():
+	create_indexes()
@@ -0,0 +1,55 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+import json
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint, now
+
+from tunisia_compliance.utils import capture_queries
+
+
+def is_profiling_enabled():
+	return cint(frappe.db.get_single_value("Tunisia Compliance Settings", "enable_declaration_profiling"))
+
+
+class StageProfiler:
+	"""
+	Records wall time, query count and rows returned for each stage of a run.
+	When disabled, `stage()` does nothing so it can wrap code unconditionally.
+	"""
+
+	def __init__(self, enabled=True):
+		self.enabled = enabled
+		self.stages = []
+
+	@contextmanager
+	def stage(self, name):
+		if not self.enabled:
+			yield
+			return
+
+		start = time.perf_counter()
+		with capture_queries() as queries:
+			yield
+		self.stages.append(
+			{
+				"stage": name,
+				"duration_ms": round((time.perf_counter() - start) * 1000, 2),
+				"queries": len(queries),
+				"rows": sum(query.rows for query in queries),
+				"streamed_queries": sum(1 for query in queries if query.streamed),
+			}
+		)
+
+	def as_json(self):
+		return json.dumps(
+			{
+				"recorded_at": now(),
+				"total_ms": round(sum(stage["duration_ms"] for stage in self.stages), 2),
+				"stages": self.stages,
+			},
+			indent=1,
+		)
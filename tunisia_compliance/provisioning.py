@@ -0,0 +1,158 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Provisioning of Tunisian companies (chart of accounts, payroll, taxes, defaults).
+
+Each company is set up in its own transaction: a failure rolls back that company
+only and the others stay configured. Companies can be provisioned inline, one
+after the other, or in one background job per company, spread across the workers
+of the long queue. Background provisioning is enabled with the "Provision
+Companies in Background" setting or with `tunisia_compliance_background_provisioning`
+in site config (the setting is not yet available during installation).
+
+The outcome of every company is tracked in the Company Provisioning table of
+Tunisia Compliance Settings. Rows are written directly, so concurrent jobs never
+save the settings document over each other.
+"""
+
+import frappe
+from frappe.utils import cint, now_datetime, time_diff_in_seconds
+from frappe.utils.background_jobs import is_job_enqueued
+
+SETTINGS = "Tunisia Compliance Settings"
+STATUS_DOCTYPE = "Company Provisioning Status"
+PARENTFIELD = "company_provisioning"
+
+
+def use_background_provisioning():
+	return cint(frappe.conf.get("tunisia_compliance_background_provisioning")) or cint(
+		frappe.db.get_single_value(SETTINGS, "provision_companies_in_background")
+	)
+
+
+def provision_companies(companies, background=None):
+	"""Provisions `companies` inline or, when `background`, with one job per company."""
+	if background is None:
+		background = use_background_provisioning()
+
+	for company in companies:
+		job_id = get_job_id(company) if background else None
+		if background and is_job_enqueued(job_id):
+			# already queued or running: its row tracks that job, which the enqueue would drop
+			continue
+		set_status(
+			company, "Queued", job_id=job_id, started_at=None, finished_at=None, duration=0, error=None
+		)
+		if background:
+			frappe.enqueue(
+				"tunisia_compliance.provisioning.provision_company",
+				queue="long",
+				timeout=3600,
+				job_id=job_id,
+				deduplicate=True,
+				enqueue_after_commit=True,
+				company=company,
+			)
+
+	if not background:
+		# commit the queued rows, so they survive the rollback of a failed company
+		frappe.db.commit()
+		for company in companies:
+			provision_company(company)
+
+
+def provision_company(company):
+	"""Sets up one company in its own transaction and records the outcome."""
+	from tunisia_compliance.setup import setup_tunisian_company
+
+	started_at = now_datetime()
+	set_status(company, "Running", started_at=started_at)
+	frappe.db.commit()
+
+	error = None
+	try:
+		if not setup_tunisian_company(company):
+			error = "Setup stopped: the chart of accounts could not be loaded or the payroll accounts were not found."
+	except Exception:
+		error = frappe.get_traceback()
+
+	if error:
+		frappe.db.rollback()
+		# logged after the rollback, which would discard it
+		frappe.log_error(error, f"Tunisia Compliance provisioning failed for {company}")
+	else:
+		frappe.db.commit()
+
+	finished_at = now_datetime()
+	set_status(
+		company,
+		"Failed" if error else "Completed",
+		finished_at=finished_at,
+		duration=time_diff_in_seconds(finished_at, started_at),
+		error=error,
+	)
+	frappe.db.commit()
+	return not error
+
+
+def set_status(company, status, **values):
+	"""Creates or updates the provisioning row of `company`."""
+	values["status"] = status
+	name = frappe.db.get_value(
+		STATUS_DOCTYPE, {"parent": SETTINGS, "parentfield": PARENTFIELD, "company": company}
+	)
+	if name:
+		frappe.db.set_value(STATUS_DOCTYPE, name, values, update_modified=False)
+		return
+
+	idx = frappe.db.sql(
+		f"SELECT COALESCE(MAX(idx), 0) FROM `tab{STATUS_DOCTYPE}` WHERE parent = %s AND parentfield = %s",
+		(SETTINGS, PARENTFIELD),
+	)[0][0]
+	frappe.get_doc(
+		{
+			"doctype": STATUS_DOCTYPE,
+			"parent": SETTINGS,
+			"parenttype": SETTINGS,
+			"parentfield": PARENTFIELD,
+			"idx": cint(idx) + 1,
+			"company": company,
+			**values,
+		}
+	).db_insert()
+
+
+def get_job_id(company):
+	return f"tunisia_compliance_provisioning::{company}"
+
+
+@frappe.whitelist()
+def get_provisioning_summary():
+	"""Returns the provisioning rows and the number of companies per status."""
+	frappe.only_for("System Manager")
+
+	rows = frappe.get_all(
+		STATUS_DOCTYPE,
+		filters={"parent": SETTINGS, "parentfield": PARENTFIELD},
+		fields=["company", "status", "started_at", "finished_at", "duration", "error"],
+		order_by="idx",
+	)
+	totals = {status: 0 for status in ("Queued", "Running", "Completed", "Failed")}
+	for row in rows:
+		totals[row.status] = totals.get(row.status, 0) + 1
+	return {"totals": totals, "companies": rows}
+
+
+@frappe.whitelist()
+def retry_failed_companies():
+	"""Provisions again, in the background, the companies whose last provisioning failed."""
+	frappe.only_for("System Manager")
+
+	companies = frappe.get_all(
+		STATUS_DOCTYPE,
+		filters={"parent": SETTINGS, "parentfield": PARENTFIELD, "status": "Failed"},
+		pluck="company",
+	)
+	provision_companies(companies, background=True)
+	return companies
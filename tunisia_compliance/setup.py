@@ -1,9 +1,75 @@
+import filecmp
 import frappe
 import os
 import shutil
-from erpnext.accounts.doctype.chart_of_accounts_importer.chart_of_accounts_importer import import_coa
+from frappe import _
+from frappe.utils import cint
 from frappe.utils.file_manager import save_file
 
+from tunisia_compliance.account_resolver import AccountResolver
+from tunisia_compliance.account_roles import clear_role_index
+from tunisia_compliance.coa_loader import load_chart
+from tunisia_compliance.db_indexes import create_indexes
+from tunisia_compliance.provisioning import provision_companies
+
+# ==============================================================================
+# DESIRED CONFIGURATION (also read by tunisia_compliance.setup_plan)
+# ==============================================================================
+
+# Company fields -> fragment of the account name in the Tunisian chart
+PAYROLL_ACCOUNTS = {
+    "custom_cnss_liability_account": "CNSS",
+    "custom_tax_liability_account": "Etat, impôts et taxes retenus à la source",
+    "custom_salary_expense_account": "Salaires - 6400",
+    "custom_social_charges_expense_account": "Cotisations de sécurité sociale sur salaires - 6470"
+}
+
+# This map is based on your final screenshots and our discussions.
+COMPANY_DEFAULT_ACCOUNTS = {
+    "default_bank_account": "Comptes en dinars - 5321",
+    "default_cash_account": "Caisse en dinars - 5411",
+    "default_receivable_account": "Clients - ventes de biens ou de prestations de services - 4111",
+    "default_payable_account": "Fournisseurs - achats de biens ou de prestations de services - 4011",
+    "default_expense_account": "Achats de marchandises - 607",
+    "default_income_account": "Ventes de marchandises - 707",
+    "default_discount_account": "Frais sur effets - 6275",
+    "round_off_account": "Charges financières liées à une modif. comptable - 658",
+    "default_deferred_revenue_account": "Produits constatés d'avance - 472",
+    "default_deferred_expense_account": "Charges constatées d'avance - 471",
+    "accumulated_depreciation_account": "Amortissements des immob. corporelles - 282",
+    "depreciation_expense_account": "Immobilisations corporelles - 68112",
+    "capital_work_in_progress_account": "Immobilisations corporelles en cours - 232",
+    "asset_received_but_not_billed": "Fournisseurs d'immobilisations - 4084",
+    "default_payroll_payable_account": "Personnel - rémunérations dues - 421",
+    "default_employee_advance_account": "Personnel - avances et acomptes - 425",
+    "default_expense_claim_payable_account": "Personnel - rémunérations dues - 421",
+    # Corrected from 311 for trading
+    "default_inventory_account": "Matières premières - 311",
+    "stock_adjustment_account": "Variation des stocks (approvisionnements et marchandises) - 603",
+    "stock_received_but_not_billed": "Fournisseurs d'exploitation - 4081",
+    "default_provisional_account": "Fournisseurs d'exploitation - 4081",
+}
+
+# Salary Component -> Company field holding its default account
+COMPONENT_ACCOUNT_FIELDS = {
+    "Salaire de Base": "custom_salary_expense_account",
+    "Paiement par Feuille de Temps": "custom_salary_expense_account",
+    "Commission sur Ventes": "custom_salary_expense_account",
+    "Indemnité SIVP": "custom_salary_expense_account",
+    "Indemnité de Transport": "custom_salary_expense_account",
+    "Prime de Présence": "custom_salary_expense_account",
+    "Autres Primes (Imposables)": "custom_salary_expense_account",
+    "CNSS - Cotisation Salariale (9.18%)": "custom_cnss_liability_account",
+    "Impôt sur le Revenu (IRPP)": "custom_tax_liability_account",
+    "Contribution Sociale de Solidarité (CSS)": "custom_tax_liability_account",
+    "CNSS - Part Patronale (16.57%)": "custom_cnss_liability_account",
+    "Taxe de Formation Professionnelle (TFP)": "custom_tax_liability_account",
+    "Fonds de Logement Social (FOPROLOS)": "custom_tax_liability_account"
+}
+
+SALES_TAX_TEMPLATES = {"TVA 19% - TN": 19.0, "TVA 13% - TN": 13.0, "TVA 7% - TN": 7.0}
+PURCHASE_TAX_TEMPLATES = {"TVA 19% (Achats) - TN": 19.0, "TVA 13% (Achats) - TN": 13.0, "TVA 7% (Achats) - TN": 7.0}
+
 # ==============================================================================
 # HOOK TRIGGERS
 # ==============================================================================
@@ -17,12 +83,13 @@ def after_install():
     print("\nRunning Tunisia Compliance initial setup...")
     copy_chart_of_accounts_json()
     create_global_payroll_elements()
+    create_indexes()
     existing_companies = frappe.get_all(
         "Company", filters={"country": "Tunisia"}, pluck="name")
     if existing_companies:
         print("Found existing Tunisian companies. Configuring them now...")
-        for company_name in existing_companies:
-            setup_tunisian_company(company_name)
+        # One transaction per company, optionally one background job per company
+        provision_companies(existing_companies)
     print("Initial setup for Tunisia Compliance completed.\n")
 
 
@@ -44,6 +111,7 @@ def setup_tunisian_company(company_name):
     """
     This is the master function that configures a single company.
     It's called by both after_install (for existing companies) and on_create_company.
+    Returns False when a required step fails and the remaining steps are skipped.
     """
     print(f"--- Configuring company: {company_name} ---")
     company_doc = frappe.get_doc("Company", company_name)
@@ -57,47 +125,39 @@ def setup_tunisian_company(company_name):
         print(
             f"-> Installing Tunisian Chart of Accounts for {company_name}...")
         try:
-            app_path = frappe.get_app_path("tunisia_compliance")
-            csv_path = os.path.join(
-                app_path, "regional", "data", "tn_plan_comptable_general_avec_code.csv")
-            if not os.path.exists(csv_path):
-                raise FileNotFoundError(
-                    f"Chart template CSV not found at {csv_path}")
-            with open(csv_path, "rb") as f:
-                file_content = f.read()
-            saved_file = frappe.get_doc({"doctype": "File", "file_name": "tn_plan_comptable_general_avec_code.csv",
-                                        "attached_to_doctype": "Company", "attached_to_name": company_name, "content": file_content, "is_private": 0})
-            saved_file.insert(ignore_permissions=True)
-            import_coa(company=company_name, file_name=saved_file.file_url)
+            method = load_chart(company_name)
             frappe.db.set_value(
                 "Company", company_name, "chart_of_accounts", "Tunisia - Plan Comptable Tunisien")
             print(
-                f"-> Successfully created Chart of Accounts for {company_name}.")
+                f"-> Successfully created Chart of Accounts for {company_name} ({method}).")
         except Exception as e:
             print(
                 f"-> FATAL ERROR: Failed to create Chart of Accounts for {company_name}. Error: {e}")
             frappe.log_error(frappe.get_traceback(),
                              "Tunisia Compliance CoA Setup Failed")
-            return
+            return False
     else:
         print(
             f"-> Tunisian Chart of Accounts already exists for {company_name}. Skipping creation.")
+    # All account lookups below resolve through one in-memory index of the new chart
+    accounts = AccountResolver(company_name)
     # --- Task 2: Link Payroll Accounts ---
-    if not link_payroll_accounts_to_company(company_name):
+    if not link_payroll_accounts_to_company(company_name, accounts):
         print(
             f"--- Aborting further payroll setup for {company_name} due to account linking failure. ---")
-        return
+        return False
     # --- Task 3: Set Company-Specific Defaults on GLOBAL Components ---
     set_component_defaults_for_company(company_name)
     # --- Task 4: Create Company-Specific Salary Structures ---
     create_payroll_structures(company_name)  # Changed from singular
     # --- Task 5: Other Company-Specific Setups ---
-    create_tax_templates(company_name)
-    setup_default_vat_accounts_for_company(company_name)
+    create_tax_templates(company_name, accounts)
+    setup_default_vat_accounts_for_company(company_name, accounts)
 
     # --- Task 6: NEW - Set ALL other default accounts ---
-    setup_default_accounts_for_company(company_name)
+    setup_default_accounts_for_company(company_name, accounts)
     print(f"--- Finished configuration for {company_name} ---")
+    return True
 
 # ==============================================================================
 # HELPER FUNCTIONS
@@ -114,6 +174,10 @@ def copy_chart_of_accounts_json():
         dest_app_path, "accounts", "doctype", "account", "chart_of_accounts", "verified")
     os.makedirs(dest_folder_path, exist_ok=True)
     dest_file_path = os.path.join(dest_folder_path, "tn.json")
+    # Already installed and unchanged
+    if os.path.exists(source_file_path) and os.path.exists(dest_file_path) and filecmp.cmp(
+            source_file_path, dest_file_path, shallow=False):
+        return
     if os.path.exists(source_file_path):
         try:
             shutil.copy2(source_file_path, dest_file_path)
@@ -124,25 +188,21 @@ def copy_chart_of_accounts_json():
             f"-> ERROR: Source Chart of Accounts file not found at: {source_file_path}")
 
 
-def link_payroll_accounts_to_company(company_name):
+def link_payroll_accounts_to_company(company_name, accounts=None):
     print(
         f"-> Linking payroll accounts for {company_name} using direct DB writes...")
     try:
-        accounts_to_find = {
-            "custom_cnss_liability_account": "%CNSS%",
-            "custom_tax_liability_account": "%Etat, impôts et taxes retenus à la source%",
-            "custom_salary_expense_account": "%Salaires - 6400%",
-            "custom_social_charges_expense_account": "%Cotisations de sécurité sociale sur salaires - 6470%"
-        }
+        accounts = accounts or AccountResolver(company_name)
         overall_success = True
-        for field_name, search_pattern in accounts_to_find.items():
-            account_name = frappe.db.get_value("Account", {"account_name": [
-                                               "like", search_pattern], "company": company_name, "is_group": 0})
+        found = {}
+        for field_name, fragment in PAYROLL_ACCOUNTS.items():
+            account_name = accounts.find(fragment, is_group=0)
             if account_name:
-                frappe.db.set_value("Company", company_name,
-                                    field_name, account_name)
+                found[field_name] = account_name
             else:
                 overall_success = False
+        if found:
+            frappe.db.set_value("Company", company_name, found)
         if overall_success:
             return True
         else:
@@ -151,63 +211,87 @@ def link_payroll_accounts_to_company(company_name):
         return False
 
 
-def create_tax_templates(company):
+def create_tax_templates(company, accounts=None):
     if frappe.db.exists("Sales Taxes and Charges Template", {"title": "TVA 19% - TN", "company": company}):
         return
     print(f"-> Creating tax templates for {company}...")
     try:
-        tva_collected_account = frappe.db.get_value("Account", {"account_name": [
-                                                    "like", "TVA collectée sur les débits%"], "company": company})
-        stamp_duty_account = frappe.db.get_value("Account", {"account_name": [
-                                                 "like", "Produits des activités annexes%"], "company": company})
-        tva_deductible_account = frappe.db.get_value("Account", {"account_name": [
-                                                     "like", "TVA sur autres biens et services%"], "company": company})
-        if not all([tva_collected_account, stamp_duty_account, tva_deductible_account]):
+        tax_accounts = get_tax_template_accounts(accounts or AccountResolver(company))
+        if not tax_accounts:
             raise Exception("One or more required tax accounts not found.")
-        sales_templates = {"TVA 19% - TN": 19.0,
-                           "TVA 13% - TN": 13.0, "TVA 7% - TN": 7.0}
-        for title, rate in sales_templates.items():
-            st_template = frappe.new_doc("Sales Taxes and Charges Template")
-            st_template.title = title
-            st_template.company = company
-            st_template.append("taxes", {"charge_type": "On Net Total",
-                               "account_head": tva_collected_account, "rate": rate, "description": f"TVA @ {int(rate)}%"})
-            st_template.append("taxes", {
-                               "charge_type": "Actual", "account_head": stamp_duty_account, "tax_amount": 1.0, "description": "Timbre Fiscal"})
-            st_template.insert(ignore_permissions=True)
-        purchase_templates = {
-            "TVA 19% (Achats) - TN": 19.0, "TVA 13% (Achats) - TN": 13.0, "TVA 7% (Achats) - TN": 7.0}
-        for title, rate in purchase_templates.items():
-            pt_template = frappe.new_doc("Purchase Taxes and Charges Template")
-            pt_template.title = title
-            pt_template.company = company
-            pt_template.append("taxes", {"charge_type": "On Net Total", "account_head": tva_deductible_account,
-                               "rate": rate, "description": f"TVA Déductible @ {int(rate)}%"})
-            pt_template.insert(ignore_permissions=True)
+        insert_tax_templates(company, tax_accounts, SALES_TAX_TEMPLATES, PURCHASE_TAX_TEMPLATES)
     except Exception:
         pass
 
 
-def setup_default_vat_accounts_for_company(company):
+def get_tax_template_accounts(accounts):
+    """Returns the accounts used by the tax templates, or None if one is missing."""
+    tax_accounts = {
+        "collected": accounts.find("TVA collectée sur les débits", startswith=True),
+        "stamp_duty": accounts.find("Produits des activités annexes", startswith=True),
+        "deductible": accounts.find("TVA sur autres biens et services", startswith=True),
+    }
+    return tax_accounts if all(tax_accounts.values()) else None
+
+
+def insert_tax_templates(company, tax_accounts, sales_templates, purchase_templates):
+    for title, rate in sales_templates.items():
+        st_template = frappe.new_doc("Sales Taxes and Charges Template")
+        st_template.title = title
+        st_template.company = company
+        st_template.append("taxes", {"charge_type": "On Net Total",
+                           "account_head": tax_accounts["collected"], "rate": rate, "description": f"TVA @ {int(rate)}%"})
+        st_template.append("taxes", {
+                           "charge_type": "Actual", "account_head": tax_accounts["stamp_duty"], "tax_amount": 1.0, "description": "Timbre Fiscal"})
+        st_template.insert(ignore_permissions=True)
+    for title, rate in purchase_templates.items():
+        pt_template = frappe.new_doc("Purchase Taxes and Charges Template")
+        pt_template.title = title
+        pt_template.company = company
+        pt_template.append("taxes", {"charge_type": "On Net Total", "account_head": tax_accounts["deductible"],
+                           "rate": rate, "description": f"TVA Déductible @ {int(rate)}%"})
+        pt_template.insert(ignore_permissions=True)
+
+
+def setup_default_vat_accounts_for_company(company, accounts=None):
     print(f"-> Setting up default VAT accounts in Settings for {company}...")
-    settings = frappe.get_doc("Tunisia Compliance Settings")
-    existing_collected = [d for d in settings.vat_collected_accounts if frappe.get_cached_value(
-        "Account", d.account, "company") != company]
-    existing_deductible = [d for d in settings.vat_deductible_accounts if frappe.get_cached_value(
-        "Account", d.account, "company") != company]
-    settings.vat_collected_accounts = existing_collected
-    settings.vat_deductible_accounts = existing_deductible
-    sales_tax_parent = frappe.db.get_value("Account", {"account_name": [
-                                           "like", "Taxes sur le chiffre d'affaires collectées par l'entreprise%"], "company": company, "is_group": 1})
-    purchase_tax_parent = frappe.db.get_value("Account", {"account_name": [
-                                              "like", "Taxes sur le chiffre d'affaires déductibles%"], "company": company, "is_group": 1})
-    if sales_tax_parent:
-        for acc in frappe.get_all("Account", filters={"parent_account": sales_tax_parent, "is_group": 0}, pluck="name"):
-            settings.append("vat_collected_accounts", {"account": acc})
-    if purchase_tax_parent:
-        for acc in frappe.get_all("Account", filters={"parent_account": purchase_tax_parent, "is_group": 0}, pluck="name"):
-            settings.append("vat_deductible_accounts", {"account": acc})
-    settings.save(ignore_permissions=True)
+    replace_vat_settings_accounts(company, get_vat_settings_accounts(accounts or AccountResolver(company)))
+
+
+def get_vat_settings_accounts(accounts):
+    """Returns the company's accounts of the VAT Collected / VAT Deductible tables of the settings."""
+    sales_tax_parent = accounts.find(
+        "Taxes sur le chiffre d'affaires collectées par l'entreprise", is_group=1, startswith=True)
+    purchase_tax_parent = accounts.find(
+        "Taxes sur le chiffre d'affaires déductibles", is_group=1, startswith=True)
+    return {
+        "vat_collected_accounts": accounts.get_children(sales_tax_parent, is_group=0) if sales_tax_parent else [],
+        "vat_deductible_accounts": accounts.get_children(purchase_tax_parent, is_group=0) if purchase_tax_parent else [],
+    }
+
+
+def replace_vat_settings_accounts(company, rows):
+    # Only this company's rows are replaced, without saving the settings document, so
+    # companies provisioned concurrently do not overwrite each other's rows
+    frappe.db.sql(
+        """
+        DELETE vat_account FROM `tabVAT Declaration Account` vat_account
+        INNER JOIN `tabAccount` account ON account.name = vat_account.account
+        WHERE vat_account.parent = 'Tunisia Compliance Settings' AND vat_account.parentfield IN %s
+            AND account.company = %s
+        """,
+        (tuple(rows), company))
+    for parentfield, account_names in rows.items():
+        idx = frappe.db.sql(
+            """SELECT COALESCE(MAX(idx), 0) FROM `tabVAT Declaration Account`
+            WHERE parent = 'Tunisia Compliance Settings' AND parentfield = %s""", parentfield)[0][0]
+        for offset, account_name in enumerate(account_names, start=1):
+            frappe.get_doc({
+                "doctype": "VAT Declaration Account", "parent": "Tunisia Compliance Settings",
+                "parenttype": "Tunisia Compliance Settings", "parentfield": parentfield,
+                "idx": idx + offset, "account": account_name}).db_insert()
+    frappe.clear_document_cache("Tunisia Compliance Settings", "Tunisia Compliance Settings")
+    clear_role_index(company)
 
 # --- PAYROLL HELPER FUNCTIONS ---
 
@@ -298,33 +382,21 @@ def set_component_defaults_for_company(company):
     print(f"-> Setting component account defaults for {company}...")
     try:
         company_accounts = frappe.get_cached_doc("Company", company)
-        cnss_account = company_accounts.custom_cnss_liability_account
-        etat_impots_account = company_accounts.custom_tax_liability_account
-        salaire_expense_account = company_accounts.custom_salary_expense_account
-
         component_account_map = {
-            "Salaire de Base": salaire_expense_account,
-            "Paiement par Feuille de Temps": salaire_expense_account,
-            "Commission sur Ventes": salaire_expense_account,
-            "Indemnité SIVP": salaire_expense_account,
-            "Indemnité de Transport": salaire_expense_account,
-            "Prime de Présence": salaire_expense_account,
-            "Autres Primes (Imposables)": salaire_expense_account,
-            "CNSS - Cotisation Salariale (9.18%)": cnss_account,
-            "Impôt sur le Revenu (IRPP)": etat_impots_account,
-            "Contribution Sociale de Solidarité (CSS)": etat_impots_account,
-            "CNSS - Part Patronale (16.57%)": cnss_account,
-            "Taxe de Formation Professionnelle (TFP)": etat_impots_account,
-            "Fonds de Logement Social (FOPROLOS)": etat_impots_account
-        }
+            name: company_accounts.get(fieldname) for name, fieldname in COMPONENT_ACCOUNT_FIELDS.items()}
 
+        # The components are shared by every company: rows are appended directly instead of
+        # saving the components, which concurrent provisioning jobs would conflict on
         for name, account in component_account_map.items():
-            if frappe.db.exists("Salary Component", name):
-                comp_doc = frappe.get_doc("Salary Component", name)
-                if not comp_doc.get("accounts", {"company": company}):
-                    comp_doc.append(
-                        "accounts", {"company": company, "account": account})
-                    comp_doc.save(ignore_permissions=True)
+            if frappe.db.exists("Salary Component", name) and not frappe.db.exists(
+                    "Salary Component Account", {"parent": name, "parenttype": "Salary Component", "company": company}):
+                idx = frappe.db.sql(
+                    """SELECT COALESCE(MAX(idx), 0) FROM `tabSalary Component Account`
+                    WHERE parent = %s AND parenttype = 'Salary Component'""", name)[0][0]
+                frappe.get_doc({
+                    "doctype": "Salary Component Account", "parent": name, "parenttype": "Salary Component",
+                    "parentfield": "accounts", "idx": idx + 1, "company": company, "account": account}).db_insert()
+                frappe.clear_document_cache("Salary Component", name)
     except Exception:
         pass
 
@@ -332,10 +404,18 @@ def set_component_defaults_for_company(company):
 def create_payroll_structures(company):
     """Creates all necessary payroll structures for the company."""
     print(f"-> Creating all Salary Structures for {company}...")
-    _create_standard_structure(company)
-    _create_hourly_structure(company)
-    _create_commission_structure(company)
-    _create_sivp_structure(company)
+    for create_structure in get_structure_builders(company).values():
+        create_structure(company)
+
+
+def get_structure_builders(company):
+    """Returns {salary structure name: function creating it} for the company."""
+    return {
+        f"Structure Salariale Standard - {company}": _create_standard_structure,
+        f"Structure Salariale Horaire - {company}": _create_hourly_structure,
+        f"Structure Salariale Vente (Commission) - {company}": _create_commission_structure,
+        f"Structure Salariale SIVP - {company}": _create_sivp_structure,
+    }
 
 
 def _create_standard_structure(company):
@@ -490,7 +570,7 @@ def _create_sivp_structure(company):
             f"-> ERROR while creating SIVP Salary Structure for {company}. Error: {e}")
 
 
-def setup_default_accounts_for_company(company):
+def setup_default_accounts_for_company(company, accounts=None):
     """
     Sets all default accounts in Company, Stock Settings, and other doctypes
     based on the final, correct configuration. This is a company-specific task.
@@ -498,45 +578,20 @@ def setup_default_accounts_for_company(company):
     print(f"-> Setting up all default accounts for company: {company}...")
 
     try:
-        # --- Define the mapping of fields to account numbers ---
-        # This map is based on your final screenshots and our discussions.
-        company_defaults = {
-            "default_bank_account": "Comptes en dinars - 5321",
-            "default_cash_account": "Caisse en dinars - 5411",
-            "default_receivable_account": "Clients - ventes de biens ou de prestations de services - 4111",
-            "default_payable_account": "Fournisseurs - achats de biens ou de prestations de services - 4011",
-            "default_expense_account": "Achats de marchandises - 607",
-            "default_income_account": "Ventes de marchandises - 707",
-            "default_discount_account": "Frais sur effets - 6275",
-            "round_off_account": "Charges financières liées à une modif. comptable - 658",
-            "default_deferred_revenue_account": "Produits constatés d'avance - 472",
-            "default_deferred_expense_account": "Charges constatées d'avance - 471",
-            "accumulated_depreciation_account": "Amortissements des immob. corporelles - 282",
-            "depreciation_expense_account": "Immobilisations corporelles - 68112",
-            "capital_work_in_progress_account": "Immobilisations corporelles en cours - 232",
-            "asset_received_but_not_billed": "Fournisseurs d'immobilisations - 4084",
-            "default_payroll_payable_account": "Personnel - rémunérations dues - 421",
-            "default_employee_advance_account": "Personnel - avances et acomptes - 425",
-            "default_expense_claim_payable_account": "Personnel - rémunérations dues - 421",
-            # Corrected from 311 for trading
-            "default_inventory_account": "Matières premières - 311",
-            "stock_adjustment_account": "Variation des stocks (approvisionnements et marchandises) - 603",
-            "stock_received_but_not_billed": "Fournisseurs d'exploitation - 4081",
-            "default_provisional_account": "Fournisseurs d'exploitation - 4081",
-        }
-
+        accounts = accounts or AccountResolver(company)
         # --- Set defaults on the Company doctype ---
-        for field, account_name_fragment in company_defaults.items():
+        defaults = {}
+        for field, account_name_fragment in COMPANY_DEFAULT_ACCOUNTS.items():
             # Find the full account name from the CoA for this company
-            full_account_name = frappe.db.get_value("Account", {"account_name": [
-                                                    "like", f"%{account_name_fragment}%"], "company": company, "is_group": 0})
+            full_account_name = accounts.find(account_name_fragment, is_group=0)
             if full_account_name:
-                frappe.db.set_value("Company", company,
-                                    field, full_account_name)
+                defaults[field] = full_account_name
                 print(f"   - Company.{field} set to: {full_account_name}")
             else:
                 print(
                     f"   - WARNING: Could not find account for '{account_name_fragment}' to set Company.{field}")
+        if defaults:
+            frappe.db.set_value("Company", company, defaults)
 
         print("-> Default accounts setup completed.")
 
@@ -579,19 +634,33 @@ def get_onboarding_status():
     return "show_welcome"
 
 @frappe.whitelist()
-def run_setup_for_company(company_name):
+def run_setup_for_company(company_name, dry_run=0):
     """
     A dedicated whitelisted function to re-run the setup for a single company.
-    This is what the new dialog will call.
+    This is what the new dialog will call. Only the missing configuration is
+    applied (see tunisia_compliance.setup_plan); with `dry_run` nothing is written.
     """
-    from tunisia_compliance.setup import setup_tunisian_company # Import the main function
+    from tunisia_compliance.setup_plan import sync_company_setup
     try:
-        setup_tunisian_company(company_name)
-        return f"Setup for {company_name} completed successfully."
+        report = sync_company_setup(company_name, dry_run=cint(dry_run))
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), f"Onboarding Setup Failed for {company_name}")
         frappe.throw(_("An error occurred while running the setup for {0}. Please check the Error Log.").format(company_name))
 
+    if report.failed:
+        frappe.throw("<br>".join([_("The setup of {0} did not complete:").format(company_name)] + [f"- {warning}" for warning in report.warnings]))
+
+    if not report.changes:
+        message = _("Setup for {0} is already up to date.").format(company_name)
+    elif report.applied:
+        message = _("Setup for {0} completed successfully. Changes:").format(company_name)
+    else:
+        message = _("Changes the setup of {0} would make:").format(company_name)
+    lines = [message] + [f"- {change}" for change in report.changes]
+    if report.warnings:
+        lines += [_("Warnings:")] + [f"- {warning}" for warning in report.warnings]
+    return "<br>".join(lines)
+
 
 @frappe.whitelist()
 def set_onboarding_complete():
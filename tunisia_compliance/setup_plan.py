@@ -0,0 +1,257 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Idempotent re-run of the company setup of `setup.setup_tunisian_company`.
+
+The desired configuration of a company is defined by the constants of `setup`:
+- the payroll and default accounts on the Company;
+- the tax templates;
+- the VAT accounts of Tunisia Compliance Settings;
+- the company accounts of the Salary Components;
+- the Salary Structures.
+
+`plan_company_setup` reads the current state of all of them in a handful of
+batched queries and returns the differences only. `apply_plan` writes those
+differences in bulk, so re-running the setup of a configured company reads a
+few rows and writes nothing. A company without the Tunisian chart of accounts
+gets the full setup instead, since everything else resolves against the chart.
+"""
+
+import frappe
+from frappe.utils import now
+
+from tunisia_compliance.account_resolver import AccountResolver
+from tunisia_compliance.setup import (
+	COMPANY_DEFAULT_ACCOUNTS,
+	COMPONENT_ACCOUNT_FIELDS,
+	PAYROLL_ACCOUNTS,
+	PURCHASE_TAX_TEMPLATES,
+	SALES_TAX_TEMPLATES,
+	get_structure_builders,
+	get_tax_template_accounts,
+	get_vat_settings_accounts,
+	insert_tax_templates,
+	replace_vat_settings_accounts,
+	setup_tunisian_company,
+)
+
+SETTINGS = "Tunisia Compliance Settings"
+
+
+def sync_company_setup(company, dry_run=False):
+	"""
+	Plans the setup of `company` and, unless `dry_run`, applies it. Returns the report;
+	`failed` is set when the full setup stopped before configuring the company or a
+	planned change is still missing, with the reason among the warnings.
+	"""
+	plan = plan_company_setup(company)
+	failed = not dry_run and not apply_plan(plan)
+	return frappe._dict(
+		company=company,
+		applied=not dry_run and not failed,
+		failed=failed,
+		changes=describe_plan(plan),
+		warnings=plan.warnings,
+	)
+
+
+def plan_company_setup(company):
+	plan = frappe._dict(
+		company=company,
+		full_setup=False,
+		company_values={},
+		component_accounts={},
+		sales_templates={},
+		purchase_templates={},
+		tax_accounts=None,
+		vat_accounts=None,
+		structures=[],
+		warnings=[],
+	)
+
+	fields = list(PAYROLL_ACCOUNTS) + list(COMPANY_DEFAULT_ACCOUNTS)
+	current = frappe.db.get_value("Company", company, ["chart_of_accounts", *fields], as_dict=True)
+	accounts = AccountResolver(company)
+	if not current.chart_of_accounts or "Tunisia" not in current.chart_of_accounts or not accounts.accounts:
+		plan.full_setup = True
+		return plan
+
+	# Company accounts
+	desired = {}
+	for field, fragment in {**PAYROLL_ACCOUNTS, **COMPANY_DEFAULT_ACCOUNTS}.items():
+		account = accounts.find(fragment, is_group=0)
+		if account:
+			desired[field] = account
+		else:
+			plan.warnings.append(f"No account found for '{fragment}' (Company.{field})")
+	plan.company_values = {field: value for field, value in desired.items() if current.get(field) != value}
+
+	# Salary Component accounts, from the payroll accounts the Company will have
+	components = set(
+		frappe.get_all(
+			"Salary Component", filters={"name": ("in", list(COMPONENT_ACCOUNT_FIELDS))}, pluck="name"
+		)
+	)
+	configured = set(
+		frappe.get_all(
+			"Salary Component Account",
+			filters={
+				"parenttype": "Salary Component",
+				"company": company,
+				"parent": ("in", list(components)),
+			},
+			pluck="parent",
+		)
+		if components
+		else []
+	)
+	for component, field in COMPONENT_ACCOUNT_FIELDS.items():
+		account = desired.get(field) or current.get(field)
+		if component in components and component not in configured and account:
+			plan.component_accounts[component] = account
+
+	# Tax templates
+	for doctype, templates, key in (
+		("Sales Taxes and Charges Template", SALES_TAX_TEMPLATES, "sales_templates"),
+		("Purchase Taxes and Charges Template", PURCHASE_TAX_TEMPLATES, "purchase_templates"),
+	):
+		existing = set(
+			frappe.get_all(
+				doctype, filters={"company": company, "title": ("in", list(templates))}, pluck="title"
+			)
+		)
+		plan[key] = {title: rate for title, rate in templates.items() if title not in existing}
+	if plan.sales_templates or plan.purchase_templates:
+		plan.tax_accounts = get_tax_template_accounts(accounts)
+		if not plan.tax_accounts:
+			plan.warnings.append("Tax templates skipped: one or more required tax accounts not found")
+			plan.sales_templates, plan.purchase_templates = {}, {}
+
+	# VAT accounts of the settings
+	vat_accounts = get_vat_settings_accounts(accounts)
+	rows = frappe.db.sql(
+		"""
+		SELECT vat_account.parentfield, vat_account.account
+		FROM `tabVAT Declaration Account` vat_account
+		INNER JOIN `tabAccount` account ON account.name = vat_account.account
+		WHERE vat_account.parent = %s AND account.company = %s
+		""",
+		(SETTINGS, company),
+		as_dict=1,
+	)
+	current_vat_accounts = {parentfield: set() for parentfield in vat_accounts}
+	for row in rows:
+		current_vat_accounts.setdefault(row.parentfield, set()).add(row.account)
+	if any(set(names) != current_vat_accounts[field] for field, names in vat_accounts.items()):
+		plan.vat_accounts = vat_accounts
+
+	# Salary Structures
+	builders = get_structure_builders(company)
+	existing = set(frappe.get_all("Salary Structure", filters={"name": ("in", list(builders))}, pluck="name"))
+	plan.structures = [name for name in builders if name not in existing]
+
+	return plan
+
+
+def describe_plan(plan):
+	"""Returns one line per change of the plan."""
+	if plan.full_setup:
+		return [f"Tunisian chart of accounts missing: full setup of {plan.company}"]
+
+	changes = [f"Company.{field}: {value}" for field, value in plan.company_values.items()]
+	changes += [
+		f"Salary Component {name}: account {account}" for name, account in plan.component_accounts.items()
+	]
+	changes += [f"Tax template {title}" for title in (*plan.sales_templates, *plan.purchase_templates)]
+	if plan.vat_accounts:
+		changes.append(f"VAT accounts of {SETTINGS}")
+	changes += [f"Salary Structure {name}" for name in plan.structures]
+	return changes
+
+
+def apply_plan(plan):
+	"""
+	Writes the changes of `plan`. Returns False, with a warning added to the plan, if
+	the full setup of the company failed or a planned Salary Structure was not created.
+	"""
+	if plan.full_setup:
+		if setup_tunisian_company(plan.company):
+			return True
+		plan.warnings.append(
+			"Setup stopped: the chart of accounts could not be loaded or the payroll accounts were not found"
+		)
+		return False
+
+	if plan.company_values:
+		frappe.db.set_value("Company", plan.company, plan.company_values)
+		frappe.clear_document_cache("Company", plan.company)
+
+	if plan.component_accounts:
+		_insert_component_accounts(plan.company, plan.component_accounts)
+
+	if plan.sales_templates or plan.purchase_templates:
+		insert_tax_templates(plan.company, plan.tax_accounts, plan.sales_templates, plan.purchase_templates)
+
+	if plan.vat_accounts:
+		replace_vat_settings_accounts(plan.company, plan.vat_accounts)
+
+	builders = get_structure_builders(plan.company)
+	for name in plan.structures:
+		builders[name](plan.company)
+
+	# the builders report their errors without raising, so check what they created
+	if not plan.structures:
+		return True
+	created = set(frappe.get_all("Salary Structure", filters={"name": ("in", plan.structures)}, pluck="name"))
+	missing = [name for name in plan.structures if name not in created]
+	plan.warnings += [f"Salary Structure {name} could not be created" for name in missing]
+	return not missing
+
+
+def _insert_component_accounts(company, component_accounts):
+	last_idx = dict(
+		frappe.db.sql(
+			"""
+			SELECT parent, MAX(idx) FROM `tabSalary Component Account`
+			WHERE parenttype = 'Salary Component' AND parent IN %s
+			GROUP BY parent
+			""",
+			(tuple(component_accounts),),
+		)
+	)
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"Salary Component Account",
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"parent",
+			"parenttype",
+			"parentfield",
+			"idx",
+			"company",
+			"account",
+		],
+		values=[
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				component,
+				"Salary Component",
+				"accounts",
+				(last_idx.get(component) or 0) + 1,
+				company,
+				account,
+			)
+			for component, account in component_accounts.items()
+		],
+	)
+	for component in component_accounts:
+		frappe.clear_document_cache("Salary Component", component)
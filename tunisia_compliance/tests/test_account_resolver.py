@@ -0,0 +1,68 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+
+from tunisia_compliance.account_resolver import AccountResolver, normalize
+
+
+def account(name, account_name, account_number=None, parent_account=None, is_group=0):
+	return frappe._dict(
+		name=name,
+		account_name=account_name,
+		account_number=account_number,
+		parent_account=parent_account,
+		is_group=is_group,
+	)
+
+
+# in tree order, as loaded from the Tunisian chart
+ACCOUNTS = [
+	account("64 - Charges de personnel - TC", "Charges de personnel", "64", is_group=1),
+	account("640 - Salaires - TC", "Salaires", "640", "64 - Charges de personnel - TC", is_group=1),
+	account("6400 - Salaires - 6400 - TC", "Salaires - 6400", "6400", "640 - Salaires - TC"),
+	account("6470 - Cotisations - TC", "Cotisations de sécurité sociale sur salaires - 6470", "6470"),
+	account("4367 - TVA - TC", "TVA collectée", "4367", is_group=1),
+	account("436711 - TVA débits - TC", "TVA collectée sur les débits", "436711", "4367 - TVA - TC"),
+	account("706 - Annexes - TC", "Produits des activités annexes - 706", "706"),
+	account("4111 - Clients - TC", "Clients d\u2019exportation", "4111"),
+]
+
+
+class TestAccountResolver(unittest.TestCase):
+	def setUp(self):
+		self.resolver = AccountResolver("_Test Company", accounts=[frappe._dict(a) for a in ACCOUNTS])
+
+	def test_exact_name(self):
+		self.assertEqual(self.resolver.find("Salaires - 6400"), "6400 - Salaires - 6400 - TC")
+
+	def test_trailing_number_resolves_through_number(self):
+		self.assertEqual(
+			self.resolver.find("Cotisations de sécurité sociale sur salaires - 6470"),
+			"6470 - Cotisations - TC",
+		)
+
+	def test_substring_follows_tree_order(self):
+		self.assertEqual(self.resolver.find("salaires"), "640 - Salaires - TC")
+		self.assertEqual(self.resolver.find("salaires", is_group=0), "6400 - Salaires - 6400 - TC")
+
+	def test_startswith(self):
+		self.assertEqual(self.resolver.find("TVA collectée sur", startswith=True), "436711 - TVA débits - TC")
+		self.assertIsNone(self.resolver.find("collectée sur", startswith=True))
+		self.assertEqual(
+			self.resolver.find("Produits des activités annexes", startswith=True), "706 - Annexes - TC"
+		)
+
+	def test_apostrophes_and_case_are_normalized(self):
+		self.assertEqual(self.resolver.find("clients d'EXPORTATION"), "4111 - Clients - TC")
+		self.assertEqual(normalize("  Clients  d\u2019Exportation "), "clients d'exportation")
+
+	def test_missing_account(self):
+		self.assertIsNone(self.resolver.find("Compte inexistant"))
+		self.assertIsNone(self.resolver.find("Charges de personnel", is_group=0))
+
+	def test_get_by_number_and_children(self):
+		self.assertEqual(self.resolver.get_by_number(6400), "6400 - Salaires - 6400 - TC")
+		self.assertEqual(self.resolver.get_children("640 - Salaires - TC"), ["6400 - Salaires - 6400 - TC"])
@@ -0,0 +1,127 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from tunisia_compliance import coa_loader
+from tunisia_compliance.coa_loader import build_tree, compile_template, number_nested_set, walk
+
+CHART = """account_name,parent_account,account_number,parent_account_number,is_group,account_type,root_type,account_currency
+"Actifs","",1,"",1,"","Asset","TND"
+"Stocks","Actifs",3,1,1,"","",""
+"Marchandises","Stocks",37,3,0,"Stock","",""
+"Banques","Actifs",53,1,0,"Bank","",""
+"Produits","",7,"",1,"","Income","TND"
+"Ventes","Produits",70,7,0,"","",""
+"""
+
+
+def accounts(*rows):
+	fields = ("account_name", "parent_account", "is_group", "root_type")
+	return [dict(zip(fields, row, strict=True)) for row in rows]
+
+
+class TestChartTree(unittest.TestCase):
+	def test_tree_links_parents_and_inherits_root_type(self):
+		roots = build_tree(coa_loader.parse_chart(CHART.encode()))
+
+		self.assertEqual([root.account_name for root in roots], ["Actifs", "Produits"])
+		self.assertEqual(
+			[node.account_name for node in walk(roots)],
+			["Actifs", "Stocks", "Marchandises", "Banques", "Produits", "Ventes"],
+		)
+		self.assertEqual({node.root_type for node in walk(roots[:1])}, {"Asset"})
+		self.assertEqual(roots[1].children[0].root_type, "Income")
+
+	def test_invalid_templates_are_rejected(self):
+		invalid = {
+			"duplicate": accounts(("A", "", 1, "Asset"), ("A", "", 1, "Asset")),
+			"missing parent": accounts(("A", "", 1, "Asset"), ("B", "X", 0, "")),
+			"ledger parent": accounts(("A", "", 0, "Asset"), ("B", "A", 0, "")),
+			"no root type": accounts(("A", "", 1, ""), ("B", "A", 0, "")),
+			"cycle": accounts(("A", "", 1, "Asset"), ("B", "C", 1, "Asset"), ("C", "B", 1, "Asset")),
+		}
+		for case, rows in invalid.items():
+			with self.subTest(case), self.assertRaises(ValueError):
+				build_tree(rows)
+
+	def test_nested_set_numbering(self):
+		roots = build_tree(coa_loader.parse_chart(CHART.encode()))
+
+		end = number_nested_set(roots, 10)
+
+		nodes = list(walk(roots))
+		self.assertEqual(end, 10 + 2 * len(nodes))
+		self.assertEqual(
+			sorted(value for node in nodes for value in (node.lft, node.rgt)), list(range(10, end))
+		)
+		for node in nodes:
+			self.assertLess(node.lft, node.rgt)
+			for child in node.children:
+				self.assertTrue(node.lft < child.lft < child.rgt < node.rgt)
+			# a node spans exactly its descendants
+			self.assertEqual((node.rgt - node.lft - 1) // 2, sum(1 for _node in walk(node.children)))
+
+	def test_compiled_template_rows(self):
+		template = compile_template(CHART.encode())
+
+		self.assertEqual(template.width, 12)
+		rows = [dict(zip(template.columns, row, strict=True)) for row in template.accounts]
+		self.assertEqual(rows[0]["parent"], None)
+		self.assertEqual(rows[2]["account_name"], "Marchandises")
+		self.assertEqual(rows[rows[2]["parent"]]["account_name"], "Stocks")
+		self.assertEqual((rows[0]["lft"], rows[0]["rgt"]), (0, 7))
+
+
+class TestChartLoad(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_loads_use_separate_nested_set_ranges(self):
+		template = coa_loader.get_chart_template()
+		ranges = []
+		for abbr in ("_TC1", "_TC2"):
+			company = _make_company(abbr)
+			count = coa_loader.bulk_load_chart(company, template)
+			lft, rgt, accounts = frappe.db.sql(
+				"SELECT MIN(lft), MAX(rgt), COUNT(*) FROM `tabAccount` WHERE company = %s", company
+			)[0]
+			self.assertEqual(accounts, count)
+			self.assertEqual(rgt - lft + 1, 2 * count)
+			ranges.append((lft, rgt))
+
+		(first_lft, first_rgt), (second_lft, second_rgt) = ranges
+		self.assertTrue(first_rgt < second_lft or second_rgt < first_lft)
+
+	def test_failed_bulk_load_falls_back_to_import_coa(self):
+		company = _make_company("_TC3")
+
+		with patch.object(coa_loader, "bulk_load_chart", side_effect=Exception("bulk load failed")):
+			method = coa_loader.load_chart(company)
+
+		self.assertEqual(method, "import_coa")
+		self.assertTrue(frappe.db.exists("Account", {"company": company, "is_group": 0}))
+
+
+def _make_company(abbr):
+	name = f"_Test Tunisian Company {abbr}"
+	if not frappe.db.exists("Company", name):
+		# the chart is loaded by the test itself
+		frappe.local.flags.ignore_chart_of_accounts = True
+		try:
+			frappe.get_doc(
+				{
+					"doctype": "Company",
+					"company_name": name,
+					"abbr": abbr,
+					"country": "Tunisia",
+					"default_currency": "TND",
+				}
+			).insert()
+		finally:
+			frappe.local.flags.ignore_chart_of_accounts = False
+	return name
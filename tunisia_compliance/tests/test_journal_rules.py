@@ -0,0 +1,44 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+
+from tunisia_compliance import journal_rules
+from tunisia_compliance.journal_rules import compile_condition, evaluate, matches
+
+FORBIDDEN_CONDITIONS = (
+	"doc.__class__",
+	"doc.__class__.__mro__[1].__subclasses__()",
+	"__import__('os').system('true')",
+	"import os",
+	"doc._private",
+	"(value := 1)",
+	"getattr(doc, '__class__')",
+	"open('/etc/passwd').read()",
+)
+
+
+class TestRuleConditions(unittest.TestCase):
+	def test_forbidden_expressions_are_rejected(self):
+		doc = frappe._dict(doctype="Sales Invoice", grand_total=10)
+		for condition in FORBIDDEN_CONDITIONS:
+			with self.subTest(condition=condition), self.assertRaises(Exception):
+				compile_condition(condition)
+				evaluate(condition, {"doc": doc})
+
+	def test_conditions_are_evaluated(self):
+		doc = frappe._dict(doctype="Sales Invoice", is_return=1, customer_group="Export", grand_total=120)
+
+		self.assertTrue(evaluate("doc.is_return and doc.grand_total > 100", {"doc": doc}))
+		self.assertTrue(evaluate("doc.get('customer_group') in ('Export', 'EU')", {"doc": doc}))
+		self.assertFalse(evaluate("doc.customer_group == 'Local'", {"doc": doc}))
+
+	@unittest.skipIf(journal_rules.WHITELISTED_SAFE_EVAL_GLOBALS is None, "Conditions are not precompiled")
+	def test_code_objects_are_cached(self):
+		self.assertIs(compile_condition("doc.is_return == 1"), compile_condition("doc.is_return == 1"))
+
+	def test_rule_without_condition_always_matches(self):
+		self.assertTrue(matches(frappe._dict(condition=""), frappe._dict()))
+		self.assertFalse(matches(frappe._dict(condition="doc.is_return"), frappe._dict(is_return=0)))
@@ -0,0 +1,101 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import unittest
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from tunisia_compliance import setup_plan
+from tunisia_compliance.setup_plan import describe_plan
+
+
+def empty_plan(**values):
+	plan = frappe._dict(
+		company="_Test Company",
+		full_setup=False,
+		company_values={},
+		component_accounts={},
+		sales_templates={},
+		purchase_templates={},
+		tax_accounts=None,
+		vat_accounts=None,
+		structures=[],
+		warnings=[],
+	)
+	plan.update(values)
+	return plan
+
+
+class TestDescribePlan(unittest.TestCase):
+	def test_up_to_date_plan_has_no_changes(self):
+		self.assertEqual(describe_plan(empty_plan()), [])
+
+	def test_full_setup_is_one_change(self):
+		self.assertEqual(len(describe_plan(empty_plan(full_setup=True, structures=["S"]))), 1)
+
+	def test_one_line_per_change(self):
+		plan = empty_plan(
+			company_values={"default_bank_account": "Banque - TC"},
+			component_accounts={"Impôt sur le Revenu (IRPP)": "Etat - TC"},
+			sales_templates={"TVA 19% - TN": 19},
+			purchase_templates={"TVA Déductible 19% - TN": 19},
+			vat_accounts={"vat_collected_accounts": ["TVA - TC"]},
+			structures=["Structure Salariale - TC"],
+		)
+
+		self.assertEqual(len(describe_plan(plan)), 6)
+
+
+class TestSetupPlan(FrappeTestCase):
+	def setUp(self):
+		self.company = frappe.db.get_value(
+			"Company", {"country": "Tunisia", "chart_of_accounts": ("like", "%Tunisia%")}
+		)
+		if not self.company:
+			self.skipTest("No Tunisian company with the Tunisian chart on this site")
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_applied_plan_leaves_nothing_to_do(self):
+		report = setup_plan.sync_company_setup(self.company)
+		self.assertTrue(report.applied, report.warnings)
+
+		plan = setup_plan.plan_company_setup(self.company)
+		self.assertFalse(plan.full_setup)
+		self.assertEqual(describe_plan(plan), [])
+
+	def test_dry_run_writes_nothing(self):
+		frappe.db.set_value("Company", self.company, "default_bank_account", None)
+
+		report = setup_plan.sync_company_setup(self.company, dry_run=True)
+
+		self.assertFalse(report.applied)
+		self.assertFalse(frappe.db.get_value("Company", self.company, "default_bank_account"))
+		# a change, or a warning when the chart has no such account
+		self.assertIn("default_bank_account", " ".join(report.changes + report.warnings))
+
+	def test_failed_full_setup_is_reported(self):
+		with (
+			patch.object(
+				setup_plan,
+				"plan_company_setup",
+				return_value=empty_plan(company=self.company, full_setup=True),
+			),
+			patch.object(setup_plan, "setup_tunisian_company", return_value=False),
+		):
+			report = setup_plan.sync_company_setup(self.company)
+
+		self.assertTrue(report.failed)
+		self.assertFalse(report.applied)
+		self.assertTrue(report.warnings)
+
+	def test_structure_not_created_is_reported(self):
+		name = "_Test Missing Structure"
+		plan = empty_plan(company=self.company, structures=[name])
+		with patch.object(setup_plan, "get_structure_builders", return_value={name: lambda company: None}):
+			self.assertFalse(setup_plan.apply_plan(plan))
+
+		self.assertEqual(plan.warnings, [f"Salary Structure {name} could not be created"])
@@ -0,0 +1,75 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import unittest
+from datetime import date
+
+import frappe
+
+from tunisia_compliance.vat_credit import fold_credit_chain
+
+PERIODS = [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)]
+
+
+def declaration(name, collected, deductible, docstatus=0, **values):
+	return frappe._dict(
+		name=name,
+		docstatus=docstatus,
+		total_vat_collected=collected,
+		total_vat_deductible=deductible,
+		**values,
+	)
+
+
+class TestCreditChain(unittest.TestCase):
+	def test_credit_is_carried_until_used(self):
+		declarations = {
+			PERIODS[0]: declaration("VD-1", 100, 250),
+			PERIODS[1]: declaration("VD-2", 100, 0),
+			PERIODS[2]: declaration("VD-3", 300, 100),
+		}
+
+		series = fold_credit_chain(PERIODS, declarations, 20)
+
+		self.assertEqual([row.previous_month_credit for row in series], [20, 170, 70])
+		self.assertEqual([row.vat_due for row in series], [-170, -70, 130])
+
+	def test_month_without_declaration_carries_credit(self):
+		declarations = {PERIODS[0]: declaration("VD-1", 0, 50), PERIODS[2]: declaration("VD-3", 80, 0)}
+
+		series = fold_credit_chain(PERIODS, declarations, 0)
+
+		self.assertIsNone(series[1].declaration)
+		self.assertEqual(series[1].previous_month_credit, 50)
+		self.assertEqual(series[2].previous_month_credit, 50)
+		self.assertEqual(series[2].vat_due, 30)
+
+	def test_submitted_declaration_carries_its_declared_credit(self):
+		declarations = {
+			# declared with a 40 credit, although the chain brings 20
+			PERIODS[0]: declaration("VD-1", 100, 150, docstatus=1, previous_month_credit=40, vat_due=-90),
+			PERIODS[1]: declaration("VD-2", 100, 0),
+		}
+
+		series = fold_credit_chain(PERIODS[:2], declarations, 20)
+
+		self.assertEqual((series[0].previous_month_credit, series[0].vat_due), (40, -90))
+		self.assertFalse(series[0].changed)
+		self.assertEqual(series[1].previous_month_credit, 90)
+		self.assertEqual(series[1].vat_due, 10)
+
+	def test_changed_compares_stored_values(self):
+		declarations = {
+			PERIODS[0]: declaration("VD-1", 100, 0, previous_month_credit=10, vat_due=90),
+			PERIODS[1]: declaration("VD-2", 100, 0, previous_month_credit=0, vat_due=100),
+		}
+
+		series = fold_credit_chain(PERIODS[:2], declarations, 10)
+
+		self.assertFalse(series[0].changed)
+		self.assertFalse(series[1].changed)
+
+		series = fold_credit_chain(PERIODS[:2], declarations, 25)
+
+		self.assertTrue(series[0].changed)
+		self.assertFalse(series[1].changed)
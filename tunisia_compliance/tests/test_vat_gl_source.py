@@ -0,0 +1,106 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+
+from tunisia_compliance.account_roles import COLLECTED, DEDUCTIBLE_GS, STAMP_DUTY, WITHHOLDING
+from tunisia_compliance.vat_gl_source import _fold_voucher, _infer_rate
+
+ROLE_OF = {
+	"TVA collectée": COLLECTED,
+	"TVA déductible": DEDUCTIBLE_GS,
+	"Timbre": STAMP_DUTY,
+	"Retenue": WITHHOLDING,
+}
+
+
+def new_ledger():
+	return frappe._dict(
+		collected={}, suspended={}, deductible={}, withholding={}, fodec_amount=0.0, excluded_vouchers=[]
+	)
+
+
+def voucher(key, customer=0.0, supplier=0.0, **net):
+	return frappe._dict(key=key, customer=customer, supplier=supplier, net=net)
+
+
+class TestInferRate(unittest.TestCase):
+	def test_snaps_to_standard_rate(self):
+		self.assertEqual(_infer_rate(19, 100), 19.0)
+		self.assertEqual(_infer_rate(7.003, 100), 7.0)
+		self.assertEqual(_infer_rate(-13, -100), 13.0)
+
+	def test_keeps_non_standard_rate(self):
+		self.assertEqual(_infer_rate(16, 100), 16.0)
+
+	def test_zero_base(self):
+		self.assertEqual(_infer_rate(19, 0), 0.0)
+
+
+class TestFoldVoucher(unittest.TestCase):
+	def test_sales_invoice_excludes_stamp_duty_from_base(self):
+		ledger = new_ledger()
+		net = {"TVA collectée": -19.0, "Timbre": -1.0}
+		_fold_voucher(ledger, voucher(("Sales Invoice", "SINV-1"), customer=120.0, **net), ROLE_OF)
+
+		self.assertEqual(ledger.collected, {("TVA collectée", 19.0): [100.0, 19.0]})
+
+	def test_purchase_invoice_adds_back_withholding(self):
+		ledger = new_ledger()
+		net = {"TVA déductible": 19.0, "Retenue": -1.5}
+		_fold_voucher(ledger, voucher(("Purchase Invoice", "PINV-1"), supplier=117.5, **net), ROLE_OF)
+
+		self.assertEqual(ledger.deductible, {("TVA déductible", 19.0): [100.0, 19.0]})
+		self.assertEqual(ledger.withholding, {"Retenue": [119.0, 1.5]})
+
+	def test_mixed_rate_invoice_uses_invoice_lines(self):
+		ledger = new_ledger()
+		lines = [
+			frappe._dict(account_head="TVA collectée", rate=7, base_amount=100.0, vat_amount=7.0),
+			frappe._dict(account_head="TVA collectée", rate=19, base_amount=100.0, vat_amount=19.0),
+		]
+		net = {"TVA collectée": -26.0, "Timbre": -1.0}
+		_fold_voucher(ledger, voucher(("Sales Invoice", "SINV-2"), customer=227.0, **net), ROLE_OF, lines)
+
+		# the blended base would infer 13%
+		self.assertEqual(
+			ledger.collected,
+			{("TVA collectée", 7.0): [100.0, 7.0], ("TVA collectée", 19.0): [100.0, 19.0]},
+		)
+
+	def test_pos_invoice_uses_invoice_lines(self):
+		ledger = new_ledger()
+		lines = [frappe._dict(account_head="TVA collectée", rate=19, base_amount=100.0, vat_amount=19.0)]
+		net = {"TVA collectée": -19.0, "Timbre": -1.0}
+		# the customer is debited and credited by the payment in the same voucher
+		_fold_voucher(ledger, voucher(("Sales Invoice", "SINV-3"), customer=0.0, **net), ROLE_OF, lines)
+
+		self.assertEqual(ledger.collected, {("TVA collectée", 19.0): [100.0, 19.0]})
+		self.assertEqual(ledger.excluded_vouchers, [])
+
+	def test_paid_purchase_invoice_rebuilds_withholding_base(self):
+		ledger = new_ledger()
+		lines = [frappe._dict(account_head="TVA déductible", rate=19, base_amount=100.0, vat_amount=19.0)]
+		net = {"TVA déductible": 19.0, "Retenue": -1.5}
+		_fold_voucher(ledger, voucher(("Purchase Invoice", "PINV-2"), supplier=0.0, **net), ROLE_OF, lines)
+
+		self.assertEqual(ledger.deductible, {("TVA déductible", 19.0): [100.0, 19.0]})
+		self.assertEqual(ledger.withholding, {"Retenue": [119.0, 1.5]})
+
+	def test_settlement_journal_entry_is_excluded(self):
+		ledger = new_ledger()
+		# month-end settlement: 436711 is debited against the VAT payable account, no party line
+		_fold_voucher(ledger, voucher(("Journal Entry", "JV-1"), **{"TVA collectée": 19.0}), ROLE_OF)
+
+		self.assertEqual(ledger.collected, {})
+		self.assertEqual(ledger.excluded_vouchers, [("Journal Entry", "JV-1")])
+
+	def test_vat_offset_journal_entry_is_excluded_on_both_sides(self):
+		ledger = new_ledger()
+		net = {"TVA collectée": 19.0, "TVA déductible": -19.0}
+		_fold_voucher(ledger, voucher(("Journal Entry", "JV-2"), **net), ROLE_OF)
+
+		self.assertEqual((ledger.collected, ledger.deductible), ({}, {}))
+		self.assertEqual(ledger.excluded_vouchers, [("Journal Entry", "JV-2")])
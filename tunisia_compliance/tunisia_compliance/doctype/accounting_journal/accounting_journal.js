@@ -12,6 +12,94 @@ frappe.ui.form.on("Accounting Journal", {
 				},
 			};
 		});
+
+		frappe.realtime.on("journal_book_export", (data) => {
+			if (data.accounting_journal !== frm.doc.name) return;
+			frappe.msgprint(
+				__("The journal book ({0} lines) is ready: {1}", [
+					data.lines,
+					`<a href="${data.file_url}">${data.file_url}</a>`,
+				])
+			);
+			frm.reload_doc();
+		});
+	},
+
+	refresh: function (frm) {
+		if (frm.is_new()) return;
+
+		frm.add_custom_button(__("Export Journal Book"), () => {
+			frappe.prompt(
+				[
+					{
+						fieldname: "fiscal_year",
+						fieldtype: "Link",
+						label: __("Fiscal Year"),
+						options: "Fiscal Year",
+						reqd: 1,
+					},
+					{
+						fieldname: "file_format",
+						fieldtype: "Select",
+						label: __("Format"),
+						options: ["CSV", "Fixed Width (DGI)"],
+						default: "CSV",
+						reqd: 1,
+					},
+				],
+				(values) => {
+					frappe
+						.call("tunisia_compliance.journal_export.export_journal_book", {
+							accounting_journal: frm.doc.name,
+							...values,
+						})
+						.then(() => {
+							frappe.show_alert(__("The journal book is being generated."));
+						});
+				},
+				__("Export Journal Book")
+			);
+		});
+
+		frm.add_custom_button(__("Test Rules"), () => {
+			frappe.prompt(
+				{
+					fieldname: "limit",
+					fieldtype: "Int",
+					label: __("Number of recent documents"),
+					default: 100,
+					reqd: 1,
+				},
+				(values) => {
+					frm.call("test_rules", values).then((r) => {
+						const rows = (r.message || [])
+							.map(
+								(row) => `<tr>
+									<td>${row.idx}</td>
+									<td>${__(row.document_type)}</td>
+									<td><code>${frappe.utils.escape_html(row.condition || "")}</code></td>
+									<td>${row.matches} / ${row.documents}</td>
+									<td>${row.errors}</td>
+									<td>${row.duration_ms} ms</td>
+								</tr>`
+							)
+							.join("");
+						frappe.msgprint({
+							title: __("Rule Test Results"),
+							wide: true,
+							message: `<table class="table table-bordered">
+								<thead><tr>
+									<th>#</th><th>${__("Document")}</th><th>${__("Condition")}</th>
+									<th>${__("Matches")}</th><th>${__("Errors")}</th><th>${__("Time")}</th>
+								</tr></thead>
+								<tbody>${rows}</tbody>
+							</table>`,
+						});
+					});
+				},
+				__("Test Rules")
+			);
+		});
 	},
 });
 
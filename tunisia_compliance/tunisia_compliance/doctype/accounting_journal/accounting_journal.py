@@ -4,12 +4,37 @@
 # Copyright (c) 2019, Dokos SAS and Contributors
 # For license information, please see license.txt
 
+import base64
+import time
+
 import frappe
 from frappe import _
-from frappe.email.doctype.notification.notification import get_context
 from frappe.model.document import Document
+from frappe.utils import cint
+from frappe.utils.background_jobs import is_job_enqueued
+
+from tunisia_compliance.journal_adjustment import (
+	adjust_vouchers,
+	get_adjustment_progress,
+	get_job_id,
+	set_adjustment_progress,
+)
+from tunisia_compliance.journal_rules import (
+	clear_rule_sets,
+	compile_condition,
+	evaluate,
+	get_unknown_fields,
+	matches,
+	resolve_journal,
+	resolve_journals,
+)
+
+# selections larger than this are adjusted in a background job
+INLINE_ADJUSTMENT_LIMIT = 50
 
-from erpnext.accounts.general_ledger import make_entry, make_reverse_gl_entries
+# vouchers per page and GL rows per drill-down response of `get_entry_summary`
+MAX_PAGE_LENGTH = 500
+MAX_DRILL_DOWN_ROWS = 2000
 
 
 class AccountingJournal(Document):
@@ -44,14 +69,88 @@ class AccountingJournal(Document):
 		if self.conditions:
 			self.validate_conditions()
 
+	def on_update(self):
+		clear_rule_sets()
+
+	def on_trash(self):
+		clear_rule_sets()
+
+	def after_rename(self, old, new, merge=False):
+		clear_rule_sets()
+
 	def validate_conditions(self):
+		# one dummy document per document type, shared by all its conditions
+		contexts = {}
 		for condition in self.conditions:
-			if condition.condition:
-				temp_doc = frappe.new_doc(condition.document_type)
+			if not condition.condition:
+				continue
+
+			try:
+				compile_condition(condition.condition.strip())
+				unknown_fields = get_unknown_fields(condition.condition, condition.document_type)
+			except SyntaxError:
+				frappe.throw(_("The Condition '{0}' is invalid").format(condition.condition))
+
+			if unknown_fields:
+				frappe.throw(
+					_("Row {0}: {1} has no field {2}").format(
+						condition.idx, _(condition.document_type), ", ".join(unknown_fields)
+					)
+				)
+
+			if condition.document_type not in contexts:
+				contexts[condition.document_type] = {
+					"doc": frappe._dict(frappe.new_doc(condition.document_type).as_dict())
+				}
+			try:
+				evaluate(condition.condition.strip(), contexts[condition.document_type])
+			except Exception:
+				frappe.throw(_("The Condition '{0}' is invalid").format(condition.condition))
+
+	@frappe.whitelist()
+	def test_rules(self, limit=100):
+		"""Evaluates each rule against the last `limit` documents of its type and reports matches and timing."""
+		limit = min(cint(limit) or 100, 1000)
+		docs_by_type, results = {}, []
+
+		for rule in self.conditions:
+			if rule.document_type not in docs_by_type:
+				filters = {}
+				if frappe.get_meta(rule.document_type).has_field("company"):
+					filters["company"] = self.company
+				docs = frappe.get_list(
+					rule.document_type,
+					filters=filters,
+					fields=["*"],
+					order_by="creation desc",
+					limit_page_length=limit,
+				)
+				for doc in docs:
+					doc.doctype = rule.document_type
+				docs_by_type[rule.document_type] = docs
+
+			docs = docs_by_type[rule.document_type]
+			condition = frappe._dict(condition=(rule.condition or "").strip())
+			matched = errors = 0
+			start = time.perf_counter()
+			for doc in docs:
 				try:
-					frappe.safe_eval(condition.condition, None, get_context(temp_doc))
+					matched += bool(matches(condition, doc))
 				except Exception:
-					frappe.throw(_("The Condition '{0}' is invalid").format(condition))
+					errors += 1
+
+			results.append(
+				{
+					"idx": rule.idx,
+					"document_type": rule.document_type,
+					"condition": rule.condition,
+					"documents": len(docs),
+					"matches": matched,
+					"errors": errors,
+					"duration_ms": round((time.perf_counter() - start) * 1000, 2),
+				}
+			)
+		return results
 
 
 @frappe.whitelist()
@@ -75,61 +174,156 @@ def get_entries(doctype, docnames):
 	)
 
 
-# @dokos
 @frappe.whitelist()
-def accounting_journal_adjustment(doctype, docnames, accounting_journal):
-	for docname in frappe.parse_json(docnames):
-		original_entries = frappe.get_all(
+def get_entry_summary(doctype, docnames, cursor=None, page_length=100, drill_down=0):
+	"""
+	Paginated variant of `get_entries`: returns, for one page of the selected vouchers
+	(in name order), debit/credit totals grouped by voucher and journal, and with
+	`drill_down` the GL rows themselves, capped at MAX_DRILL_DOWN_ROWS. Pass the
+	returned `next_cursor` back to get the following page.
+
+	A page holds whole vouchers, except when a single voucher has more rows than the
+	cap: its first MAX_DRILL_DOWN_ROWS rows are returned and `truncated` is set.
+	"""
+	docnames = sorted(set(frappe.parse_json(docnames)))
+	after = _decode_cursor(cursor)
+	page_length = min(cint(page_length) or 100, MAX_PAGE_LENGTH)
+
+	page = [name for name in docnames if after is None or name > after][:page_length]
+	if not page:
+		return {
+			"groups": [],
+			"entries": [],
+			"truncated": False,
+			"next_cursor": None,
+			"total_vouchers": len(docnames),
+		}
+
+	filters = {"voucher_type": doctype, "voucher_no": ("in", page), "is_cancelled": 0}
+	groups = frappe.get_list(
+		"GL Entry",
+		filters=filters,
+		fields=[
+			"voucher_no",
+			"accounting_journal",
+			"sum(debit) as debit",
+			"sum(credit) as credit",
+			"count(name) as entries",
+		],
+		group_by="voucher_no, accounting_journal",
+		order_by="voucher_no",
+	)
+
+	entries, truncated = [], False
+	if cint(drill_down):
+		# only whole vouchers are returned, the page ends before the one that would exceed the cap
+		row_count, last_voucher = 0, None
+		for group in groups:
+			if (
+				group.voucher_no != last_voucher
+				and row_count + group.entries > MAX_DRILL_DOWN_ROWS
+				and row_count
+			):
+				page = page[: page.index(group.voucher_no)]
+				break
+			row_count += group.entries
+			last_voucher = group.voucher_no
+
+		groups = [group for group in groups if group.voucher_no in set(page)]
+		truncated = sum(group.entries for group in groups) > MAX_DRILL_DOWN_ROWS
+		entries = frappe.get_list(
 			"GL Entry",
-			fields=["*"],
-			filters={"voucher_type": doctype, "voucher_no": docname, "is_cancelled": 0},
+			filters=dict(filters, voucher_no=("in", page)),
+			fields=[
+				"name",
+				"voucher_no",
+				"account",
+				"debit",
+				"credit",
+				"accounting_journal",
+				"account_currency",
+			],
+			order_by="voucher_no, name",
+			limit_page_length=MAX_DRILL_DOWN_ROWS,
 		)
 
-		make_reverse_gl_entries(voucher_type=doctype, voucher_no=docname, cancel_payment_ledger_entries=False)
+	has_more = page[-1] != docnames[-1]
+	return {
+		"groups": groups,
+		"entries": entries,
+		"truncated": truncated,
+		"next_cursor": _encode_cursor(page[-1]) if has_more else None,
+		"total_vouchers": len(docnames),
+	}
+
+
+def _encode_cursor(voucher_no):
+	return base64.urlsafe_b64encode(frappe.safe_encode(frappe.as_json({"after": voucher_no}))).decode()
+
 
-		for gl_entry in original_entries:
-			gl_entry["name"] = None
-			gl_entry["accounting_journal"] = accounting_journal
-			make_entry(gl_entry, False, "No")
+def _decode_cursor(cursor):
+	if not cursor:
+		return None
+	return frappe.parse_json(frappe.safe_decode(base64.urlsafe_b64decode(cursor))).get("after")
 
 
+# @dokos
 @frappe.whitelist()
-def get_accounting_journal(doc):
-	doc = frappe.parse_json(doc)
+def accounting_journal_adjustment(doctype, docnames, accounting_journal):
+	"""
+	Moves the GL Entries of the given vouchers to `accounting_journal`. Large selections
+	run as a background job; calling again with the same vouchers resumes an interrupted run.
+	"""
+	docnames = frappe.parse_json(docnames)
 
-	applicable_rules = []
-	query_filters = {
-		"company": doc.get("company"),
-		"disabled": 0,
-		"document_type": doc.get("doctype"),
-	}
+	if len(docnames) <= INLINE_ADJUSTMENT_LIMIT:
+		adjust_vouchers(doctype, docnames, accounting_journal)
+		return {"status": "completed"}
 
-	if doc.get("doctype") == "Payment Entry":
-		query_filters["account"] = (
-			doc.get("paid_to") if doc.get("payment_type") == "Receive" else doc.get("paid_from")
-		)
+	job_id = get_job_id(doctype, docnames, accounting_journal)
+	if is_job_enqueued(job_id):
+		return {"status": "already_running", "job_id": job_id, "progress": get_adjustment_progress(job_id)}
 
-	applicable_rules = frappe.get_all(
-		"Accounting Journal",
-		filters=query_filters,
-		fields=[
-			"name",
-			"type",
-			"account",
-			"`tabAccounting Journal Rule`.document_type",
-			"`tabAccounting Journal Rule`.condition",
-		],
+	set_adjustment_progress(job_id, "queued", 0)
+	frappe.enqueue(
+		"tunisia_compliance.journal_adjustment.run_adjustment",
+		queue="long",
+		timeout=7200,
+		job_id=job_id,
+		deduplicate=True,
+		enqueue_after_commit=True,
+		progress_key=job_id,
+		doctype=doctype,
+		docnames=docnames,
+		accounting_journal=accounting_journal,
 	)
+	return {"status": "queued", "job_id": job_id}
+
+
+@frappe.whitelist()
+def get_adjustment_status(job_id):
+	return get_adjustment_progress(job_id)
 
-	for condition in [rule for rule in applicable_rules if rule.condition]:
-		if frappe.safe_eval(
-			condition.condition,
-			None,
-			{"doc": doc},
-		):
-			return condition.name
 
-	if [rule for rule in applicable_rules if not rule.condition]:
-		return next(rule for rule in applicable_rules if not rule.condition).name
+@frappe.whitelist()
+def get_accounting_journal(doc):
+	return resolve_journal(frappe.parse_json(doc))
+
+
+@frappe.whitelist()
+def get_accounting_journals(docs=None, doctype=None, docnames=None):
+	"""
+	Resolves the journal of many documents in one call and returns a {name: journal} map.
+	Pass either `docs` (a list of documents) or `doctype` and `docnames` to resolve saved
+	documents; conditions are then evaluated against their parent fields.
+	"""
+	if docs:
+		docs = [frappe._dict(doc) for doc in frappe.parse_json(docs)]
+	elif doctype and docnames:
+		docs = frappe.get_list(doctype, filters={"name": ("in", frappe.parse_json(docnames))}, fields=["*"])
+		for doc in docs:
+			doc.doctype = doctype
+	else:
+		frappe.throw(_("Pass either documents or a document type and names"))
 
-	return None
+	return resolve_journals(docs)
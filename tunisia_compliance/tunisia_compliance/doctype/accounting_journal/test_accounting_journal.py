@@ -1,9 +1,61 @@
 # Copyright (c) 2025, aminos and Contributors
 # See license.txt
 
-# import frappe
+from functools import partial
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from tunisia_compliance.journal_adjustment import get_adjustment_progress
+from tunisia_compliance.tunisia_compliance.doctype.accounting_journal.accounting_journal import (
+	INLINE_ADJUSTMENT_LIMIT,
+	accounting_journal_adjustment,
+)
+
 
 class TestAccountingJournal(FrappeTestCase):
-	pass
+	def setUp(self):
+		self.company = frappe.db.get_value("Company", {"country": "Tunisia"})
+		if not self.company:
+			self.skipTest("No Tunisian company on this site")
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_background_adjustment_moves_vouchers(self):
+		vouchers = frappe.get_all(
+			"GL Entry",
+			filters={"company": self.company, "voucher_type": "Sales Invoice", "is_cancelled": 0},
+			pluck="voucher_no",
+			distinct=True,
+			limit=INLINE_ADJUSTMENT_LIMIT + 1,
+		)
+		if len(vouchers) <= INLINE_ADJUSTMENT_LIMIT:
+			self.skipTest(f"Fewer than {INLINE_ADJUSTMENT_LIMIT + 1} Sales Invoices posted for this company")
+
+		journal = frappe.get_doc(
+			{
+				"doctype": "Accounting Journal",
+				"company": self.company,
+				"journal_code": "_TADJ",
+				"journal_name": "_Test Adjustment",
+				"type": "Sales",
+			}
+		).insert()
+
+		# run the job inline, and keep its per-chunk commits inside the test transaction
+		with (
+			patch("frappe.enqueue", partial(frappe.enqueue, now=True)),
+			patch.object(type(frappe.local.db), "commit"),
+		):
+			result = accounting_journal_adjustment("Sales Invoice", frappe.as_json(vouchers), journal.name)
+
+		self.assertEqual(result["status"], "queued")
+		self.assertEqual(get_adjustment_progress(result["job_id"])["status"], "completed")
+		journals = frappe.get_all(
+			"GL Entry",
+			filters={"voucher_type": "Sales Invoice", "voucher_no": ("in", vouchers), "is_cancelled": 0},
+			pluck="accounting_journal",
+		)
+		self.assertEqual(set(journals), {journal.name})
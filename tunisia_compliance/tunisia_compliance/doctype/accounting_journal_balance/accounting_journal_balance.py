@@ -0,0 +1,18 @@
+# Copyright (c) 2026, aminos and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class AccountingJournalBalance(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per bucket, so GL postings can upsert with ON DUPLICATE KEY UPDATE
+	frappe.db.add_unique(
+		"Accounting Journal Balance",
+		["company", "accounting_journal", "account", "period"],
+		constraint_name="unique_journal_balance_bucket",
+	)
@@ -0,0 +1,121 @@
+# Copyright (c) 2026, aminos and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt, getdate
+
+from tunisia_compliance import journal_balances
+
+JOURNAL = "_Test Balance Journal"
+
+
+class TestAccountingJournalBalance(FrappeTestCase):
+	def setUp(self):
+		self.company = frappe.db.get_value("Company", {"country": "Tunisia"})
+		if not self.company:
+			self.skipTest("No Tunisian company on this site")
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_deltas_are_written_once_per_transaction(self):
+		account = frappe.db.get_value("Account", {"company": self.company, "is_group": 0})
+		entry = dict(
+			company=self.company,
+			accounting_journal=JOURNAL,
+			account=account,
+			posting_date="2001-01-15",
+			is_cancelled=0,
+			flags=frappe._dict(),
+		)
+		journal_balances.on_gl_entry_insert(frappe._dict(entry, debit=100, credit=0))
+		journal_balances.on_gl_entry_insert(frappe._dict(entry, debit=40, credit=0))
+		# reversal of the second entry
+		journal_balances.on_gl_entry_insert(frappe._dict(entry, debit=0, credit=40, is_cancelled=1))
+		journal_balances.on_gl_entry_insert(
+			frappe._dict(entry, debit=0, credit=25, posting_date="2001-02-03")
+		)
+
+		self.assertFalse(frappe.db.exists("Accounting Journal Balance", {"accounting_journal": JOURNAL}))
+
+		journal_balances.flush_pending_balances()
+
+		balances = frappe.get_all(
+			"Accounting Journal Balance",
+			filters={"accounting_journal": JOURNAL},
+			fields=["period", "debit", "credit"],
+			order_by="period",
+		)
+		self.assertEqual(
+			[(str(row.period), flt(row.debit), flt(row.credit)) for row in balances],
+			[("2001-01-01", 100, 0), ("2001-02-01", 0, 25)],
+		)
+		self.assertIsNone(frappe.flags.journal_balance_pending)
+
+	def test_reposted_month_is_recomputed(self):
+		account = frappe.db.get_value("Account", {"company": self.company, "is_group": 0})
+		# the balance still holds the entries a repost deleted without hooks
+		journal_balances.upsert_balances({(self.company, JOURNAL, account, getdate("2001-01-01")): [100, 0]})
+
+		entry = dict(
+			company=self.company,
+			accounting_journal=JOURNAL,
+			account=account,
+			posting_date="2001-01-15",
+			is_cancelled=0,
+			credit=0,
+		)
+		frappe.db.bulk_insert(
+			"GL Entry",
+			fields=["name", *entry, "debit"],
+			values=[
+				(frappe.generate_hash(length=10), *entry.values(), 100),
+				(frappe.generate_hash(length=10), *entry.values(), 30),
+			],
+		)
+		# the repost posts the voucher again, and the same transaction posts another entry
+		journal_balances.on_gl_entry_insert(
+			frappe._dict(entry, debit=100, flags=frappe._dict(from_repost=True))
+		)
+		journal_balances.on_gl_entry_insert(frappe._dict(entry, debit=30, flags=frappe._dict()))
+		journal_balances.flush_pending_balances()
+
+		balances = frappe.get_all(
+			"Accounting Journal Balance",
+			filters={"accounting_journal": JOURNAL},
+			fields=["period", "debit", "credit"],
+		)
+		self.assertEqual(
+			[(str(row.period), flt(row.debit), flt(row.credit)) for row in balances],
+			[("2001-01-01", 130, 0)],
+		)
+
+	def test_rebuilt_balances_match_gl_entries(self):
+		journal_balances.rebuild_journal_balances(self.company, commit=False)
+
+		expected = frappe.db.sql(
+			"""
+			SELECT accounting_journal, account, SUM(debit), SUM(credit)
+			FROM `tabGL Entry`
+			WHERE company = %s AND is_cancelled = 0 AND accounting_journal != ''
+			GROUP BY accounting_journal, account
+			""",
+			self.company,
+		)
+		balances = frappe.db.sql(
+			"""
+			SELECT accounting_journal, account, SUM(debit), SUM(credit)
+			FROM `tabAccounting Journal Balance`
+			WHERE company = %s
+			GROUP BY accounting_journal, account
+			""",
+			self.company,
+		)
+		self.assertEqual(_rounded(balances), _rounded(expected))
+
+
+def _rounded(rows):
+	return sorted(
+		(journal, account, flt(debit, 3), flt(credit, 3)) for journal, account, debit, credit in rows
+	)
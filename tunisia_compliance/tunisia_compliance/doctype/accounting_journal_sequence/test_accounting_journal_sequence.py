@@ -0,0 +1,97 @@
+# Copyright (c) 2026, aminos and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from tunisia_compliance.journal_numbering import find_numbering_issues, number_block
+from tunisia_compliance.journal_rules import stamp_gl_entry
+
+
+class TestAccountingJournalSequence(FrappeTestCase):
+	def setUp(self):
+		company = frappe.db.get_value("Company", {"country": "Tunisia"})
+		if not company:
+			self.skipTest("No Tunisian company on this site")
+
+		entry = frappe.db.get_value(
+			"GL Entry", {"company": company, "is_cancelled": 0}, ["fiscal_year"], as_dict=True
+		)
+		if not entry:
+			self.skipTest("No GL Entry for this company")
+		self.fiscal_year = entry.fiscal_year
+		self.journal = frappe.get_doc(
+			{
+				"doctype": "Accounting Journal",
+				"company": company,
+				"journal_code": "_TSEQ",
+				"journal_name": "_Test Sequence",
+				"type": "Miscellaneous",
+			}
+		).insert()
+
+		self.vouchers = frappe.db.sql(
+			"""
+			SELECT DISTINCT voucher_type, voucher_no FROM `tabGL Entry`
+			WHERE company = %s AND fiscal_year = %s
+			LIMIT 7
+			""",
+			(company, self.fiscal_year),
+		)
+		for voucher_type, voucher_no in self.vouchers:
+			frappe.db.sql(
+				"""
+				UPDATE `tabGL Entry` SET accounting_journal = %s, journal_entry_number = 0
+				WHERE voucher_type = %s AND voucher_no = %s
+				""",
+				(self.journal.name, voucher_type, voucher_no),
+			)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_blocks_number_vouchers_without_gaps(self):
+		numbered = 0
+		while count := number_block(self.journal.name, self.fiscal_year, block_size=3):
+			numbered += count
+
+		self.assertEqual(numbered, len(self.vouchers))
+		self.assertEqual(
+			frappe.db.get_value(
+				"Accounting Journal Sequence", f"{self.journal.name}-{self.fiscal_year}", "last_number"
+			),
+			len(self.vouchers),
+		)
+		numbers = frappe.db.sql(
+			"""
+			SELECT voucher_type, voucher_no, COUNT(DISTINCT journal_entry_number), MIN(journal_entry_number)
+			FROM `tabGL Entry` WHERE accounting_journal = %s
+			GROUP BY voucher_type, voucher_no
+			""",
+			self.journal.name,
+		)
+		# one number per voucher, and together they are 1..n
+		self.assertEqual({row[2] for row in numbers}, {1})
+		self.assertEqual(sorted(row[3] for row in numbers), list(range(1, len(self.vouchers) + 1)))
+		self.assertEqual(find_numbering_issues(self.journal.name, self.fiscal_year), [])
+
+	def test_reposted_voucher_keeps_its_number(self):
+		while number_block(self.journal.name, self.fiscal_year):
+			pass
+
+		voucher_type, voucher_no = self.vouchers[0]
+		entry = frappe.db.get_value(
+			"GL Entry",
+			{"voucher_type": voucher_type, "voucher_no": voucher_no, "is_cancelled": 0},
+			["name", "journal_entry_number"],
+			as_dict=True,
+		)
+		# a repost deletes the entries without hooks, then posts them again
+		reposted = frappe.get_doc("GL Entry", entry.name).as_dict()
+		frappe.db.delete("GL Entry", {"voucher_type": voucher_type, "voucher_no": voucher_no})
+		reposted.update(accounting_journal=None, journal_entry_number=0, flags=frappe._dict(from_repost=True))
+
+		stamp_gl_entry(reposted)
+
+		self.assertEqual(reposted.accounting_journal, self.journal.name)
+		self.assertEqual(reposted.journal_entry_number, entry.journal_entry_number)
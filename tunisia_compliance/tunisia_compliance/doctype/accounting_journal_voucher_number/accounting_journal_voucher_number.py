@@ -0,0 +1,18 @@
+# Copyright (c) 2026, aminos and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class AccountingJournalVoucherNumber(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per voucher, so the sequencer can upsert with ON DUPLICATE KEY UPDATE
+	frappe.db.add_unique(
+		"Accounting Journal Voucher Number",
+		["voucher_type", "voucher_no"],
+		constraint_name="unique_journal_voucher_number",
+	)
@@ -0,0 +1,34 @@
+// Copyright (c) 2026, aminos and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Tunisia Compliance Settings", {
+	refresh: function (frm) {
+		frappe.call("tunisia_compliance.provisioning.get_provisioning_summary").then((r) => {
+			const totals = r.message.totals;
+			if (!r.message.companies.length) return;
+
+			const colors = { Queued: "gray", Running: "blue", Completed: "green", Failed: "red" };
+			Object.entries(totals).forEach(([status, count]) => {
+				if (count) {
+					frm.dashboard.add_indicator(
+						__("{0}: {1}", [__(status), count]),
+						colors[status]
+					);
+				}
+			});
+
+			if (totals.Failed) {
+				frm.add_custom_button(__("Retry Failed Companies"), () => {
+					frappe
+						.call("tunisia_compliance.provisioning.retry_failed_companies")
+						.then((res) => {
+							frappe.show_alert(
+								__("Provisioning queued for {0} companies.", [res.message.length])
+							);
+							frm.reload_doc();
+						});
+				});
+			}
+		});
+	},
+});
@@ -4,5 +4,9 @@
 import frappe
 from frappe.model.document import Document
 
+from tunisia_compliance.account_roles import clear_role_index
+
 class TunisiaComplianceSettings(Document):
-    pass
+    def on_update(self):
+        # The tax account role index is seeded from the account tables above
+        clear_role_index()
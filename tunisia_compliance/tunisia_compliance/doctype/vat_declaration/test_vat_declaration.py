@@ -1,9 +1,31 @@
 # Copyright (c) 2025, aminos and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from tunisia_compliance import benchmark
+
 
 class TestVATDeclaration(FrappeTestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_benchmark_report(self):
+		company = frappe.db.get_value("Company", {"country": "Tunisia"})
+		if not company:
+			self.skipTest("No Tunisian company on this site")
+
+		# the generated data stays in this test's transaction and is rolled back with it
+		with patch.object(type(frappe.local.db), "commit") as commit:
+			report = benchmark.run(company=company, sizes=[20], commit=False)
+		commit.assert_not_called()
+		result = report["results"][0]
+
+		self.assertEqual(result["generated"]["Sales Invoice"], 20)
+		self.assertEqual(set(result["get_declaration_data"]), set(benchmark.DATA_SOURCES))
+		for source in result["get_declaration_data"].values():
+			self.assertEqual(source["invoices"], 20)
+		self.assertFalse(frappe.db.exists("Sales Invoice", {"name": ["like", f"{benchmark.PREFIX}%"]}))
@@ -2,6 +2,15 @@
 // For license information, please see license.txt
 
 frappe.ui.form.on("VAT Declaration", {
+	setup: function (frm) {
+		// Progress of the background fetch, published by fetch_declaration_data
+		frappe.realtime.on("vat_declaration_fetch_progress", (progress) => {
+			if (progress.declaration === frm.doc.name) {
+				frm.events.show_fetch_progress(frm, progress);
+			}
+		});
+	},
+
 	refresh: function (frm) {
 		if (frm.doc.docstatus === 0) {
 			frm.add_custom_button(__("Get Declaration Data"), function () {
@@ -10,7 +19,44 @@ frappe.ui.form.on("VAT Declaration", {
 					frm.refresh();
 				});
 			}).addClass("btn-primary");
+
+			if (!frm.is_new()) {
+				frm.add_custom_button(__("Fetch in Background"), function () {
+					frm.call("enqueue_get_declaration_data").then((r) => {
+						if (r.message && r.message.status === "already_running") {
+							frappe.show_alert({ message: __("A fetch is already running for this declaration."), indicator: "orange" });
+						} else {
+							frappe.show_alert({ message: __("Declaration data will be fetched in the background."), indicator: "blue" });
+						}
+					});
+				});
+
+				// Pick up a fetch that is still running after a reload
+				frm.call("get_fetch_status").then((r) => {
+					if (r.message && ["queued", "running"].includes(r.message.status)) {
+						frm.events.show_fetch_progress(frm, r.message);
+					}
+				});
+			}
+		}
+	},
+
+	show_fetch_progress: function (frm, progress) {
+		if (["completed", "failed"].includes(progress.status)) {
+			frappe.hide_progress();
+			frappe.show_alert({
+				message: progress.message,
+				indicator: progress.status === "completed" ? "green" : "red",
+			});
+			frm.reload_doc();
+			return;
 		}
+		frappe.show_progress(
+			__("Fetching Declaration Data"),
+			progress.percent,
+			100,
+			progress.stage ? __("Fetching {0}...", [progress.stage]) : __("Queued")
+		);
 	},
 
     // Add client-side triggers for any manual change to re-calculate totals
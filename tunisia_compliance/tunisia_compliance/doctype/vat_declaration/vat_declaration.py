@@ -5,6 +5,11 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.utils import getdate, add_months, get_first_day, get_last_day, flt
+from frappe.utils.background_jobs import is_job_enqueued
+
+from tunisia_compliance import vat_aggregation, vat_gl_source, vat_ledger
+from tunisia_compliance.profiling import StageProfiler, is_profiling_enabled
+from tunisia_compliance.vat_credit import get_declarations_by_period
 
 class VATDeclaration(Document):
     # This will run on save
@@ -14,25 +19,69 @@ class VATDeclaration(Document):
     # This is the main server-side method called by the button
     @frappe.whitelist()
     def get_declaration_data(self):
+        self.run_fetch_stages()
+        self.save()
+        frappe.msgprint(_("Declaration details have been fetched successfully."), indicator="green", title=_("Success"))
+
+    # Same as get_declaration_data, but runs in a long-queue worker and reports progress to the form
+    @frappe.whitelist()
+    def enqueue_get_declaration_data(self):
+        self.validate_fetch_filters()
+        job_id = get_fetch_job_id(self.name)
+
+        if is_job_enqueued(job_id):
+            return {"status": "already_running", "progress": get_fetch_progress(self.name)}
+
+        set_fetch_progress(self.name, "queued", 0)
+        frappe.enqueue(
+            "tunisia_compliance.tunisia_compliance.doctype.vat_declaration.vat_declaration.fetch_declaration_data",
+            queue="long",
+            timeout=3600,
+            job_id=job_id,
+            deduplicate=True,
+            enqueue_after_commit=True,
+            declaration=self.name,
+        )
+        return {"status": "queued"}
+
+    @frappe.whitelist()
+    def get_fetch_status(self):
+        return get_fetch_progress(self.name)
+
+    def validate_fetch_filters(self):
         if not self.fiscal_year or not self.month or not self.company:
             frappe.throw(_("Please select Company, Fiscal Year, and Month first."))
 
+    def run_fetch_stages(self, progress_callback=None):
+        self.validate_fetch_filters()
+
         # Clear existing data
         for field in ["vat_collected_details", "vat_deductible_details_gs", "vat_deductible_details_fa", "withholding_tax_details", "other_taxes_details"]:
             self.set(field, [])
 
         start_date, end_date = self._get_period_dates()
-
-        self._fetch_vat_collected(start_date, end_date)
-        self._fetch_vat_deductible(start_date, end_date)
-        self._fetch_withholding_tax(start_date, end_date)
-        self._fetch_stamp_duty(start_date, end_date)
-        self._fetch_other_taxes(start_date, end_date)
-        self._fetch_previous_month_credit(start_date)
-
-        self.calculate_totals()
-        self.save()
-        frappe.msgprint(_("Declaration details have been fetched successfully."), indicator="green", title=_("Success"))
+        self._sales_aggregates = self._purchase_aggregates = None
+
+        stages = [
+            (_("VAT Collected"), self._fetch_vat_collected, (start_date, end_date)),
+            (_("VAT Deductible"), self._fetch_vat_deductible, (start_date, end_date)),
+            (_("Withholding Tax"), self._fetch_withholding_tax, (start_date, end_date)),
+            (_("Stamp Duty"), self._fetch_stamp_duty, (start_date, end_date)),
+            (_("Other Taxes"), self._fetch_other_taxes, (start_date, end_date)),
+            (_("Previous Month Credit"), self._fetch_previous_month_credit, (start_date,)),
+        ]
+        profiler = StageProfiler(enabled=is_profiling_enabled())
+        for index, (label, stage, args) in enumerate(stages):
+            if progress_callback:
+                progress_callback(label, index, len(stages))
+            with profiler.stage(stage.__name__):
+                stage(*args)
+
+        with profiler.stage("calculate_totals"):
+            self.calculate_totals()
+
+        if profiler.enabled:
+            self.fetch_profile = profiler.as_json()
 
     def calculate_totals(self):
         # VAT Summary
@@ -75,76 +124,53 @@ class VATDeclaration(Document):
         ref_date = f"{year}-{month_index}-01"
         return get_first_day(ref_date), get_last_day(ref_date)
 
-    def _fetch_vat_collected(self, start_date, end_date):
-        invoices = frappe.get_all("Sales Invoice", filters={"company": self.company, "docstatus": 1, "posting_date": ["between", [start_date, end_date]]}, pluck="name")
-        if not invoices: return
-
-        # Base query for standard VAT
-        query = """
-            SELECT account_head, rate, SUM(base_tax_amount) as base_amount, SUM(tax_amount) as vat_amount
-            FROM `tabSales Taxes and Charges`
-            WHERE parent IN %(invoices)s AND (account_head LIKE %(tva_pattern)s)
-            GROUP BY rate
-        """
-        params = {"invoices": tuple(invoices), "tva_pattern": "%TVA%"}
-        
-        # Conditionally exclude suspended VAT if checkbox is unchecked
-        if not self.fetch_suspended_vat:
-            query = query.replace("WHERE parent", "WHERE account_head NOT LIKE %(suspendu_pattern)s AND parent")
-            params["suspendu_pattern"] = "%Suspendue%"
+    def _get_sales_aggregates(self, start_date, end_date):
+        # Collected VAT, FODEC and the invoice count come from the same scan, so it is run once per fetch
+        if getattr(self, "_sales_aggregates", None) is None:
+            self._sales_aggregates = self._get_aggregation_source().get_sales_aggregates(self.company, start_date, end_date, self.fetch_suspended_vat)
+        return self._sales_aggregates
 
-        sales_vat_details = frappe.db.sql(query, params, as_dict=1)
-        
-        for row in sales_vat_details:
-            self.append("vat_collected_details", { "account": row.account_head, "vat_rate": row.rate, "base_amount": row.base_amount, "vat_amount": row.vat_amount })
+    def _get_purchase_aggregates(self, start_date, end_date):
+        if getattr(self, "_purchase_aggregates", None) is None:
+            self._purchase_aggregates = self._get_aggregation_source().get_purchase_aggregates(self.company, start_date, end_date)
+        return self._purchase_aggregates
 
-    def _fetch_vat_deductible(self, start_date, end_date):
-        invoices = frappe.get_all("Purchase Invoice", filters={"company": self.company, "docstatus": 1, "posting_date": ["between", [start_date, end_date]]}, pluck="name")
-        if not invoices: return
-        
-        # Get the specific account for VAT on Fixed Assets
-        vat_on_assets_account = frappe.db.get_value("Account", {"company": self.company, "account_name": ["like", "%TVA sur immobilisations%"]}) or ""
+    def _get_aggregation_source(self):
+        if self.data_source == "VAT Ledger":
+            return vat_ledger
+        if self.data_source == "General Ledger":
+            return vat_gl_source
+        return vat_aggregation
 
-        purchase_vat_details = frappe.db.sql("""
-            SELECT account_head, rate, SUM(base_tax_amount) as base_amount, SUM(tax_amount) as vat_amount
-            FROM `tabPurchase Taxes and Charges`
-            WHERE parent IN %(invoices)s AND account_head LIKE %(tva_pattern)s AND rate > 0
-            GROUP BY account_head, rate
-        """, {"invoices": tuple(invoices), "tva_pattern": "%TVA%"}, as_dict=1)
+    def _fetch_vat_collected(self, start_date, end_date):
+        aggregates = self._get_sales_aggregates(start_date, end_date)
+        for row in aggregates.vat_collected:
+            self.append("vat_collected_details", { "account": row.account_head, "vat_rate": row.rate, "base_amount": row.base_amount, "vat_amount": row.vat_amount })
 
-        for row in purchase_vat_details:
-            target_table = "vat_deductible_details_fa" if row.account_head == vat_on_assets_account else "vat_deductible_details_gs"
-            self.append(target_table, { "account": row.account_head, "vat_rate": row.rate, "base_amount": row.base_amount, "vat_amount": row.vat_amount })
+        # The General Ledger source leaves out vouchers with VAT but no customer or supplier amount
+        if aggregates.get("excluded_vouchers"):
+            voucher_nos = ", ".join(voucher_no for voucher_type, voucher_no in aggregates.excluded_vouchers[:20])
+            frappe.msgprint(
+                _("{0} vouchers with VAT but no customer or supplier amount were left out of the declaration: {1}").format(len(aggregates.excluded_vouchers), voucher_nos),
+                indicator="orange",
+                title=_("Vouchers Left Out"),
+            )
+
+    def _fetch_vat_deductible(self, start_date, end_date):
+        aggregates = self._get_purchase_aggregates(start_date, end_date)
+        for target_table, rows in (("vat_deductible_details_gs", aggregates.vat_deductible_gs), ("vat_deductible_details_fa", aggregates.vat_deductible_fa)):
+            for row in rows:
+                self.append(target_table, { "account": row.account_head, "vat_rate": row.rate, "base_amount": row.base_amount, "vat_amount": row.vat_amount })
 
     def _fetch_withholding_tax(self, start_date, end_date):
-        wh_tax_accounts = frappe.get_all("Account", filters={"company": self.company, "account_name": ["like", "%Retenue à la source%"]}, pluck="name")
-        if not wh_tax_accounts: return
-
-        purchase_withholding = frappe.db.sql("""
-            SELECT account_head as tax_type, SUM(base_tax_amount) as base_amount, SUM(tax_amount) as tax_amount
-            FROM `tabPurchase Taxes and Charges`
-            WHERE parenttype = 'Purchase Invoice'
-            AND account_head IN %(accounts)s
-            AND parent IN (SELECT name FROM `tabPurchase Invoice` WHERE company=%(company)s AND docstatus=1 AND posting_date BETWEEN %(start_date)s AND %(end_date)s)
-            GROUP BY account_head
-        """, {"accounts": tuple(wh_tax_accounts), "company": self.company, "start_date": start_date, "end_date": end_date}, as_dict=1)
-        self.extend("withholding_tax_details", purchase_withholding)
+        self.extend("withholding_tax_details", self._get_purchase_aggregates(start_date, end_date).withholding)
 
     def _fetch_stamp_duty(self, start_date, end_date):
-        invoices = frappe.get_all("Sales Invoice", filters={"company": self.company, "docstatus": 1, "posting_date": ["between", [start_date, end_date]]}, pluck="name")
-        self.number_of_invoices_issued = len(invoices)
+        self.number_of_invoices_issued = self._get_sales_aggregates(start_date, end_date).invoice_count
 
     def _fetch_other_taxes(self, start_date, end_date):
         # --- Payroll Taxes ---
-        payroll_taxes = frappe.db.sql("""
-            SELECT salary_component as tax_type, SUM(amount) as tax_amount
-            FROM `tabSalary Detail`
-            WHERE parenttype = 'Salary Slip' AND docstatus = 1
-            AND salary_component IN ('Contribution Sociale de Solidarité (CSS)', 'Impôt sur le Revenu (IRPP)', 'Taxe de Formation Professionnelle (TFP)', 'Fonds de Logement Social (FOPROLOS)')
-            AND parent IN (SELECT name FROM `tabSalary Slip` WHERE company=%(company)s AND start_date >= %(start_date)s AND end_date <= %(end_date)s)
-            GROUP BY salary_component
-        """, {"company": self.company, "start_date": start_date, "end_date": end_date}, as_dict=1)
-        self.extend("other_taxes_details", payroll_taxes)
+        self.extend("other_taxes_details", self._get_aggregation_source().get_payroll_taxes(self.company, start_date, end_date))
 
         # --- TCL ---
         total_sales_ht = sum(flt(d.base_amount) for d in self.vat_collected_details)
@@ -152,26 +178,51 @@ class VATDeclaration(Document):
 
         # --- FODEC (if enabled) ---
         if self.fetch_fodec:
-            invoices = frappe.get_all("Sales Invoice", filters={"company": self.company, "docstatus": 1, "posting_date": ["between", [start_date, end_date]]}, pluck="name")
-            if invoices:
-                fodec_result = frappe.db.sql("""
-                    SELECT SUM(tax_amount)
-                    FROM `tabSales Taxes and Charges`
-                    WHERE parent IN %(invoices)s AND account_head LIKE %(fodec_pattern)s
-                """, {"invoices": tuple(invoices), "fodec_pattern": "%FODEC%"})
-                fodec_amount = flt(fodec_result[0][0]) if fodec_result and fodec_result[0] and fodec_result[0][0] else 0.0
-                if fodec_amount:
-                    self.append("other_taxes_details", { "tax_type": "FODEC", "tax_amount": fodec_amount })
+            fodec_amount = flt(self._get_sales_aggregates(start_date, end_date).fodec_amount)
+            if fodec_amount:
+                self.append("other_taxes_details", { "tax_type": "FODEC", "tax_amount": fodec_amount })
 
     def _fetch_previous_month_credit(self, start_date):
         previous_period_start = add_months(getdate(start_date), -1)
-        
-        last_declaration = frappe.db.get_value("VAT Declaration", {
-            "company": self.company,
-            "docstatus": 1,
-            "month": previous_period_start.strftime("%B"),
-            "fiscal_year": frappe.db.get_value("Fiscal Year", {"year_start_date": ("<=", previous_period_start), "year_end_date": (">=", previous_period_start)})
-        }, "vat_due")
-        
-        if last_declaration and flt(last_declaration) < 0:
-            self.previous_month_credit = abs(last_declaration)
\ No newline at end of file
+
+        last_declaration = get_declarations_by_period(self.company, previous_period_start, previous_period_start, submitted_only=True).get(previous_period_start)
+
+        if last_declaration and flt(last_declaration.vat_due) < 0:
+            self.previous_month_credit = abs(last_declaration.vat_due)
+
+
+# ==============================================================================
+# BACKGROUND FETCH
+# ==============================================================================
+
+def get_fetch_job_id(declaration):
+    return f"vat_declaration_fetch::{declaration}"
+
+
+def get_fetch_progress(declaration):
+    return frappe.cache.get_value(f"vat_declaration_fetch_progress::{declaration}")
+
+
+def set_fetch_progress(declaration, status, percent, stage=None, message=None):
+    progress = {"declaration": declaration, "status": status, "percent": percent, "stage": stage, "message": message}
+    frappe.cache.set_value(f"vat_declaration_fetch_progress::{declaration}", progress, expires_in_sec=3600)
+    frappe.publish_realtime("vat_declaration_fetch_progress", progress, doctype="VAT Declaration", docname=declaration)
+
+
+def fetch_declaration_data(declaration):
+    """Background job enqueued by `VATDeclaration.enqueue_get_declaration_data`."""
+    def report(stage, index, total):
+        set_fetch_progress(declaration, "running", int(index * 100 / total), stage=stage)
+
+    try:
+        doc = frappe.get_doc("VAT Declaration", declaration)
+        doc.run_fetch_stages(progress_callback=report)
+        doc.save()
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(frappe.get_traceback(), f"VAT Declaration fetch failed for {declaration}")
+        set_fetch_progress(declaration, "failed", 100, message=_("Fetching declaration data failed. Please check the Error Log."))
+        raise
+
+    set_fetch_progress(declaration, "completed", 100, message=_("Declaration details have been fetched successfully."))
@@ -0,0 +1,65 @@
+# Copyright (c) 2025, aminos and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, get_first_day, get_last_day, getdate
+
+from tunisia_compliance import vat_ledger
+
+
+class TestVATLedgerEntry(FrappeTestCase):
+	def setUp(self):
+		self.company = frappe.db.get_value("Company", {"country": "Tunisia"})
+		if not self.company:
+			self.skipTest("No Tunisian company on this site")
+
+	def test_invoice_rows_are_appended_and_compacted(self):
+		account = frappe.db.get_value("Account", {"company": self.company, "is_group": 0})
+		doc = frappe._dict(
+			doctype="Sales Invoice",
+			company=self.company,
+			posting_date="2001-01-15",
+			taxes=[frappe._dict(account_head=account, rate=19, base_tax_amount=100, tax_amount=19)],
+		)
+		vat_ledger.on_invoice_submit(doc)
+		vat_ledger.on_invoice_submit(doc)
+		vat_ledger.on_invoice_cancel(doc)
+		self.assertEqual(len(self._get_rows()), 6)
+
+		vat_ledger.compact_vat_ledger(self.company, commit=False)
+
+		rows = self._get_rows()
+		self.assertEqual(len(rows), 2)
+		count_row = next(row for row in rows if not row.account_head)
+		tax_row = next(row for row in rows if row.account_head == account)
+		self.assertEqual(count_row.invoice_count, 1)
+		self.assertEqual((tax_row.base_amount, tax_row.vat_amount), (100, 19))
+
+	def test_partial_month_rebuild_keeps_whole_month(self):
+		posting_date = frappe.db.get_value(
+			"Sales Invoice", {"company": self.company, "docstatus": 1}, "posting_date"
+		)
+		if not posting_date:
+			self.skipTest("No submitted Sales Invoice for this company")
+
+		period = get_first_day(getdate(posting_date))
+		vat_ledger.rebuild_vat_ledger(self.company, period, get_last_day(period), commit=False)
+		expected = self._get_totals(period)
+
+		vat_ledger.rebuild_vat_ledger(self.company, add_days(period, 3), add_days(period, 14), commit=False)
+
+		self.assertEqual(self._get_totals(period), expected)
+
+	def _get_rows(self):
+		return frappe.get_all(
+			"VAT Ledger Entry",
+			filters={"company": self.company, "period": "2001-01-01"},
+			fields=["account_head", "base_amount", "vat_amount", "invoice_count"],
+		)
+
+	def _get_totals(self, period):
+		rows = vat_ledger._get_ledger_rows(self.company, "Sales", period, get_last_day(period))
+		return sorted(
+			(row.account_head, row.rate, row.base_amount, row.vat_amount, row.invoice_count) for row in rows
+		)
@@ -0,0 +1,18 @@
+# Copyright (c) 2025, aminos and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class VATLedgerEntry(Document):
+	pass
+
+
+def on_doctype_update():
+	# Invoices append rows to their buckets, so a bucket may have several rows until compacted
+	frappe.db.add_index(
+		"VAT Ledger Entry",
+		["company", "period", "direction", "account_head", "rate"],
+		index_name="vat_ledger_bucket",
+	)
@@ -0,0 +1,93 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import add_months, get_first_day, getdate
+
+MONTHS = (
+	"January",
+	"February",
+	"March",
+	"April",
+	"May",
+	"June",
+	"July",
+	"August",
+	"September",
+	"October",
+	"November",
+	"December",
+)
+
+
+@contextmanager
+def capture_queries():
+	"""
+	Records every query sent through `frappe.db.sql` inside the block, with its
+	values, duration and number of rows returned.
+
+	A streamed query (`as_iterator`) is recorded with `streamed` set: its rows are
+	counted and its duration runs until the iterator is exhausted or closed.
+	"""
+	queries = []
+	sql = frappe.db.sql
+
+	def recording_sql(query, values=(), *args, **kwargs):
+		start = time.perf_counter()
+		result = sql(query, values, *args, **kwargs)
+		record = frappe._dict(
+			query=query,
+			values=values,
+			duration=time.perf_counter() - start,
+			rows=len(result) if isinstance(result, list | tuple) else 0,
+			streamed=False,
+		)
+		queries.append(record)
+		if kwargs.get("as_iterator") and not isinstance(result, list | tuple):
+			record.streamed = True
+			return _count_rows(result, record, start)
+		return result
+
+	frappe.db.sql = recording_sql
+	try:
+		yield queries
+	finally:
+		frappe.db.sql = sql
+
+
+def _count_rows(rows, record, start):
+	try:
+		for row in rows:
+			record.rows += 1
+			yield row
+	finally:
+		record.duration = time.perf_counter() - start
+
+
+def stream_query(query, values=None, as_dict=True):
+	"""
+	Yields the rows of `query` one at a time through an unbuffered server-side
+	cursor, so memory does not grow with the size of the result.
+
+	No other query can run on the connection until the generator is exhausted
+	or closed.
+	"""
+	with frappe.db.unbuffered_cursor():
+		yield from frappe.db.sql(query, values, as_dict=as_dict, as_iterator=True)
+
+
+def get_periods(from_month, to_month=None):
+	"""Returns the first day of every month between two "YYYY-MM" values, inclusive."""
+	if not from_month:
+		return []
+
+	start = get_first_day(getdate(f"{from_month}-01"))
+	end = get_first_day(getdate(f"{to_month or from_month}-01"))
+	periods = []
+	while start <= end:
+		periods.append(str(start))
+		start = add_months(start, 1)
+	return periods
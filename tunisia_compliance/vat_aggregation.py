@@ -0,0 +1,177 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Set-based aggregation of invoice tax lines for a declaration period.
+
+Each function runs a single JOIN + GROUP BY against the invoice and tax tables so
+the amount of SQL sent and the number of round-trips do not depend on how many
+invoices were posted in the period. Tax accounts are selected by role (see
+`account_roles`) with equality filters.
+"""
+
+import frappe
+from frappe.utils import flt
+
+from tunisia_compliance.account_roles import (
+	COLLECTED,
+	DEDUCTIBLE_FA,
+	DEDUCTIBLE_GS,
+	FODEC,
+	SUSPENDED,
+	WITHHOLDING,
+	get_role_accounts,
+)
+
+PAYROLL_TAX_COMPONENTS = (
+	"Contribution Sociale de Solidarité (CSS)",
+	"Impôt sur le Revenu (IRPP)",
+	"Taxe de Formation Professionnelle (TFP)",
+	"Fonds de Logement Social (FOPROLOS)",
+)
+
+
+def get_sales_aggregates(company, start_date, end_date, include_suspended_vat=False):
+	"""
+	Returns collected VAT by rate, the FODEC total and the number of submitted
+	Sales Invoices for the period, in one query.
+	"""
+	vat_roles = (COLLECTED, SUSPENDED) if include_suspended_vat else (COLLECTED,)
+
+	rows = frappe.db.sql(
+		"""
+		SELECT 'invoice_count' AS category, NULL AS account_head, 0 AS rate,
+			0 AS base_amount, COUNT(*) AS vat_amount
+		FROM `tabSales Invoice` si
+		WHERE si.company = %(company)s AND si.docstatus = 1
+			AND si.posting_date BETWEEN %(start_date)s AND %(end_date)s
+		UNION ALL
+		SELECT
+			CASE WHEN stc.account_head IN %(fodec_accounts)s THEN 'fodec' ELSE 'vat' END AS category,
+			MIN(stc.account_head) AS account_head, stc.rate AS rate,
+			SUM(stc.base_tax_amount) AS base_amount, SUM(stc.tax_amount) AS vat_amount
+		FROM `tabSales Invoice` si
+		INNER JOIN `tabSales Taxes and Charges` stc
+			ON stc.parent = si.name AND stc.parenttype = 'Sales Invoice'
+		WHERE si.company = %(company)s AND si.docstatus = 1
+			AND si.posting_date BETWEEN %(start_date)s AND %(end_date)s
+			AND stc.account_head IN %(accounts)s
+		GROUP BY category, stc.rate
+		""",
+		{
+			"company": company,
+			"start_date": start_date,
+			"end_date": end_date,
+			"fodec_accounts": _in(get_role_accounts(company, FODEC)),
+			"accounts": _in(get_role_accounts(company, FODEC, *vat_roles)),
+		},
+		as_dict=1,
+	)
+
+	result = frappe._dict(vat_collected=[], fodec_amount=0.0, invoice_count=0)
+	for row in rows:
+		if row.category == "invoice_count":
+			result.invoice_count = int(row.vat_amount or 0)
+		elif row.category == "fodec":
+			result.fodec_amount += flt(row.vat_amount)
+		else:
+			result.vat_collected.append(
+				frappe._dict(
+					account_head=row.account_head,
+					rate=row.rate,
+					base_amount=row.base_amount,
+					vat_amount=row.vat_amount,
+				)
+			)
+
+	return result
+
+
+def get_purchase_aggregates(company, start_date, end_date):
+	"""
+	Returns deductible VAT by account and rate (split between goods/services and
+	fixed assets) and withholding tax by account for the period, in one query.
+	"""
+	withholding_accounts = get_role_accounts(company, WITHHOLDING)
+	fixed_asset_accounts = get_role_accounts(company, DEDUCTIBLE_FA)
+
+	rows = frappe.db.sql(
+		"""
+		SELECT
+			CASE
+				WHEN ptc.account_head IN %(withholding_accounts)s THEN 'withholding'
+				ELSE 'vat'
+			END AS category,
+			ptc.account_head, ptc.rate,
+			SUM(ptc.base_tax_amount) AS base_amount, SUM(ptc.tax_amount) AS vat_amount
+		FROM `tabPurchase Invoice` pi
+		INNER JOIN `tabPurchase Taxes and Charges` ptc
+			ON ptc.parent = pi.name AND ptc.parenttype = 'Purchase Invoice'
+		WHERE pi.company = %(company)s AND pi.docstatus = 1
+			AND pi.posting_date BETWEEN %(start_date)s AND %(end_date)s
+			AND (
+				ptc.account_head IN %(withholding_accounts)s
+				OR (ptc.account_head IN %(deductible_accounts)s AND ptc.rate > 0)
+			)
+		GROUP BY category, ptc.account_head, ptc.rate
+		""",
+		{
+			"company": company,
+			"start_date": start_date,
+			"end_date": end_date,
+			"withholding_accounts": _in(withholding_accounts),
+			"deductible_accounts": _in(get_role_accounts(company, DEDUCTIBLE_GS, DEDUCTIBLE_FA)),
+		},
+		as_dict=1,
+	)
+
+	result = frappe._dict(vat_deductible_gs=[], vat_deductible_fa=[], withholding=[])
+	withholding_by_account = {}
+	for row in rows:
+		if row.category == "withholding":
+			line = withholding_by_account.setdefault(
+				row.account_head, frappe._dict(tax_type=row.account_head, base_amount=0.0, tax_amount=0.0)
+			)
+			line.base_amount += flt(row.base_amount)
+			line.tax_amount += flt(row.vat_amount)
+			continue
+
+		target = "vat_deductible_fa" if row.account_head in fixed_asset_accounts else "vat_deductible_gs"
+		result[target].append(
+			frappe._dict(
+				account_head=row.account_head,
+				rate=row.rate,
+				base_amount=row.base_amount,
+				vat_amount=row.vat_amount,
+			)
+		)
+
+	result.withholding = list(withholding_by_account.values())
+	return result
+
+
+def get_payroll_taxes(company, start_date, end_date):
+	"""Returns the payroll taxes withheld or due on the submitted Salary Slips of the period."""
+	return frappe.db.sql(
+		"""
+		SELECT sd.salary_component AS tax_type, SUM(sd.amount) AS tax_amount
+		FROM `tabSalary Slip` ss
+		INNER JOIN `tabSalary Detail` sd ON sd.parent = ss.name AND sd.parenttype = 'Salary Slip'
+		WHERE ss.company = %(company)s AND ss.docstatus = 1
+			AND ss.start_date >= %(start_date)s AND ss.end_date <= %(end_date)s
+			AND sd.salary_component IN %(components)s
+		GROUP BY sd.salary_component
+		""",
+		{
+			"company": company,
+			"start_date": start_date,
+			"end_date": end_date,
+			"components": PAYROLL_TAX_COMPONENTS,
+		},
+		as_dict=1,
+	)
+
+
+def _in(accounts):
+	# an empty tuple is not valid SQL, so fall back to a value no account can have
+	return tuple(accounts) or ("",)
@@ -0,0 +1,137 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+VAT credit carry-forward across consecutive declarations.
+
+A negative `vat_due` is a credit that becomes the `previous_month_credit` of the
+following month. `get_credit_chain` loads every declaration of a range with one
+query and folds the chain in memory, instead of resolving each previous month
+through its own Fiscal Year and VAT Declaration lookups.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, cint, flt, get_first_day, getdate
+
+from tunisia_compliance.utils import MONTHS, get_periods
+
+
+@frappe.whitelist()
+def get_credit_chain(company, from_month, to_month=None, apply=0):
+	"""
+	Returns the carry-forward series for `company` between `from_month` and
+	`to_month` ("YYYY-MM", inclusive). The credit entering the first month comes
+	from the declaration of the month before it.
+
+	When `apply` is set, draft declarations whose stored credit differs from the
+	chain are updated and saved.
+	"""
+	frappe.has_permission("VAT Declaration", "write" if cint(apply) else "read", throw=True)
+	frappe.has_permission("Company", "read", company, throw=True)
+
+	periods = [getdate(period) for period in get_periods(from_month, to_month)]
+	if not periods:
+		frappe.throw(_("Please select a valid month range."))
+
+	declarations = get_declarations_by_period(company, add_months(periods[0], -1), periods[-1])
+
+	opening = declarations.get(add_months(periods[0], -1))
+	series = fold_credit_chain(periods, declarations, _get_credit(opening.vat_due) if opening else 0.0)
+	if cint(apply):
+		for period, row in zip(periods, series, strict=True):
+			if row.changed:
+				_apply_to_draft(declarations[period], row)
+	return series
+
+
+def fold_credit_chain(periods, declarations, credit):
+	"""
+	Carries `credit` through `periods` (first days of consecutive months) and
+	returns one row per month. `declarations` maps a period to its declaration;
+	a month without one carries its whole credit forward. A submitted declaration
+	carries the credit it declared, as `_fetch_previous_month_credit` reads it.
+	"""
+	series = []
+	for period in periods:
+		declaration = declarations.get(period) or frappe._dict()
+		if declaration.docstatus == 1:
+			credit = flt(declaration.previous_month_credit)
+			vat_due = flt(declaration.vat_due)
+		else:
+			vat_due = flt(declaration.total_vat_collected) - flt(declaration.total_vat_deductible) - credit
+		row = frappe._dict(
+			period=str(period)[:7],
+			declaration=declaration.name,
+			docstatus=declaration.docstatus,
+			total_vat_collected=flt(declaration.total_vat_collected),
+			total_vat_deductible=flt(declaration.total_vat_deductible),
+			previous_month_credit=credit,
+			vat_due=vat_due,
+			stored_previous_month_credit=flt(declaration.previous_month_credit),
+			stored_vat_due=flt(declaration.vat_due),
+		)
+		row.changed = declaration.docstatus == 0 and (
+			flt(row.previous_month_credit, 3) != flt(row.stored_previous_month_credit, 3)
+			or flt(row.vat_due, 3) != flt(row.stored_vat_due, 3)
+		)
+		series.append(row)
+
+		credit = _get_credit(vat_due)
+
+	return series
+
+
+def get_declarations_by_period(company, from_date, to_date, submitted_only=False):
+	"""
+	Maps the first day of each month to its declaration, loaded in a single query.
+	A submitted declaration takes precedence over a draft of the same month.
+	"""
+	declarations = frappe.db.sql(
+		"""
+		SELECT vd.name, vd.docstatus, vd.month, vd.total_vat_collected, vd.total_vat_deductible,
+			vd.previous_month_credit, vd.vat_due, vd.total_withholding_tax_due,
+			vd.total_stamp_duty_due, vd.total_other_taxes_due,
+			fy.year_start_date, fy.year_end_date
+		FROM `tabVAT Declaration` vd
+		INNER JOIN `tabFiscal Year` fy ON fy.name = vd.fiscal_year
+		WHERE vd.company = %(company)s AND vd.docstatus IN %(docstatus)s
+			AND fy.year_end_date >= %(from_date)s AND fy.year_start_date <= %(to_date)s
+		ORDER BY vd.docstatus ASC, vd.creation ASC
+		""",
+		{
+			"company": company,
+			"docstatus": (1,) if submitted_only else (0, 1),
+			"from_date": from_date,
+			"to_date": to_date,
+		},
+		as_dict=1,
+	)
+
+	by_period = {}
+	for declaration in declarations:
+		period = get_period_start(declaration.month, declaration.year_start_date, declaration.year_end_date)
+		if getdate(from_date) <= period <= getdate(to_date):
+			# ordered by docstatus, so a submitted declaration replaces a draft
+			by_period[period] = declaration
+	return by_period
+
+
+def get_period_start(month, year_start_date, year_end_date):
+	"""First day of `month` ("January"...) within the given fiscal year."""
+	month_index = MONTHS.index(month) + 1
+	year = year_start_date.year
+	if month_index < year_start_date.month:
+		year = year_end_date.year
+	return get_first_day(f"{year}-{month_index:02d}-01")
+
+
+def _get_credit(vat_due):
+	return abs(flt(vat_due)) if flt(vat_due) < 0 else 0.0
+
+
+def _apply_to_draft(declaration, row):
+	# saved through the document, so validation recomputes vat_due and the payable total
+	doc = frappe.get_doc("VAT Declaration", declaration.name)
+	doc.previous_month_credit = row.previous_month_credit
+	doc.save()
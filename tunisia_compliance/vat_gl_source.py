@@ -0,0 +1,300 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Declaration amounts derived from the General Ledger instead of invoice tax tables.
+
+The GL Entries of the period's vouchers that post to a role-mapped tax account are
+streamed in voucher order through an unbuffered cursor, restricted to the tax and
+customer / supplier lines, and folded one voucher at a time, so memory stays
+constant whatever the size of the period. Journal Entries that never go through
+invoice tax tables are included.
+
+The GL does not record tax rates, so the rate of each VAT amount is inferred from
+the voucher's taxable base (party amount less taxes) and snapped to the nearest
+standard Tunisian rate. A blended base cannot tell rates apart, so invoices with
+several rates on one VAT account take their VAT lines from their tax table instead,
+as the invoice source does. So do invoices paid at posting (POS sales, paid
+purchases), whose party lines net to zero and leave no base to infer from. Any
+other voucher whose party lines net to zero, such as a Journal Entry settling VAT
+between tax accounts, is not a sale or a purchase: its VAT is left out of the
+buckets and the voucher is listed in `excluded_vouchers`.
+
+Payroll taxes are not told apart by the GL, which posts every component to the
+same tax liability account, so they are read from the Salary Slips.
+"""
+
+import frappe
+from frappe.utils import flt
+from frappe.utils.caching import request_cache
+
+from tunisia_compliance.account_roles import (
+	COLLECTED,
+	DEDUCTIBLE_FA,
+	DEDUCTIBLE_GS,
+	FODEC,
+	ROLES,
+	STAMP_DUTY,
+	SUSPENDED,
+	WITHHOLDING,
+	get_role_accounts,
+)
+from tunisia_compliance.utils import stream_query
+
+# payroll taxes are read per component from the Salary Slips, like the other sources
+from tunisia_compliance.vat_aggregation import get_payroll_taxes
+
+STANDARD_RATES = (7.0, 13.0, 19.0)
+SALES_ROLES = (COLLECTED, SUSPENDED, FODEC, STAMP_DUTY)
+VAT_ROLES = (COLLECTED, SUSPENDED, DEDUCTIBLE_GS, DEDUCTIBLE_FA)
+INVOICE_TAX_TABLES = {
+	"Sales Invoice": "Sales Taxes and Charges",
+	"Purchase Invoice": "Purchase Taxes and Charges",
+}
+# Invoices paid at posting, whose party lines net to zero in the GL
+PAID_AT_POSTING_FIELDS = {"Sales Invoice": "is_pos", "Purchase Invoice": "is_paid"}
+
+
+def get_sales_aggregates(company, start_date, end_date, include_suspended_vat=False):
+	ledger = aggregate_general_ledger(company, start_date, end_date)
+	buckets = dict(ledger.collected)
+	if include_suspended_vat:
+		for key, (base, vat) in ledger.suspended.items():
+			bucket = buckets.setdefault(key, [0.0, 0.0])
+			buckets[key] = [bucket[0] + base, bucket[1] + vat]
+
+	collected_by_rate = {}
+	for (account, rate), (base, vat) in sorted(buckets.items()):
+		line = collected_by_rate.setdefault(
+			rate, frappe._dict(account_head=account, rate=rate, base_amount=0.0, vat_amount=0.0)
+		)
+		line.base_amount += base
+		line.vat_amount += vat
+
+	return frappe._dict(
+		vat_collected=list(collected_by_rate.values()),
+		fodec_amount=ledger.fodec_amount,
+		invoice_count=ledger.invoice_count,
+		excluded_vouchers=ledger.excluded_vouchers,
+	)
+
+
+def get_purchase_aggregates(company, start_date, end_date):
+	ledger = aggregate_general_ledger(company, start_date, end_date)
+	fixed_asset_accounts = set(get_role_accounts(company, DEDUCTIBLE_FA))
+
+	result = frappe._dict(
+		vat_deductible_gs=[], vat_deductible_fa=[], withholding=[], excluded_vouchers=ledger.excluded_vouchers
+	)
+	for (account, rate), (base, vat) in sorted(ledger.deductible.items()):
+		target = "vat_deductible_fa" if account in fixed_asset_accounts else "vat_deductible_gs"
+		result[target].append(frappe._dict(account_head=account, rate=rate, base_amount=base, vat_amount=vat))
+
+	result.withholding = [
+		frappe._dict(tax_type=account, base_amount=base, tax_amount=amount)
+		for account, (base, amount) in sorted(ledger.withholding.items())
+	]
+	return result
+
+
+@request_cache
+def aggregate_general_ledger(company, start_date, end_date):
+	"""Folds the GL Entries of the period into declaration buckets in a single streamed pass."""
+	accounts_by_role = {role: set(get_role_accounts(company, role)) for role in ROLES}
+	tax_accounts = set().union(*accounts_by_role.values())
+
+	role_of = {}
+	for role, accounts in accounts_by_role.items():
+		for account in accounts:
+			role_of[account] = role
+
+	ledger = frappe._dict(
+		collected={},
+		suspended={},
+		deductible={},
+		withholding={},
+		fodec_amount=0.0,
+		invoice_count=_count_sales_invoices(company, start_date, end_date),
+		excluded_vouchers=[],
+	)
+	invoice_vat_lines = get_invoice_vat_lines(
+		company, start_date, end_date, get_role_accounts(company, *VAT_ROLES)
+	)
+
+	rows = stream_query(
+		"""
+		SELECT gle.voucher_type, gle.voucher_no, gle.account, gle.party_type, gle.debit, gle.credit
+		FROM `tabGL Entry` gle
+		INNER JOIN (
+			SELECT DISTINCT voucher_type, voucher_no
+			FROM `tabGL Entry`
+			WHERE company = %(company)s AND is_cancelled = 0
+				AND posting_date BETWEEN %(start_date)s AND %(end_date)s
+				AND account IN %(tax_accounts)s
+		) taxed ON taxed.voucher_type = gle.voucher_type AND taxed.voucher_no = gle.voucher_no
+		WHERE gle.company = %(company)s AND gle.is_cancelled = 0
+			AND gle.posting_date BETWEEN %(start_date)s AND %(end_date)s
+			AND (gle.account IN %(tax_accounts)s OR gle.party_type IN ('Customer', 'Supplier'))
+		ORDER BY gle.posting_date, gle.voucher_type, gle.voucher_no
+		""",
+		{
+			"company": company,
+			"start_date": start_date,
+			"end_date": end_date,
+			"tax_accounts": tuple(tax_accounts) or ("",),
+		},
+	)
+
+	voucher = None
+	for row in rows:
+		key = (row.voucher_type, row.voucher_no)
+		if voucher is None or voucher.key != key:
+			if voucher:
+				_fold_voucher(ledger, voucher, role_of, invoice_vat_lines.get(voucher.key))
+			voucher = frappe._dict(key=key, customer=0.0, supplier=0.0, net={})
+
+		if row.party_type == "Customer":
+			voucher.customer += flt(row.debit) - flt(row.credit)
+		elif row.party_type == "Supplier":
+			voucher.supplier += flt(row.credit) - flt(row.debit)
+		if row.account in tax_accounts:
+			voucher.net[row.account] = voucher.net.get(row.account, 0.0) + flt(row.debit) - flt(row.credit)
+
+	if voucher:
+		_fold_voucher(ledger, voucher, role_of, invoice_vat_lines.get(voucher.key))
+
+	return ledger
+
+
+def get_invoice_vat_lines(company, start_date, end_date, vat_accounts):
+	"""
+	Maps (voucher_type, voucher_no) to the VAT lines, by account and rate, of the
+	invoices of the period that have several rates on one of their VAT accounts or
+	that are paid at posting.
+	"""
+	invoices = {}
+	if not vat_accounts:
+		return invoices
+
+	for voucher_type, tax_doctype in INVOICE_TAX_TABLES.items():
+		rows = frappe.db.sql(
+			f"""
+			SELECT tax.parent AS voucher_no, tax.account_head, tax.rate,
+				SUM(tax.base_tax_amount) AS base_amount, SUM(tax.tax_amount) AS vat_amount
+			FROM `tab{tax_doctype}` tax
+			INNER JOIN (
+				SELECT tax.parent
+				FROM `tab{voucher_type}` invoice
+				INNER JOIN `tab{tax_doctype}` tax
+					ON tax.parent = invoice.name AND tax.parenttype = %(voucher_type)s
+				WHERE invoice.company = %(company)s AND invoice.docstatus = 1
+					AND invoice.posting_date BETWEEN %(start_date)s AND %(end_date)s
+					AND tax.account_head IN %(vat_accounts)s
+				GROUP BY tax.parent
+				HAVING COUNT(DISTINCT tax.account_head, tax.rate) > COUNT(DISTINCT tax.account_head)
+					OR MAX(invoice.{PAID_AT_POSTING_FIELDS[voucher_type]}) = 1
+			) read_lines ON read_lines.parent = tax.parent
+			WHERE tax.parenttype = %(voucher_type)s AND tax.account_head IN %(vat_accounts)s
+			GROUP BY tax.parent, tax.account_head, tax.rate
+			""",
+			{
+				"voucher_type": voucher_type,
+				"company": company,
+				"start_date": start_date,
+				"end_date": end_date,
+				"vat_accounts": tuple(vat_accounts),
+			},
+			as_dict=1,
+		)
+		for row in rows:
+			invoices.setdefault((voucher_type, row.voucher_no), []).append(row)
+	return invoices
+
+
+def _count_sales_invoices(company, start_date, end_date):
+	# invoices without any tax line are not streamed, so they are counted apart
+	return frappe.db.count(
+		"Sales Invoice",
+		{"company": company, "docstatus": 1, "posting_date": ("between", (start_date, end_date))},
+	)
+
+
+def _fold_voucher(ledger, voucher, role_of, invoice_vat_lines=None):
+	# credit-side taxes (sales) are positive when credited, debit-side (purchases) when debited
+	sales_taxes = {a: -amount for a, amount in voucher.net.items() if role_of.get(a) in SALES_ROLES}
+	deductible = {
+		a: amount for a, amount in voucher.net.items() if role_of.get(a) in (DEDUCTIBLE_GS, DEDUCTIBLE_FA)
+	}
+	withholding = {a: -amount for a, amount in voucher.net.items() if role_of.get(a) == WITHHOLDING}
+	vat_collected = {a: v for a, v in sales_taxes.items() if role_of[a] in (COLLECTED, SUSPENDED)}
+
+	sales_base = voucher.customer - sum(sales_taxes.values())
+	# withholding reduces the amount payable to the supplier, so add it back to get the gross amount
+	purchase_gross = voucher.supplier + sum(withholding.values())
+	purchase_base = purchase_gross - sum(deductible.values())
+
+	if invoice_vat_lines:
+		if not flt(voucher.supplier, 2):
+			# paid at posting: the gross amount is rebuilt from the deductible VAT lines
+			purchase_gross = sum(
+				flt(line.base_amount) + flt(line.vat_amount)
+				for line in invoice_vat_lines
+				if role_of[line.account_head] in (DEDUCTIBLE_GS, DEDUCTIBLE_FA)
+			)
+		for line in invoice_vat_lines:
+			role = role_of[line.account_head]
+			if role in (DEDUCTIBLE_GS, DEDUCTIBLE_FA):
+				if flt(line.rate) > 0:
+					_add(
+						ledger.deductible,
+						(line.account_head, flt(line.rate)),
+						line.base_amount,
+						line.vat_amount,
+					)
+				continue
+			target = ledger.suspended if role == SUSPENDED else ledger.collected
+			_add(target, (line.account_head, flt(line.rate)), line.base_amount, line.vat_amount)
+	else:
+		# without a party amount the base would be minus the VAT, read as a 100% rate
+		excluded = False
+		if any(vat_collected.values()) and not flt(voucher.customer, 2):
+			vat_collected, excluded = {}, True
+		if (any(deductible.values()) or any(withholding.values())) and not flt(voucher.supplier, 2):
+			deductible, withholding, excluded = {}, {}, True
+		if excluded:
+			ledger.excluded_vouchers.append(voucher.key)
+
+		for account, base, vat in _split_base(vat_collected, sales_base):
+			target = ledger.suspended if role_of[account] == SUSPENDED else ledger.collected
+			_add(target, (account, _infer_rate(vat, base)), base, vat)
+
+		for account, base, vat in _split_base(deductible, purchase_base):
+			_add(ledger.deductible, (account, _infer_rate(vat, base)), base, vat)
+
+	for account, amount in withholding.items():
+		if amount:
+			_add(ledger.withholding, account, purchase_gross, amount)
+
+	ledger.fodec_amount += sum(v for a, v in sales_taxes.items() if role_of[a] == FODEC)
+
+
+def _split_base(vat_by_account, base):
+	"""Shares the voucher base between its VAT accounts in proportion to their amounts."""
+	vat_by_account = {a: v for a, v in vat_by_account.items() if v}
+	total = sum(vat_by_account.values())
+	for account, vat in vat_by_account.items():
+		yield account, (base * vat / total if total else 0.0), vat
+
+
+def _infer_rate(vat, base):
+	if not base:
+		return 0.0
+	rate = abs(vat / base * 100)
+	closest = min(STANDARD_RATES, key=lambda standard: abs(standard - rate))
+	return closest if abs(closest - rate) <= 0.5 else flt(rate, 2)
+
+
+def _add(buckets, key, base, amount):
+	bucket = buckets.setdefault(key, [0.0, 0.0])
+	bucket[0] += base
+	bucket[1] += amount
@@ -0,0 +1,318 @@
+# Copyright (c) 2025, Aminos and contributors
+# For license information, please see license.txt
+
+"""
+Monthly VAT ledger kept up to date from Sales/Purchase Invoice submit and cancel.
+
+A `VAT Ledger Entry` holds amounts of one (company, month, direction,
+account_head, rate) bucket; rows with an empty account_head count the invoices of
+the month. Submitting or cancelling an invoice appends its own signed rows rather
+than updating the bucket rows, so concurrent submits never wait on each other;
+reads sum the rows of each bucket. `compact_vat_ledger` folds the appended rows
+back into one row per bucket. Amending an invoice cancels the original and
+submits the amendment, so both events are covered by the two hooks below.
+"""
+
+import frappe
+from frappe.utils import flt, get_first_day, get_last_day, getdate, now
+
+from tunisia_compliance.account_roles import (
+	COLLECTED,
+	DEDUCTIBLE_FA,
+	DEDUCTIBLE_GS,
+	FODEC,
+	SUSPENDED,
+	WITHHOLDING,
+	get_role_accounts,
+)
+
+# payroll taxes are not part of the ledger and are always read from the Salary Slips
+from tunisia_compliance.vat_aggregation import get_payroll_taxes
+
+DIRECTIONS = {"Sales Invoice": "Sales", "Purchase Invoice": "Purchase"}
+TAX_TABLES = {"Sales Invoice": "Sales Taxes and Charges", "Purchase Invoice": "Purchase Taxes and Charges"}
+
+LEDGER_COLUMNS = (
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"company",
+	"period",
+	"direction",
+	"account_head",
+	"rate",
+	"base_amount",
+	"vat_amount",
+	"invoice_count",
+)
+
+# ==============================================================================
+# DOC EVENTS
+# ==============================================================================
+
+
+def on_invoice_submit(doc, method=None):
+	_post_invoice(doc, 1)
+
+
+def on_invoice_cancel(doc, method=None):
+	_post_invoice(doc, -1)
+
+
+def _post_invoice(doc, sign):
+	if frappe.get_cached_value("Company", doc.company, "country") != "Tunisia":
+		return
+
+	buckets = {}
+	for tax in doc.get("taxes") or []:
+		if not tax.account_head:
+			continue
+		bucket = buckets.setdefault((tax.account_head, flt(tax.rate)), [0.0, 0.0])
+		bucket[0] += flt(tax.base_tax_amount)
+		bucket[1] += flt(tax.tax_amount)
+
+	rows = [("", 0.0, 0.0, 0.0, 1)]
+	rows.extend((account, rate, base, vat, 1) for (account, rate), (base, vat) in buckets.items())
+
+	period = get_first_day(getdate(doc.posting_date))
+	direction = DIRECTIONS[doc.doctype]
+	_insert_rows(
+		[
+			(doc.company, period, direction, account, rate, sign * base, sign * vat, sign * count)
+			for account, rate, base, vat, count in rows
+		]
+	)
+
+
+def _insert_rows(rows):
+	"""Inserts (company, period, direction, account_head, rate, base, vat, invoice_count) rows."""
+	timestamp, user = now(), frappe.session.user
+	frappe.db.bulk_insert(
+		"VAT Ledger Entry",
+		fields=LEDGER_COLUMNS,
+		values=[(frappe.generate_hash(length=10), timestamp, timestamp, user, user, *row) for row in rows],
+	)
+
+
+# ==============================================================================
+# READS
+# ==============================================================================
+
+
+def get_sales_aggregates(company, start_date, end_date, include_suspended_vat=False):
+	"""Same result shape as `vat_aggregation.get_sales_aggregates`, read from the ledger."""
+	rows = _get_ledger_rows(company, "Sales", start_date, end_date)
+	fodec_accounts = set(get_role_accounts(company, FODEC))
+	vat_roles = (COLLECTED, SUSPENDED) if include_suspended_vat else (COLLECTED,)
+	vat_accounts = set(get_role_accounts(company, *vat_roles))
+
+	result = frappe._dict(vat_collected=[], fodec_amount=0.0, invoice_count=0)
+	collected_by_rate = {}
+	for row in rows:
+		if not row.account_head:
+			result.invoice_count += int(row.invoice_count or 0)
+		elif row.account_head in fodec_accounts:
+			result.fodec_amount += flt(row.vat_amount)
+		elif row.account_head in vat_accounts:
+			line = collected_by_rate.setdefault(
+				flt(row.rate),
+				frappe._dict(account_head=row.account_head, rate=row.rate, base_amount=0.0, vat_amount=0.0),
+			)
+			line.account_head = min(line.account_head, row.account_head)
+			line.base_amount += flt(row.base_amount)
+			line.vat_amount += flt(row.vat_amount)
+
+	result.vat_collected = list(collected_by_rate.values())
+	return result
+
+
+def get_purchase_aggregates(company, start_date, end_date):
+	"""Same result shape as `vat_aggregation.get_purchase_aggregates`, read from the ledger."""
+	withholding_accounts = set(get_role_accounts(company, WITHHOLDING))
+	fixed_asset_accounts = set(get_role_accounts(company, DEDUCTIBLE_FA))
+	deductible_accounts = set(get_role_accounts(company, DEDUCTIBLE_GS, DEDUCTIBLE_FA))
+
+	result = frappe._dict(vat_deductible_gs=[], vat_deductible_fa=[], withholding=[])
+	withholding_by_account = {}
+	for row in _get_ledger_rows(company, "Purchase", start_date, end_date):
+		if not row.account_head:
+			continue
+		if row.account_head in withholding_accounts:
+			line = withholding_by_account.setdefault(
+				row.account_head, frappe._dict(tax_type=row.account_head, base_amount=0.0, tax_amount=0.0)
+			)
+			line.base_amount += flt(row.base_amount)
+			line.tax_amount += flt(row.vat_amount)
+		elif row.account_head in deductible_accounts and flt(row.rate) > 0:
+			target = "vat_deductible_fa" if row.account_head in fixed_asset_accounts else "vat_deductible_gs"
+			result[target].append(
+				frappe._dict(
+					account_head=row.account_head,
+					rate=row.rate,
+					base_amount=row.base_amount,
+					vat_amount=row.vat_amount,
+				)
+			)
+
+	result.withholding = list(withholding_by_account.values())
+	return result
+
+
+def _get_ledger_rows(company, direction, start_date, end_date):
+	return frappe.db.sql(
+		"""
+		SELECT account_head, rate, SUM(base_amount) AS base_amount,
+			SUM(vat_amount) AS vat_amount, SUM(invoice_count) AS invoice_count
+		FROM `tabVAT Ledger Entry`
+		WHERE company = %(company)s AND direction = %(direction)s
+			AND period BETWEEN %(start_date)s AND %(end_date)s
+		GROUP BY account_head, rate
+		""",
+		{
+			"company": company,
+			"direction": direction,
+			"start_date": get_first_day(getdate(start_date)),
+			"end_date": end_date,
+		},
+		as_dict=1,
+	)
+
+
+# ==============================================================================
+# BACKFILL
+# ==============================================================================
+
+
+def rebuild_vat_ledger(company=None, from_date=None, to_date=None, commit=True):
+	"""
+	Recomputes the ledger from submitted invoices, for all Tunisian companies by
+	default. The range is widened to whole months and its buckets are replaced.
+	"""
+	companies = (
+		[company] if company else frappe.get_all("Company", filters={"country": "Tunisia"}, pluck="name")
+	)
+	from_date = get_first_day(getdate(from_date)) if from_date else None
+	# a bucket holds a whole month, so a mid-month end date must still re-aggregate the month
+	to_date = get_last_day(getdate(to_date)) if to_date else None
+
+	for company_name in companies:
+		_delete_ledger_rows(company_name, from_date, to_date)
+		for doctype, direction in DIRECTIONS.items():
+			rows = _aggregate_invoices(doctype, company_name, from_date, to_date)
+			_insert_rows(
+				[
+					(
+						company_name,
+						row.period,
+						direction,
+						row.account_head or "",
+						flt(row.rate),
+						flt(row.base_amount),
+						flt(row.vat_amount),
+						int(row.invoice_count or 0),
+					)
+					for row in rows
+				]
+			)
+		if commit:
+			frappe.db.commit()
+
+	return companies
+
+
+def compact_vat_ledger(company=None, commit=True):
+	"""
+	Folds the rows appended by invoices into one row per bucket, one month at a time.
+	Returns the number of months compacted.
+	"""
+	months = frappe.db.sql(
+		f"""
+		SELECT DISTINCT company, period FROM (
+			SELECT company, period
+			FROM `tabVAT Ledger Entry`
+			{"WHERE company = %(company)s" if company else ""}
+			GROUP BY company, period, direction, account_head, rate
+			HAVING COUNT(*) > 1
+		) buckets
+		ORDER BY company, period
+		""",
+		{"company": company},
+	)
+
+	for company_name, period in months:
+		_compact_month(company_name, period)
+		if commit:
+			frappe.db.commit()
+	return len(months)
+
+
+def _compact_month(company, period):
+	# the locked rows are the ones replaced: rows appended meanwhile are left alone
+	rows = frappe.db.sql(
+		"""
+		SELECT name, direction, account_head, rate, base_amount, vat_amount, invoice_count
+		FROM `tabVAT Ledger Entry`
+		WHERE company = %s AND period = %s
+		FOR UPDATE
+		""",
+		(company, period),
+		as_dict=1,
+	)
+
+	buckets = {}
+	for row in rows:
+		bucket = buckets.setdefault((row.direction, row.account_head or "", flt(row.rate)), [0.0, 0.0, 0])
+		bucket[0] += flt(row.base_amount)
+		bucket[1] += flt(row.vat_amount)
+		bucket[2] += int(row.invoice_count or 0)
+
+	frappe.db.delete("VAT Ledger Entry", {"name": ("in", [row.name for row in rows])})
+	_insert_rows(
+		[
+			(company, period, *key, flt(base, 6), flt(vat, 6), count)
+			for key, (base, vat, count) in buckets.items()
+			if flt(base, 6) or flt(vat, 6) or count
+		]
+	)
+
+
+def _delete_ledger_rows(company, from_date, to_date):
+	filters = {"company": company}
+	if from_date and to_date:
+		filters["period"] = ["between", [from_date, to_date]]
+	elif from_date:
+		filters["period"] = [">=", from_date]
+	elif to_date:
+		filters["period"] = ["<=", to_date]
+	frappe.db.delete("VAT Ledger Entry", filters)
+
+
+def _aggregate_invoices(doctype, company, from_date, to_date):
+	conditions = ["inv.company = %(company)s", "inv.docstatus = 1"]
+	if from_date:
+		conditions.append("inv.posting_date >= %(from_date)s")
+	if to_date:
+		conditions.append("inv.posting_date <= %(to_date)s")
+	where = " AND ".join(conditions)
+
+	return frappe.db.sql(
+		f"""
+		SELECT DATE_FORMAT(inv.posting_date, '%%Y-%%m-01') AS period, '' AS account_head, 0 AS rate,
+			0 AS base_amount, 0 AS vat_amount, COUNT(*) AS invoice_count
+		FROM `tab{doctype}` inv
+		WHERE {where}
+		GROUP BY period
+		UNION ALL
+		SELECT DATE_FORMAT(inv.posting_date, '%%Y-%%m-01') AS period, tax.account_head, tax.rate,
+			SUM(tax.base_tax_amount) AS base_amount, SUM(tax.tax_amount) AS vat_amount,
+			COUNT(DISTINCT inv.name) AS invoice_count
+		FROM `tab{doctype}` inv
+		INNER JOIN `tab{TAX_TABLES[doctype]}` tax ON tax.parent = inv.name AND tax.parenttype = %(doctype)s
+		WHERE {where} AND IFNULL(tax.account_head, '') != ''
+		GROUP BY period, tax.account_head, tax.rate
+		""",
+		{"company": company, "from_date": from_date, "to_date": to_date, "doctype": doctype},
+		as_dict=1,
+	)